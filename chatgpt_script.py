@@ -20,12 +20,28 @@ import time
 import sys
 import os
 import argparse
+import itertools
+import json
 
 from utils.config_manager import ConfigManager
 from utils.app_controller import AppController
+from utils.async_pipeline import AsyncPipeline
+from utils.backends import GUIBackend
 from utils.file_manager import FileManager
-from utils.image_processor import ImageProcessor
+from utils.http_backend import HTTPImageBackend
+from utils.job_service import JobQueue, JobService, serve
+from utils.pacer import Pacer, RateLimitError
 from utils.processor import Processor
+from utils.prompt_source import PromptSource
+from utils.rollover import RolloverPolicy
+from utils.scheduler import PipelineScheduler
+from utils.script_host import ScriptHost
+from utils.sharding import parse_shard, shard_of
+from utils.simulated_backend import SimulatedBackend
+from utils.task_ledger import TaskLedger
+from utils.task_queue import TaskQueue
+from utils.tracer import summarize, tracer
+from utils.watchdog import Watchdog
 
 
 class ChatGPTBatchProcessor:
@@ -33,23 +49,135 @@ class ChatGPTBatchProcessor:
     ChatGPT batch processor class that coordinates the entire batch processing workflow
     """
     
-    def __init__(self, config_path=None):
-        """Initialize the batch processor and its modules"""
+    def __init__(self, config_path=None, non_interactive=False, overrides=None, shared=None):
+        """
+        Initialize the batch processor and its modules
+        
+        Args:
+            config_path (str, optional): Configuration file path
+            non_interactive (bool, optional): Never prompt; invalid settings end the run instead. Defaults to False.
+            overrides (dict, optional): Configuration values applied in memory, keys support dot notation
+            shared (dict, optional): Components reused across runs in one process (app controller,
+                image processor, GUI backend, locator, pacer). Created on first use and stored in it.
+        """
         self.config_manager = ConfigManager(config_file=config_path)
-        self.app_controller = AppController()
+        for key, value in (overrides or {}).items():
+            self.config_manager.set(key, value)
+        config = self.config_manager.config
+        self.non_interactive = non_interactive
+        # (index, count) when this machine processes one shard of the batch
+        self.shard = parse_shard(config.get("shard", ""))
+        self.shared = shared if shared is not None else {}
+        self.report = None
+        
+        # Optionally keep one script interpreter alive instead of spawning osascript per call
+        self.app_controller = self.shared_component("app_controller", lambda: AppController(
+            ScriptHost() if config.get("use_script_host", False) else None,
+            liveness_ttl=config.get("liveness_ttl", 30),
+            liveness_check=config.get("liveness_check", "pid"),
+            script_timeout=config.get("script_timeout", 60)
+        ))
         self.file_manager = FileManager()
+        self.image_processor = None
         
-        # Get scroll_amount from configuration
-        config = self.config_manager.config
-        scroll_amount = config.get("scroll_amount", 10)
+        backend_type = config["mode"].get("backend", "gui")
+        if backend_type == "simulated":
+            # Headless run against the simulator, no screen or ChatGPT app required
+            backend = SimulatedBackend(config.get("simulator"))
+        elif backend_type == "http":
+            # Image API instead of the app; the pooled connections carry over between runs
+            backend = self.shared_component(
+                ("http_backend", json.dumps(config.get("http_backend", {}), sort_keys=True)),
+                lambda: HTTPImageBackend.from_config(config)
+            )
+        elif backend_type == "gui":
+            # The GUI backend needs pyautogui and a display, so it is only imported here
+            from utils.image_processor import ImageProcessor
+            
+            # Get scroll_amount from configuration
+            scroll_amount = config.get("scroll_amount", 10)
+            capture_mode = config.get("capture_mode", "clipboard")
+            
+            self.image_processor = self.shared_component(
+                ("image_processor", scroll_amount, capture_mode),
+                lambda: ImageProcessor(scroll_amount, capture_mode)
+            )
+            # One GUI backend per image processor, so the model of open windows carries over
+            backend = self.shared_component(
+                ("gui_backend", scroll_amount, capture_mode),
+                lambda: GUIBackend(self.app_controller, self.image_processor)
+            )
+        else:
+            raise ValueError(f"Unknown backend: {backend_type} (expected gui, http or simulated)")
+        
+        # Optionally find the generated image on screen instead of relying on calibrated x/y only
+        locator = None
+        if backend_type == "gui" and config.get("auto_locate", False):
+            from utils.image_locator import ImageLocator
+            
+            cache_path = config.get("locator_cache") or os.path.join(
+                os.path.dirname(self.config_manager.config_file), "image_positions.json"
+            )
+            locator = self.shared_component(
+                ("locator", os.path.abspath(cache_path)),
+                lambda: ImageLocator(self.image_processor, cache_path)
+            )
+        
+        # Paces sends against the configured budgets and backs off on rate-limit responses;
+        # the limits belong to the account, so runs in one process share the pacer
+        self.pacer = self.shared_component("pacer", lambda: Pacer.from_config(config))
         
-        self.image_processor = ImageProcessor(scroll_amount)
         self.processor = Processor(
             self.config_manager,
             self.app_controller,
             self.image_processor,
-            self.file_manager
+            self.file_manager,
+            backend=backend,
+            locator=locator,
+            pacer=self.pacer,
+            rollover=RolloverPolicy.from_config(config)
         )
+        self.ledger = None
+        self.successful = 0
+        self.skipped = 0
+        self.finished = 0
+        self.queued = 0
+        self.failed_items = []
+        # Inputs rejected by the preflight stage, mapped to the reason
+        self.invalid_items = {}
+        # Resume cursor of the streamed prompt file: every prompt before it has been captured
+        self.cursor_key = None
+        self.cursor = 0
+        self.completed_indices = set()
+        # Preflight PNG paths keyed by original image path
+        self.converted_images = {}
+    
+    def in_shard(self, key):
+        """
+        Check whether an item belongs to this machine's shard
+        
+        Args:
+            key: Prompt index or image path relative to the image folder
+            
+        Returns:
+            bool: True if the item is processed here (always True without sharding)
+        """
+        return self.shard is None or shard_of(key, self.shard[1]) == self.shard[0]
+    
+    def shared_component(self, key, factory):
+        """
+        Get a component shared between runs, creating it on first use
+        
+        Args:
+            key: Component key
+            factory (callable): Creates the component
+            
+        Returns:
+            Shared component
+        """
+        if key not in self.shared:
+            self.shared[key] = factory()
+        return self.shared[key]
     
     def show_settings(self, config):
         """
@@ -65,9 +193,12 @@ class ChatGPTBatchProcessor:
         text_prefix = config.get("text_prefix", "")
         
         print(f"\nCurrent settings:")
+        print(f"- Backend: {self.processor.backend.name}")
         print(f"- Window mode: {'Multiple windows' if window_type == 'multi' else 'Single window'}")
         print(f"- Input type: {'Text only' if input_type == 'text_only' else 'Text+Image'}")
         print(f"- Image capture: {'Enabled' if capture_images else 'Disabled'}")
+        if window_type == "multi" and config["mode"].get("pipeline_depth", 1) > 1:
+            print(f"- Pipeline depth: {config['mode']['pipeline_depth']} conversations")
         
         if input_type == "text_only":
             print(f"- Use prefix: {'Yes' if use_prefix else 'No'}")
@@ -85,6 +216,9 @@ class ChatGPTBatchProcessor:
         Returns:
             dict: Updated configuration
         """
+        if self.non_interactive:
+            return config
+        
         # Ask user if they want to change the mode
         change_mode = input("Do you want to change these settings? (yes/no): ").strip().lower()
         if change_mode in ["yes", "y"]:
@@ -125,109 +259,344 @@ class ChatGPTBatchProcessor:
         
         return config
     
-    def prepare_prompts(self, prompt_content, num_items, config):
+    def prepare_prompts(self, config, num_items, prompt_content=None, prompt_source=None, start=0):
         """
-        Prepare prompt list, processing multi-line prompts based on mode
+        Prepare prompts lazily, processing multi-line prompts based on mode
         
         Args:
-            prompt_content (str): Prompt file content
-            num_items (int): Number of items (images or text lines)
             config (dict): Configuration dictionary
+            num_items (int): Number of items (images or text lines)
+            prompt_content (str, optional): Prompt file content, used in text+image mode
+            prompt_source (PromptSource, optional): Streaming prompt source, used in text-only mode
+            start (int, optional): Index of the first item to prepare a prompt for. Defaults to 0.
             
         Returns:
-            list: List of prompts
+            iterator: Prompts, one per item
         """
-        input_type = config["mode"]["input_type"]
-        use_prefix = config.get("use_prefix", False)
-        prefix = config.get("text_prefix", "")
-        
-        if input_type == "text_only":
-            # Text-only mode: Split prompts by line
-            lines = prompt_content.strip().split('\n')
-            prompts = []
-            
-            for line in lines:
-                if line.strip():  # Skip empty lines
-                    if use_prefix:
-                        prompts.append(f"{prefix}{line}")
-                    else:
-                        prompts.append(line)
-            
-            if len(prompts) < num_items:
-                # If not enough prompts, cycle through them
-                prompts = (prompts * (num_items // len(prompts) + 1))[:num_items]
-        else:
-            # Text+Image mode: Use the entire prompt text for each image
-            prompts = [prompt_content] * num_items
-        
-        return prompts
+        if config["mode"]["input_type"] == "text_only":
+            # Text-only mode: One prompt per line, cycling through them if there are fewer lines than items
+            return prompt_source.cycle(num_items, start)
+        # Text+Image mode: Use the entire prompt text for each image
+        return itertools.repeat(prompt_content, num_items - start)
     
-    def process_tasks(self, items, prompts, config, image_folder=None):
+    def build_tasks(self, items, prompts, config, image_folder=None, total=None):
         """
-        Process task list, which can be pure text tasks or image tasks
+        Build task dictionaries lazily, skipping tasks already captured in earlier runs
         
         Args:
-            items (list): List of items (image filenames or text line indices)
-            prompts (list): List of prompts
+            items (iterable): Items (image filenames or text line indices)
+            prompts (iterable): Prompts, one per item
             config (dict): Configuration dictionary
             image_folder (str, optional): Image folder path, required only for text+image mode
+            total (int, optional): Total number of items, used for progress output
             
-        Returns:
-            int: Number of successfully processed tasks
+        Yields:
+            dict: Task with item_name, prompt, img_path and ledger key
         """
-        successful = 0
         input_type = config["mode"]["input_type"]
         
-        for idx, item in enumerate(items, start=1):
+        for position, (item, prompt) in enumerate(zip(items, prompts), start=1):
             if input_type == "text_image":
+                index = None
                 item_name = item  # Image filename
-                img_path = os.path.join(image_folder, item)
-                print(f"[{idx}/{len(items)}] Processing image: {item}")
+                source_path = os.path.join(image_folder, item)
+                # Paste the preflight PNG when one was produced
+                img_path = self.converted_images.get(source_path, source_path)
+                print(f"[{position}/{total}] Processing image: {item}")
             else:
                 # In text_only mode, item is the prompt index
-                item_name = f"prompt_{idx}"  # Create unique name for each pure text task
-                img_path = None
-                print(f"[{idx}/{len(items)}] Processing text prompt #{idx}")
+                index = item
+                item_name = f"prompt_{item + 1}"  # Create unique name for each pure text task
+                source_path = img_path = None
+                print(f"[{item + 1}/{total}] Processing text prompt #{item + 1}")
             
-            # Get current prompt
-            current_prompt = prompts[idx-1]
+            task = {
+                "index": index,
+                "item_name": item_name,
+                "prompt": prompt,
+                "img_path": img_path,
+                "key": None,
+                "content_hash": None
+            }
             
-            # Determine whether to create a new chat - if in single window mode, only create a new chat for the first item
-            create_new = config["mode"]["window_type"] == "multi" or idx == 1
+            # Skip tasks already captured by an earlier run
+            if self.ledger is not None:
+                task["key"], task["content_hash"] = TaskLedger.make_key(item_name, task["prompt"], source_path)
+                if self.ledger.is_captured(task["key"]):
+                    print(f"Already captured in an earlier run, skipping {item_name}")
+                    self.skipped += 1
+                    self.advance_cursor(index)
+                    continue
             
-            success = self.processor.process_task(
-                item_name, 
-                current_prompt, 
-                config, 
-                img_path=img_path, 
-                new_chat=create_new
+            yield task
+    
+    def advance_cursor(self, index):
+        """
+        Record a captured prompt index and move the resume cursor past every leading captured prompt
+        
+        Args:
+            index (int or None): Prompt index, None for image tasks
+        """
+        if index is None or self.ledger is None or self.cursor_key is None:
+            return
+        self.completed_indices.add(index)
+        moved = False
+        # Prompts of other shards never complete here, so the cursor moves past them as well
+        while self.cursor in self.completed_indices or not self.in_shard(self.cursor):
+            self.completed_indices.discard(self.cursor)
+            self.cursor += 1
+            moved = True
+        if moved:
+            self.ledger.set_meta(self.cursor_key, self.cursor)
+    
+    def task_sent(self, task):
+        """
+        Record that a task is about to be sent
+        
+        Args:
+            task (dict): Task dictionary
+        """
+        task["sent_at"] = time.time()
+        if self.ledger is not None:
+            self.ledger.mark(task["key"], task["item_name"], task["content_hash"], "sent", sent_at=task["sent_at"])
+    
+    def task_done(self, task, success, config):
+        """
+        Record the outcome of a task
+        
+        Args:
+            task (dict): Task dictionary
+            success (bool): Whether the task succeeded
+            config (dict): Configuration dictionary
+        """
+        self.finished += 1
+        if success:
+            self.successful += 1
+            self.advance_cursor(task["index"])
+        else:
+            self.failed_items.append(task["item_name"])
+        print(self.pacer.progress(self.finished, max(0, self.queued - self.skipped - self.finished)))
+        if self.ledger is not None:
+            self.ledger.set_meta("pacer", self.pacer.snapshot())
+            finished_at = time.time()
+            self.ledger.mark(
+                task["key"], task["item_name"], task["content_hash"],
+                "captured" if success else "failed",
+                attempts=self.processor.backend.send_attempts.get(task["item_name"], 1),
+                finished_at=finished_at,
+                duration=finished_at - task["sent_at"],
+                output_path=self.processor.get_output_path(task["item_name"], config)
             )
+        self.processor.backend.forget(task["item_name"])
+    
+    def task_requeued(self, task):
+        """
+        Record that a task was deferred by a rate limit or queued for a retry and will be sent again
+        
+        Args:
+            task (dict): Task dictionary
+        """
+        if self.ledger is not None:
+            self.ledger.mark(task["key"], task["item_name"], task["content_hash"], "pending")
+            self.ledger.set_meta("pacer", self.pacer.snapshot())
+    
+    def process_tasks(self, items, prompts, config, image_folder=None, total=None):
+        """
+        Process task list, which can be pure text tasks or image tasks
+        
+        In multi-window mode with pipeline_depth above 1, several conversations are kept
+        generating at once by the pipeline scheduler. Otherwise tasks go through the asyncio
+        pipeline, which keeps the GUI work serial but prepares inputs and writes outputs on
+        a thread pool meanwhile (async_pipeline.enabled false falls back to a plain loop).
+        Sends are paced by the pacer. Tasks answered with a rate-limit message are deferred
+        until the pacer allows sending again, and tasks whose image was not captured are
+        retried in a fresh chat by the task queue.
+        
+        Args:
+            items (iterable): Items (image filenames or text line indices)
+            prompts (iterable): Prompts, one per item
+            config (dict): Configuration dictionary
+            image_folder (str, optional): Image folder path, required only for text+image mode
+            total (int, optional): Total number of items, used for progress output
             
-            if success:
-                successful += 1
+        Returns:
+            int: Number of successfully processed tasks
+        """
+        self.successful = 0
+        self.skipped = 0
+        self.finished = 0
+        self.queued = len(items)
+        self.failed_items = []
+        queue = TaskQueue.from_config(self.build_tasks(items, prompts, config, image_folder, total), config)
+        pipeline_depth = config["mode"].get("pipeline_depth", 1)
+        backend = self.processor.backend
+        if isinstance(backend, HTTPImageBackend):
+            # API requests are independent, so keep every worker of the backend busy
+            pipeline_depth = max(pipeline_depth, backend.concurrency)
+        # Without the scheduler, prepare inputs and write outputs while the GUI waits
+        async_pipeline = AsyncPipeline.from_config(self.processor, config)
+        
+        if (config["mode"]["window_type"] == "multi" or isinstance(backend, HTTPImageBackend)) and pipeline_depth > 1:
+            scheduler = PipelineScheduler(self.processor, self.file_manager, pipeline_depth)
+            scheduler.run(
+                queue,
+                config,
+                on_sent=self.task_sent,
+                on_done=lambda task, success: self.task_done(task, success, config),
+                on_requeued=self.task_requeued
+            )
+        elif async_pipeline is not None:
+            async_pipeline.run(
+                queue,
+                config,
+                on_sent=self.task_sent,
+                on_done=lambda task, success: self.task_done(task, success, config),
+                on_requeued=self.task_requeued
+            )
+        else:
+            first_task = True
+            while True:
+                # Deferred tasks first, then new tasks and retries whose cooldown has passed
+                task = queue.next()
+                if task is None:
+                    break
+                
+                # Determine whether to create a new chat - if in single window mode,
+                # only create a new chat for the first task
+                create_new = config["mode"]["window_type"] == "multi" or first_task
+                first_task = False
+                
+                # Wait for the pacer instead of a fixed pause between tasks
+                self.pacer.acquire()
+                self.task_sent(task)
+                try:
+                    success = self.processor.process_task(
+                        task["item_name"], 
+                        task["prompt"], 
+                        config, 
+                        img_path=task["img_path"], 
+                        new_chat=create_new,
+                        fresh_chat=task.get("tries", 1) > 1
+                    )
+                except RateLimitError:
+                    if queue.defer(task):
+                        self.task_requeued(task)
+                        continue
+                    success = False
+                if not success and queue.retry(task):
+                    self.task_requeued(task)
+                    continue
+                self.task_done(task, success, config)
+        
+        if self.skipped:
+            print(f"Skipped {self.skipped} tasks captured in earlier runs.")
+        return self.successful + self.skipped
+    
+    def serve(self, port=None, socket_path=None):
+        """
+        Process jobs submitted to the local job service until interrupted
+        
+        Args:
+            port (int, optional): Listen port. Defaults to service.port.
+            socket_path (str, optional): Unix socket path. Defaults to service.socket.
             
-            # Wait between tasks
-            time.sleep(1)
+        Returns:
+            bool: Whether the service started
+        """
+        config = self.config_manager.config
+        service_config = config.get("service", {})
+        output_dir = config["output_dir"]
+        self.file_manager.prepare_output_folder(output_dir)
+        # Job results are served back as files, so the response text is always saved
+        self.file_manager.save_text = True
         
-        return successful
+        if config.get("trace", True):
+            tracer.start(config.get("trace_path") or os.path.join(
+                output_dir, "traces", f"service_{time.strftime('%Y%m%d_%H%M%S')}.jsonl"
+            ))
+        if not self.processor.backend.check_running():
+            print("Error: Unable to start or access ChatGPT application.")
+            return False
+        
+        queue = JobQueue(
+            service_config.get("db_path") or os.path.join(output_dir, "jobs.sqlite"),
+            max_depth=service_config.get("max_queue", 100),
+            max_per_submitter=service_config.get("max_per_submitter", 20)
+        )
+        watchdog = Watchdog.from_config(self.app_controller, config) if self.image_processor is not None else None
+        if watchdog is not None:
+            watchdog.start(armed=False)
+        service = JobService(queue, self.processor, config, os.path.join(output_dir, "jobs"), watchdog=watchdog)
+        try:
+            serve(
+                service,
+                host=service_config.get("host", "127.0.0.1"),
+                port=port or service_config.get("port", 8765),
+                socket_path=socket_path or service_config.get("socket") or None
+            )
+        finally:
+            if watchdog is not None:
+                watchdog.stop()
+            queue.close()
+            tracer.stop()
+        return True
     
     def run(self):
         """
         Run the batch processing workflow
         
+        The outcome is also stored in self.report for the job runner.
+        
         Returns:
             bool: Whether processing was successful
         """
+        started = time.time()
+        owns_trace = False
+        watchdog = None
+        self.report = {
+            "config": self.config_manager.config_file,
+            "successful": 0,
+            "total": 0,
+            "failed_items": [],
+            "duration": 0.0,
+            "completed": False
+        }
+        self.invalid_items = {}
         try:
             # Load configuration
             config = self.config_manager.config
             output_dir = config["output_dir"]
             self.file_manager.prepare_output_folder(output_dir)
+            self.file_manager.configure_output(output_dir, config)
+            
+            # Open the task ledger so captured tasks from earlier runs are skipped
+            if config.get("resume", True):
+                ledger_path = config.get("ledger_path") or os.path.join(output_dir, "task_ledger.sqlite")
+                self.ledger = TaskLedger(ledger_path)
+                # Budgets and backoff carry over from earlier runs
+                self.pacer.restore(self.ledger.get_meta("pacer"))
+                if self.shard is not None:
+                    # Lets the merge step tell which shard produced this folder
+                    self.ledger.set_meta("shard", f"{self.shard[0]}/{self.shard[1]}")
+            
+            # Record per-phase timings of this run, unless a job runner already records all of its runs
+            if config.get("trace", True) and tracer.file is None:
+                owns_trace = True
+                tracer.start(config.get("trace_path") or os.path.join(
+                    output_dir, "traces", f"trace_{time.strftime('%Y%m%d_%H%M%S')}.jsonl"
+                ))
+            
+            # Recover the GUI when a task stops making progress; armed once the task loop starts,
+            # so settings prompts and the input scan cannot trip it
+            if self.image_processor is not None:
+                watchdog = Watchdog.from_config(self.app_controller, config)
+                if watchdog is not None:
+                    watchdog.start(armed=False)
 
             # Read default prompt file
             prompts_file = config["default_prompts_file"]
-            default_prompt_content = self.file_manager.read_prompt_file(prompts_file)
-            if not default_prompt_content:
+            if not os.path.isfile(prompts_file):
+                print(f"Error: Prompt file not found: {prompts_file}")
                 print("Program exit: Prompt file is empty or cannot be read.")
                 return False
 
@@ -237,7 +606,7 @@ class ChatGPTBatchProcessor:
             
             # Ensure ChatGPT is running
             print("Checking ChatGPT application status...")
-            if not self.app_controller.check_chatgpt_running():
+            if not self.processor.backend.check_running():
                 print("Unable to start or access ChatGPT. Exiting program.")
                 return False
             
@@ -247,6 +616,8 @@ class ChatGPTBatchProcessor:
                 image_folder = config.get("image_folder")
                 if not os.path.isdir(image_folder):
                     print(f"Invalid folder in configuration: {image_folder}")
+                    if self.non_interactive:
+                        return False
                     user_input = input("Please enter a valid image folder path: ").strip()
                     if not os.path.isdir(user_input):
                         print(f"Invalid folder: {user_input}")
@@ -258,60 +629,295 @@ class ChatGPTBatchProcessor:
 
             # Prepare task list based on input type
             if config["mode"]["input_type"] == "text_image":
-                # Text+Image mode: Collect image files
+                # Text+Image mode: the whole prompt file is one prompt used for every image
+                default_prompt_content = self.file_manager.read_prompt_file(prompts_file)
+                if not default_prompt_content:
+                    print("Program exit: Prompt file is empty or cannot be read.")
+                    return False
+                
+                # Collect image files
                 num_to_process = config.get("num_images_to_process", 100)
-                items = self.file_manager.collect_image_files(image_folder, num_to_process)
+                items = self.file_manager.collect_image_files(
+                    image_folder,
+                    num_to_process,
+                    seed=config.get("image_sample_seed", 0),
+                    recursive=config.get("recursive_images", True),
+                    manifest_path=config.get("image_manifest") or os.path.join(output_dir, "image_manifest.json"),
+                    exclude=[output_dir]
+                )
                 
                 if not items:
                     print("No valid images found in the specified folder.")
                     return False
                 
-                print(f"\nProcessing {len(items)} images.\n")
+                # Keep this machine's part of the batch; every shard samples the same subset first
+                if self.shard is not None:
+                    items = [item for item in items if self.in_shard(item)]
+                    print(f"Shard {self.shard[0]}/{self.shard[1]}: {len(items)} images")
+                    if not items:
+                        print("No images belong to this shard.")
+                        return False
+                
+                # Validate and convert inputs up front so bad files fail before any GUI work
+                if config.get("preflight_images", True):
+                    from utils.preflight import ImagePreflight
+                    
+                    preflight = ImagePreflight.from_config(config)
+                    with tracer.span("preflight"):
+                        converted, failed = preflight.run([os.path.join(image_folder, item) for item in items])
+                    self.converted_images = converted
+                    # Rejected inputs are failed items of this run, not silently dropped ones
+                    for item in items:
+                        source_path = os.path.join(image_folder, item)
+                        if source_path not in failed:
+                            continue
+                        self.invalid_items[item] = f"invalid image: {failed[source_path]}"
+                        if self.ledger is not None:
+                            key, content_hash = TaskLedger.make_key(item, default_prompt_content, source_path)
+                            self.ledger.mark(key, item, content_hash, "failed", finished_at=time.time())
+                    items = [item for item in items if os.path.join(image_folder, item) in converted]
+                    if not items:
+                        print("No valid images found in the specified folder.")
+                        return False
+                
+                total = len(items)
+                prompts = self.prepare_prompts(config, total, prompt_content=default_prompt_content)
+                print(f"\nProcessing {total} images.\n")
             else:
-                # Text-only mode: Use line count as items
-                lines = [line for line in default_prompt_content.strip().split('\n') if line.strip()]
-                items = list(range(len(lines)))  # Use indices as items
-                if not items:
+                # Text-only mode: stream one prompt per line, counted by the prompt index
+                prefix = config.get("text_prefix", "") if config.get("use_prefix", False) else ""
+                source = PromptSource(prompts_file, prefix=prefix, field=config.get("prompt_field", "prompt"))
+                num_lines = source.count()
+                if not num_lines:
                     print("No valid content lines found in the prompt file.")
                     return False
-                print(f"\nProcessing {len(lines)} text prompts.\n")
+                total = config.get("num_prompts_to_process") or num_lines
+                display_total = total
+                
+                # Resume after the prompts an earlier run already captured, seeking instead of re-reading
+                start = 0
+                if self.ledger is not None:
+                    size, mtime = source.file_signature()
+                    self.cursor_key = f"prompt_cursor:{os.path.abspath(prompts_file)}:{size}:{mtime}:{prefix}"
+                    if self.shard is not None:
+                        self.cursor_key += f":shard{self.shard[0]}/{self.shard[1]}"
+                    start = min(self.ledger.get_meta(self.cursor_key, 0), total)
+                    self.cursor = start
+                    if start:
+                        print(f"Resuming at prompt #{start + 1}; earlier prompts were captured in previous runs.")
+                
+                items = range(start, total)  # Use indices as items
+                prompts = self.prepare_prompts(config, total, prompt_source=source, start=start)
+                if self.shard is not None:
+                    # Prompts are still read in order; only this shard's indices are kept
+                    prompts = (prompt for index, prompt in zip(items, prompts) if self.in_shard(index))
+                    items = [index for index in items if self.in_shard(index)]
+                    total = sum(1 for index in range(total) if self.in_shard(index))
+                    print(f"Shard {self.shard[0]}/{self.shard[1]}: {total} of {display_total} prompts")
+                print(f"\nProcessing {len(items)} text prompts.\n")
             
-            # Prepare prompt list
-            prompts = self.prepare_prompts(default_prompt_content, len(items), config)
+            if config["mode"]["input_type"] == "text_image":
+                display_total = total
             
-            # Process tasks
-            successful = self.process_tasks(items, prompts, config, image_folder)
+            # Process tasks; items before the resume point were captured in earlier runs
+            if watchdog is not None:
+                watchdog.arm()
+            with tracer.span("run"):
+                successful = (self.process_tasks(items, prompts, config, image_folder, display_total)
+                              + (total - len(items)))
+            tracer.set_task(None)
+            if watchdog is not None:
+                watchdog.disarm()
             
             # Display statistics
+            total += len(self.invalid_items)
+            failed_items = list(self.invalid_items) + self.failed_items
             print(f"\n=== Processing Complete ===")
-            print(f"Successful: {successful}/{len(items)}")
+            print(f"Successful: {successful}/{total}")
+            failed_path = os.path.join(output_dir, "failed_items.txt")
+            if os.path.exists(failed_path):
+                os.remove(failed_path)  # Drop the list of an earlier run
+            if failed_items:
+                # One item per line; rejected inputs carry their reason after a tab
+                lines = [f"{item_name}\t{self.invalid_items[item_name]}" if item_name in self.invalid_items
+                         else item_name for item_name in failed_items]
+                self.file_manager.save_text_to_file("\n".join(lines) + "\n", failed_path)
+                print(f"Never succeeded ({len(failed_items)}, listed in {failed_path}):")
+                for item_name in failed_items:
+                    reason = self.invalid_items.get(item_name)
+                    print(f"  {item_name} ({reason})" if reason else f"  {item_name}")
+            self.report.update(successful=successful, total=total, failed_items=failed_items,
+                               invalid_items=dict(self.invalid_items), completed=True)
+            rollovers = self.processor.rollover.counts
+            if rollovers:
+                reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(rollovers.items()))
+                print(f"Conversation rollovers: {sum(rollovers.values())} ({reasons})")
+            self.report["rollovers"] = dict(rollovers)
+            if self.processor.locator is not None:
+                locator = self.processor.locator
+                print(f"Image positions: {locator.hits} reused from cache, {locator.searches} searched")
+            liveness = self.app_controller.liveness_stats()
+            if liveness["hits"] or liveness["misses"]:
+                print(f"App liveness checks: {liveness['hits']} cached, {liveness['misses']} queried "
+                      f"(hit rate {liveness['hit_rate']:.0%})")
+            reads = self.app_controller.read_stats()
+            if reads["reads"]:
+                print(f"Transcript reads: {reads['reads']}, {reads['mean_chars']:.0f} characters and "
+                      f"{reads['mean_seconds'] * 1000:.0f} ms per read on average")
+            self.report["transcript_reads"] = reads
+            script_host = self.app_controller.script_host
+            recovery = {"script_timeouts": self.app_controller.script_timeouts,
+                        "script_host_restarts": script_host.restarts if script_host is not None else 0}
+            if watchdog is not None:
+                recovery.update(watchdog.report())
+            if any(value for value in recovery.values() if not isinstance(value, dict)):
+                print(f"Recovery: {recovery['script_timeouts']} script timeouts, "
+                      f"{recovery['script_host_restarts']} script host restarts, {recovery.get('hangs', 0)} hangs")
+                for action, count in recovery.get("actions", {}).items():
+                    if count:
+                        print(f"  {action}: {count}")
+            self.report["recovery"] = recovery
+            if owns_trace:
+                tracer.stop()
+                print("\nPhase timings (seconds):")
+                summarize(tracer.path)
             
-            return successful == len(items)
+            return successful == total
             
         except Exception as e:
             print(f"Error occurred during program execution: {str(e)}")
             import traceback
             traceback.print_exc()
             return False
+        finally:
+            if watchdog is not None:
+                watchdog.stop()
+            self.report["duration"] = time.time() - started
+            self.file_manager.close_output()
+            if self.ledger is not None:
+                self.ledger.close()
+            if owns_trace:
+                tracer.stop()
+
 
+def serve_jobs(config_path=None, port=None, socket_path=None):
+    """
+    Run the local job service: jobs submitted over HTTP are processed one at a time by this process
+    
+    Args:
+        config_path (str, optional): Configuration file path
+        port (int, optional): Listen port, overrides service.port
+        socket_path (str, optional): Unix socket path, overrides service.socket
+        
+    Returns:
+        int: Exit code
+    """
+    processor = ChatGPTBatchProcessor(config_path, non_interactive=True)
+    return 0 if processor.serve(port, socket_path) else 1
 
-def main(config_path=None):
+
+def main(config_path=None, non_interactive=False, shard=None):
     """Main program entry point"""
-    processor = ChatGPTBatchProcessor(config_path)
+    overrides = {"shard": shard} if shard else None
+    processor = ChatGPTBatchProcessor(config_path, non_interactive=non_interactive, overrides=overrides)
     result = processor.run()
     return 0 if result else 1
 
 
+def run_jobs(job_file):
+    """
+    Run several configurations back to back in one process, never prompting
+    
+    The job file is a JSON list of config paths or {"config": path, "overrides": {...}} entries,
+    or an object {"jobs": [...], "defaults": {...}, "trace_path": "..."} where defaults are
+    overrides applied to every job. All jobs share the app controller, image processor, locator
+    and pacer, and write one combined trace.
+    
+    Args:
+        job_file (str): Job file path
+        
+    Returns:
+        int: Exit code, 0 if every job succeeded
+    """
+    with open(job_file, 'r', encoding='utf-8') as file:
+        spec = json.load(file)
+    if isinstance(spec, list):
+        spec = {"jobs": spec}
+    defaults = spec.get("defaults", {})
+    
+    trace_path = spec.get("trace_path") or os.path.join(
+        os.path.dirname(os.path.abspath(job_file)), "traces", f"jobs_{time.strftime('%Y%m%d_%H%M%S')}.jsonl"
+    )
+    tracer.start(trace_path)
+    
+    shared = {}
+    reports = []
+    for number, job in enumerate(spec["jobs"], start=1):
+        if isinstance(job, str):
+            job = {"config": job}
+        overrides = dict(defaults)
+        overrides.update(job.get("overrides", {}))
+        print(f"\n##### Job {number}/{len(spec['jobs'])}: {job['config']} #####")
+        report = {"config": job["config"], "successful": 0, "total": 0, "failed_items": [], "duration": 0.0,
+                  "completed": False}
+        # A missing config would otherwise be created with default settings
+        if not os.path.isfile(job["config"]):
+            print(f"Error: Configuration file not found: {job['config']}")
+        else:
+            try:
+                processor = ChatGPTBatchProcessor(job["config"], non_interactive=True, overrides=overrides,
+                                                  shared=shared)
+                processor.run()
+                report = processor.report
+            except Exception as exc:
+                print(f"Error occurred while setting up the job: {exc}")
+        reports.append(report)
+    tracer.stop()
+    
+    # Combined report
+    print(f"\n=== Job Report ===")
+    print(f"{'config':<48}{'successful':>12}{'failed':>8}{'minutes':>9}")
+    for report in reports:
+        status = f"{report['successful']}/{report['total']}" if report["completed"] else "error"
+        print(f"{report['config'][-48:]:<48}{status:>12}{len(report['failed_items']):>8}"
+              f"{report['duration'] / 60:>9.1f}")
+    successful = sum(report["successful"] for report in reports)
+    total = sum(report["total"] for report in reports)
+    print(f"Total: {successful}/{total} successful in {sum(r['duration'] for r in reports) / 60:.1f} minutes")
+    
+    report_path = f"{os.path.splitext(job_file)[0]}.report.json"
+    with open(report_path, 'w', encoding='utf-8') as file:
+        json.dump({"jobs": reports, "successful": successful, "total": total, "trace": trace_path}, file, indent=2)
+    print(f"Report saved to {report_path}")
+    print("\nPhase timings of all jobs (seconds):")
+    summarize(trace_path)
+    
+    all_done = all(report["completed"] and report["successful"] == report["total"] for report in reports)
+    return 0 if all_done else 1
+
+
 if __name__ == "__main__":
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="ChatGPT Automation Batch Processing Tool")
     parser.add_argument("--config_path", type=str, help="Path to the configuration file", default="example/text-only/config.json")
+    parser.add_argument("--non-interactive", action="store_true", help="Never prompt; invalid settings end the run")
+    parser.add_argument("--jobs", type=str, help="Job file listing configurations to run back to back")
+    parser.add_argument("--shard", type=str, help="Process only shard i of n (i/n, e.g. 0/3) of the batch")
+    parser.add_argument("--serve", action="store_true", help="Run the local job service instead of a batch")
+    parser.add_argument("--port", type=int, help="Job service port")
+    parser.add_argument("--socket", type=str, help="Serve jobs on this Unix socket instead of a TCP port")
     args = parser.parse_args()
 
+    if args.serve:
+        sys.exit(serve_jobs(args.config_path, args.port, args.socket))
+
+    if args.jobs:
+        sys.exit(run_jobs(args.jobs))
+
     # Update configuration path if provided
     if args.config_path:
-        sys.exit(main(args.config_path))
+        sys.exit(main(args.config_path, args.non_interactive, args.shard))
     else:
-        sys.exit(main())
+        sys.exit(main(non_interactive=args.non_interactive, shard=args.shard))
 
 # python chatgpt_script.py --config_path example/text-image/config.json
\ No newline at end of file
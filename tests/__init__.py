@@ -0,0 +1,13 @@
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+
+class QuietTestCase(unittest.TestCase):
+    """Test case that captures everything printed during a test in self.output"""
+
+    def setUp(self):
+        self.output = StringIO()
+        quiet = redirect_stdout(self.output)
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
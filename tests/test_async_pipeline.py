@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from tests import QuietTestCase
+from utils.async_pipeline import AsyncPipeline
+from utils.file_manager import FileManager
+from utils.output_sink import ShardedTarSink, load_index, read_member
+from utils.processor import Processor
+from utils.simulated_backend import SimulatedBackend
+from utils.task_queue import TaskQueue
+from utils.tracer import summarize, tracer
+
+
+class AsyncPipelineTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_dir = directory.name
+        self.config = {
+            "output_dir": self.output_dir,
+            "mode": {"window_type": "single", "input_type": "text_only", "capture_images": True},
+            "x": 10,
+            "y": 10,
+            "response_timeout": 120,
+            "save_image_delay": 15,
+            "retry": {"max_attempts": 3, "cooldown": 0.01}
+        }
+
+    def run_pipeline(self, count, settings):
+        self.backend = SimulatedBackend(dict({"seed": 3, "time_scale": 0.0005}, **settings))
+        self.file_manager = FileManager(self.output_dir)
+        self.file_manager.configure_output(self.output_dir, self.config)
+        self.addCleanup(self.file_manager.close_output)
+        processor = Processor(SimpleNamespace(config=self.config), None, None, self.file_manager,
+                              backend=self.backend)
+        tasks = [{"item_name": f"prompt_{index + 1}", "prompt": f"Draw item {index}", "img_path": None}
+                 for index in range(count)]
+        done = {}
+        AsyncPipeline(processor, queue_size=2, io_workers=3).run(
+            TaskQueue.from_config(tasks, self.config),
+            self.config,
+            on_done=lambda task, success: done.__setitem__(task["item_name"], success)
+        )
+        return done
+
+    def test_every_task_finishes_once(self):
+        done = self.run_pipeline(8, {"send_failure_rate": 0.0, "empty_image_rate": 0.0})
+        self.assertEqual(done, {f"prompt_{index + 1}": True for index in range(8)})
+        for name in done:
+            self.assertTrue(os.path.exists(os.path.join(self.output_dir, f"{name}_ChatDe.png")))
+
+    def test_tar_output_writes_no_loose_images(self):
+        self.config["output_format"] = "tar"
+        done = self.run_pipeline(4, {"send_failure_rate": 0.0, "empty_image_rate": 0.0})
+        self.file_manager.close_output()
+        self.assertEqual(done, {f"prompt_{index + 1}": True for index in range(4)})
+        index = load_index(self.output_dir)
+        for name in done:
+            png = read_member(self.output_dir, ShardedTarSink.make_key(name), "png", index)
+            self.assertTrue(png.startswith(b"\x89PNG"))
+        self.assertEqual([name for name in os.listdir(self.output_dir) if name.endswith(".png")], [])
+
+    def test_failed_tasks_are_retried_before_giving_up(self):
+        done = self.run_pipeline(6, {"send_failure_rate": 0.0, "empty_image_rate": 1.0})
+        self.assertEqual(done, {f"prompt_{index + 1}": False for index in range(6)})
+        self.assertEqual(set(self.backend.send_attempts.values()), {3})
+
+    def test_trace_counts_executor_work_once(self):
+        path = os.path.join(self.output_dir, "trace.jsonl")
+        tracer.start(path)
+        self.addCleanup(tracer.stop)
+        with tracer.span("run"):
+            self.run_pipeline(6, {"send_failure_rate": 0.0, "empty_image_rate": 0.0})
+        tracer.set_task(None)
+        tracer.stop()
+
+        summary = summarize(path)
+        self.assertEqual(summary["phases"]["task"]["count"], 6)
+        self.assertEqual(summary["phases"]["finish"]["count"], 6)
+        self.assertAlmostEqual(summary["wall"], summary["phases"]["run"]["total"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from io import BytesIO
+
+from tests import QuietTestCase
+from utils.http_backend import HTTPImageBackend, make_stand_in
+
+
+class HTTPBackendTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir, True)
+        self.config = {"output_dir": self.output_dir}
+
+    def start_stand_in(self, **settings):
+        server = make_stand_in(port=0, latency=0, **settings)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        backend = HTTPImageBackend(f"http://127.0.0.1:{server.server_address[1]}/v1", concurrency=2,
+                                   timeout=10, retry_base=0.01)
+        self.addCleanup(backend.shutdown)
+        return backend
+
+    def test_image_is_downloaded_to_output_path(self):
+        backend = self.start_stand_in()
+        target = os.path.join(self.output_dir, "item_ChatDe.png")
+        handle = backend.new_chat(self.config)
+        self.assertEqual(backend.ask(handle, "a cat", None, self.config, "item"), "stand-in image")
+        self.assertTrue(backend.fetch_image(handle, "item", target))
+        with open(target, "rb") as file:
+            self.assertTrue(file.read().startswith(b"\x89PNG"))
+        self.assertEqual(os.listdir(os.path.join(self.output_dir, ".downloads")), [])
+
+    def test_image_is_written_to_buffer(self):
+        backend = self.start_stand_in()
+        target = BytesIO()
+        handle = backend.new_chat(self.config)
+        backend.ask(handle, "a cat", None, self.config, "item")
+        self.assertTrue(backend.fetch_image(handle, "item", target))
+        self.assertTrue(target.getvalue().startswith(b"\x89PNG"))
+        self.assertEqual(os.listdir(os.path.join(self.output_dir, ".downloads")), [])
+
+    def test_connections_are_reused(self):
+        backend = self.start_stand_in()
+        for index in range(3):
+            handle = backend.new_chat(self.config)
+            backend.ask(handle, f"prompt {index}", None, self.config, f"item_{index}")
+            backend.close(handle)
+        self.assertEqual(backend.pool.created, 1)
+        self.assertGreater(backend.pool.reused, 0)
+
+    def test_retries_honor_retry_after(self):
+        # Seed 67 answers the first request with 429, the retry with 500 and the next one normally
+        backend = self.start_stand_in(failure_rate=0.9, seed=67)
+        start = time.time()
+        result = backend.generate("a cat", None, os.path.join(self.output_dir, "item.png"))
+        self.assertEqual(result["text"], "stand-in image")
+        self.assertEqual(backend.retries, 2)
+        self.assertGreaterEqual(time.time() - start, 1.0)
+        log = self.output.getvalue()
+        self.assertIn("HTTP 429 from /v1/images/generations, retrying in 1.0 seconds (1/3)", log)
+        self.assertIn("HTTP 500 from /v1/images/generations, retrying in 0.0 seconds (2/3)", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import base64
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer
+
+from tests import QuietTestCase
+from utils.job_service import JobQueue, JobRequestHandler, JobService, QueueFullError
+from utils.watchdog import Watchdog
+
+
+class JobQueueTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.queue = JobQueue(os.path.join(directory.name, "jobs.db"), max_depth=6, max_per_submitter=4)
+        self.addCleanup(self.queue.close)
+
+    def test_claims_round_robin_between_submitters(self):
+        for index in range(3):
+            self.queue.submit("alice", f"a{index}")
+        self.queue.submit("bob", "b0")
+        self.queue.submit("bob", "b1")
+
+        prompts = []
+        while True:
+            job = self.queue.claim()
+            if job is None:
+                break
+            prompts.append(job["prompt"])
+            self.queue.finish(job["id"], "done")
+        self.assertEqual(prompts, ["a0", "b0", "a1", "b1", "a2"])
+
+    def test_queued_ahead_follows_round_robin(self):
+        alice = [self.queue.submit("alice", f"a{index}") for index in range(3)]
+        bob = self.queue.submit("bob", "b0")
+        self.assertEqual([self.queue.get(job_id)["queued_ahead"] for job_id in alice + [bob]], [0, 2, 3, 1])
+        self.queue.finish(self.queue.claim()["id"], "done")
+        self.assertEqual(self.queue.get(bob)["queued_ahead"], 0)
+        self.assertEqual(self.queue.get(alice[1])["queued_ahead"], 1)
+
+    def test_rejects_submitter_over_its_share(self):
+        for index in range(4):
+            self.queue.submit("alice", f"a{index}")
+        with self.assertRaises(QueueFullError) as caught:
+            self.queue.submit("alice", "a4")
+        self.assertGreaterEqual(caught.exception.retry_after, 1)
+        self.queue.submit("bob", "b0")
+
+    def test_rejects_when_queue_is_full(self):
+        for index in range(3):
+            self.queue.submit("alice", f"a{index}")
+            self.queue.submit("bob", f"b{index}")
+        with self.assertRaises(QueueFullError):
+            self.queue.submit("carol", "c0")
+
+    def test_finished_jobs_free_their_slot(self):
+        for index in range(4):
+            self.queue.submit("alice", f"a{index}")
+        job = self.queue.claim()
+        self.queue.finish(job["id"], "done")
+        self.queue.submit("alice", "a4")
+
+
+class JobRequestHandlerTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.jobs_dir = os.path.join(directory.name, "jobs")
+        queue = JobQueue(os.path.join(directory.name, "jobs.db"), max_depth=2, max_per_submitter=1)
+        self.addCleanup(queue.close)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), JobRequestHandler)
+        server.service = JobService(queue, None, {}, self.jobs_dir)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.port = server.server_address[1]
+
+    def post(self, body):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        self.addCleanup(connection.close)
+        connection.request("POST", "/jobs", json.dumps(body), {"X-Submitter": "alice"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_rejected_upload_is_removed(self):
+        image = base64.b64encode(b"\x89PNG").decode()
+        status, _ = self.post({"prompt": "first", "image_base64": image})
+        self.assertEqual(status, 202)
+        status, _ = self.post({"prompt": "second", "image_base64": image})
+        self.assertEqual(status, 429)
+        self.assertEqual(len(os.listdir(os.path.join(self.jobs_dir, "uploads"))), 1)
+
+
+class RecordingController:
+    def __init__(self):
+        self.calls = []
+
+    def dismiss_dialog(self):
+        self.calls.append("dismiss_dialog")
+
+    def reactivate_app(self):
+        self.calls.append("reactivate_app")
+
+    def restart_app(self):
+        self.calls.append("restart_app")
+
+
+class WatchdogTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        self.controller = RecordingController()
+        self.watchdog = Watchdog(self.controller, hang_timeout=0.1, check_interval=0.01)
+        self.addCleanup(self.watchdog.stop)
+
+    def test_escalates_once_through_every_action(self):
+        self.watchdog.start()
+        time.sleep(0.8)
+        self.assertEqual(self.controller.calls, ["dismiss_dialog", "reactivate_app", "restart_app"])
+        self.assertEqual(self.watchdog.report()["hangs"], 3)
+
+    def test_does_nothing_while_disarmed(self):
+        self.watchdog.start(armed=False)
+        time.sleep(0.3)
+        self.assertEqual(self.controller.calls, [])
+
+        self.watchdog.arm()
+        time.sleep(0.15)
+        self.watchdog.disarm()
+        calls = list(self.controller.calls)
+        self.assertEqual(calls, ["dismiss_dialog"])
+        time.sleep(0.3)
+        self.assertEqual(self.controller.calls, calls)
+
+    def test_arming_restarts_the_escalation(self):
+        self.watchdog.start()
+        time.sleep(0.8)
+        self.watchdog.disarm()
+        self.watchdog.arm()
+        time.sleep(0.15)
+        self.assertEqual(self.controller.calls[-1], "dismiss_dialog")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import time
+import unittest
+
+from tests import QuietTestCase
+from utils.http_backend import HTTPImageBackend
+from utils.pacer import Pacer, RateLimitError
+from utils.simulated_backend import SimulatedBackend
+
+
+class ClassifyTest(unittest.TestCase):
+    RATE_LIMITS = [
+        "You've reached the current usage cap for GPT-4o, please try again after 5:04 PM.",
+        "Sure!\nYou’ve hit the plus plan limit for image generations requests. "
+        "You can create more images when the limit resets in 23 hours and 59 minutes.",
+        "You've reached our limit of messages per hour. Please try again later.",
+        "You're generating images too quickly. To ensure the best experience for everyone, we have rate limits "
+        "in place. Please wait for 2 minutes before generating more images.",
+        "Too many requests in 1 hour. Try again later.",
+        "HTTP 429: Rate limit reached for images per minute. Please try again in 12s.",
+        "HTTP 429: You exceeded your current quota, please check your plan and billing details.",
+    ]
+
+    ORDINARY = [
+        "Once you've reached step 3, fold in the flour.",
+        "Please wait for the dough to rise before baking.",
+        "Please wait 10 minutes before taking the cake out of the oven.",
+        "When you have reached the summit, the view opens up to the west.",
+        "Most public APIs enforce a rate limit, so batch your calls.",
+        "The usage limit of the free tier is documented in the pricing page.",
+        "If you have too many requests in flight, use a queue.",
+    ]
+
+    def setUp(self):
+        self.pacer = Pacer(min_interval=0)
+
+    def test_limit_notices_are_rate_limits(self):
+        for text in self.RATE_LIMITS:
+            with self.subTest(text=text):
+                self.assertEqual(self.pacer.classify(text), "rate_limit")
+
+    def test_ordinary_replies_are_not_rate_limits(self):
+        for text in self.ORDINARY:
+            with self.subTest(text=text):
+                self.assertEqual(self.pacer.classify(text), "ok")
+
+    def test_backend_limit_messages_are_rate_limits(self):
+        backend = SimulatedBackend({"time_scale": 0})
+        backend.conversations[1] = {"response_at": 0, "limited": True, "prompt": "p"}
+        self.assertEqual(self.pacer.classify(backend.response_text(1)), "rate_limit")
+        message = HTTPImageBackend.error_message(429, b'{"error": {"message": "Slow down"}}')
+        self.assertEqual(self.pacer.classify(message), "rate_limit")
+
+    ERRORS = [
+        "Something went wrong. If this issue persists, contact us.",
+        "Something went wrong while generating the response. If this issue persists please contact us.",
+        "Here is the first part.\nA network error occurred. Please check your connection and try again.",
+        "An error occurred. Either the engine you requested does not exist or there was another issue.",
+        "Error in message stream",
+        "Response timeout after waiting 130 seconds.",
+        "HTTP 500: The server had an error",
+    ]
+
+    ORDINARY_ERRORS = [
+        "If an error occurred during install, rerun pip.",
+        "Check the router if you see a network error.",
+        "If something went wrong, open the log file first.",
+        "The tool prints an error in the body stream section of the log.",
+        "A 503 is answered like this: HTTP 503: Service Unavailable",
+    ]
+
+    def test_error_notices_are_errors(self):
+        for text in self.ERRORS:
+            with self.subTest(text=text):
+                self.assertEqual(self.pacer.classify(text), "error")
+        self.assertEqual(self.pacer.classify(None), "ok")
+
+    def test_ordinary_replies_are_not_errors(self):
+        for text in self.ORDINARY_ERRORS:
+            with self.subTest(text=text):
+                self.assertEqual(self.pacer.classify(text), "ok")
+
+    def test_only_the_tail_is_classified(self):
+        pacer = Pacer(tail_chars=100)
+        text = self.RATE_LIMITS[0] + "\n" + "Here is your image. " * 20
+        self.assertEqual(pacer.classify(text), "ok")
+
+    def test_extra_patterns(self):
+        pacer = Pacer(extra_patterns=[r"kontingent erreicht"])
+        self.assertEqual(pacer.classify("Dein Kontingent erreicht."), "rate_limit")
+
+
+class BackoffTest(QuietTestCase):
+    def test_check_raises_and_backs_off(self):
+        pacer = Pacer(min_interval=0, backoff_base=10, backoff_max=100)
+        with self.assertRaises(RateLimitError):
+            pacer.check("Too many requests in 1 hour. Try again later.")
+        self.assertEqual(pacer.consecutive, 1)
+        self.assertGreater(pacer.delay(), 4)
+
+    def test_backoff_grows_and_resets(self):
+        pacer = Pacer(min_interval=0, backoff_base=10, backoff_max=25)
+        delays = [pacer.throttle() for _ in range(4)]
+        pacer.check("Here is your image.")
+        self.assertEqual(pacer.consecutive, 0)
+        # Equal jitter keeps at least half of each capped exponential delay
+        for attempt, delay in enumerate(delays):
+            self.assertGreaterEqual(delay, min(25, 10 * 2 ** attempt) / 2 - 0.1)
+        self.assertLessEqual(max(delays), 25 + 0.1)
+
+    def test_retry_after_is_read_from_the_message(self):
+        pacer = Pacer()
+        self.assertEqual(pacer.parse_retry_after("Please wait for 2 minutes before generating more images."), 120)
+        self.assertEqual(pacer.parse_retry_after("Try again in 12s."), 12)
+        self.assertIsNone(pacer.parse_retry_after("Try again later."))
+        seconds = pacer.parse_retry_after("please try again after 5:04 PM")
+        self.assertTrue(0 < seconds <= 86400)
+
+    def test_budget_limits_sends(self):
+        pacer = Pacer(hourly_budget=2, min_interval=0)
+        pacer.take()
+        pacer.take()
+        self.assertGreater(pacer.delay(), 60)
+        self.assertLess(time.time() - pacer.started, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tests import QuietTestCase
+from utils.prompt_source import PromptSource
+
+
+class PromptSourceTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def source(self, name, content, **kwargs):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write(content)
+        source = PromptSource(path, **kwargs)
+        source.count()
+        return source
+
+    def test_txt_skips_blank_lines(self):
+        source = self.source("prompts.txt", "one\n\n  \ntwo\r\nthree")
+        self.assertEqual(source.count(), 3)
+        self.assertEqual(list(source.iter_from()), ["one", "two", "three"])
+
+    def test_csv_quoted_newlines_stay_in_one_prompt(self):
+        content = 'id,prompt\n1,"first line\nsecond line"\n2,"say ""hi""\n\nbye"\n3,plain\n'
+        source = self.source("prompts.csv", content)
+        self.assertEqual(source.count(), 3)
+        self.assertEqual(list(source.iter_from()),
+                         ["first line\nsecond line", 'say "hi"\n\nbye', "plain"])
+
+    def test_empty_prompts_are_skipped(self):
+        lines = [{"prompt": "a"}, {"other": "x"}, {"prompt": ""}, {"prompt": None}, {"prompt": "b"}]
+        content = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+        source = self.source("prompts.jsonl", content)
+        self.assertEqual(source.count(), 2)
+        self.assertEqual(source.load_index()["skipped"], 4)
+        self.assertEqual(list(source.iter_from()), ["a", "b"])
+
+    def test_csv_empty_cells_are_skipped(self):
+        source = self.source("prompts.csv", "prompt,id\nx,1\n,2\ny,3\n")
+        self.assertEqual(list(source.iter_from()), ["x", "y"])
+
+    def test_seek_through_sparse_index(self):
+        content = 'prompt\n' + "".join(f'"p{i}\nline"\n' for i in range(25))
+        source = self.source("prompts.csv", content, index_stride=4, prefix="> ")
+        self.assertEqual(source.count(), 25)
+        self.assertEqual(list(source.iter_from(10))[:2], ["> p10\nline", "> p11\nline"])
+        self.assertEqual(list(source.cycle(27, start=24)), ["> p24\nline", "> p0\nline", "> p1\nline"])
+
+    def test_cached_index_is_reused(self):
+        source = self.source("prompts.txt", "a\nb\n")
+        reloaded = PromptSource(source.path)
+        self.assertEqual(reloaded.load_index(), source.load_index())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from tests import QuietTestCase
+from utils.rollover import RolloverPolicy
+from utils.tracer import tracer
+
+
+class RolloverPolicyTest(QuietTestCase):
+    def test_no_limits_never_roll_over(self):
+        policy = RolloverPolicy()
+        for _ in range(50):
+            policy.record("x" * 1000, "y" * 1000, 100.0)
+        self.assertIsNone(policy.due())
+
+    def test_rolls_over_after_max_turns(self):
+        policy = RolloverPolicy(max_turns=3)
+        for _ in range(2):
+            policy.record("prompt", "response", 1.0)
+        self.assertIsNone(policy.due())
+        policy.record("prompt", "response", 1.0)
+        self.assertEqual(policy.due(), "turns")
+
+    def test_rolls_over_after_max_chars(self):
+        policy = RolloverPolicy(max_chars=100)
+        policy.record("a" * 40, "b" * 40, 1.0)
+        self.assertIsNone(policy.due())
+        policy.record("a" * 20, None, 1.0)
+        self.assertEqual(policy.due(), "chars")
+
+    def test_latency_needs_a_full_window(self):
+        policy = RolloverPolicy(latency_threshold=10.0, latency_window=3)
+        policy.record("prompt", "response", 30.0)
+        policy.record("prompt", "response", 30.0)
+        self.assertIsNone(policy.due())
+        policy.record("prompt", "response", 1.0)
+        self.assertEqual(policy.due(), "latency")
+        # Only the last three turns count
+        for _ in range(2):
+            policy.record("prompt", "response", 1.0)
+        self.assertIsNone(policy.due())
+
+    def test_reset_counts_rollovers_and_records_an_event(self):
+        events = []
+        tracer.listeners.append(events.append)
+        self.addCleanup(tracer.listeners.remove, events.append)
+        policy = RolloverPolicy(max_turns=1)
+        policy.record("prompt", "response", 2.0)
+        policy.reset(policy.due())
+        self.assertEqual((policy.turns, policy.chars, len(policy.latencies)), (0, 0, 0))
+        self.assertIsNone(policy.due())
+        # A fresh chat for a retry is not a rollover
+        policy.reset()
+        self.assertEqual(policy.counts, {"turns": 1})
+        self.assertEqual([(event["phase"], event["reason"], event["turns"]) for event in events],
+                         [("rollover", "turns", 1)])
+
+    def test_from_config(self):
+        policy = RolloverPolicy.from_config({"rollover": {"max_turns": 8, "max_chars": 500,
+                                                          "latency_threshold": 40.0, "latency_window": 5}})
+        self.assertEqual((policy.max_turns, policy.max_chars, policy.latency_threshold, policy.latencies.maxlen),
+                         (8, 500, 40.0, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from tests import QuietTestCase
+from utils.script_host import ScriptHost
+
+# Host speaking the ScriptHost protocol whose behaviour is chosen by the script text. Every
+# received request is appended to the log file given as its first argument.
+TEST_HOST = r'''
+import json, sys, time
+log = open(sys.argv[1], "a")
+for line in sys.stdin:
+    request = json.loads(line)
+    log.write(request["script"] + "\n")
+    log.flush()
+    if request["script"] == "hang":
+        time.sleep(60)
+    if request["script"] == "crash":
+        sys.exit(1)
+    if request["script"] == "stale":
+        sys.stdout.write(json.dumps({"id": request["id"] - 1, "stdout": "stale", "returncode": 0}) + "\n")
+        sys.stdout.write("not json\n")
+    sys.stdout.write(json.dumps({"id": request["id"], "stdout": request["script"], "returncode": 0, "stderr": ""}) + "\n")
+    sys.stdout.flush()
+'''
+
+
+class ScriptHostTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.log_path = os.path.join(directory, "requests.log")
+        self.host = ScriptHost([sys.executable, "-c", TEST_HOST, self.log_path])
+        self.addCleanup(self.host.stop)
+
+    def received(self):
+        with open(self.log_path, encoding="utf-8") as file:
+            return file.read().splitlines()
+
+    def test_stand_in_host_answers_requests(self):
+        host = ScriptHost([sys.executable, "-m", "utils.script_host", "--serve-stand-in"])
+        self.addCleanup(host.stop)
+        self.assertEqual(host.run('return "ok"', timeout=10), ("", 0, ""))
+        self.assertEqual(host.run('return "ok"', timeout=10), ("", 0, ""))
+        self.assertEqual((host.starts, host.restarts), (1, 0))
+
+    def test_reply_is_matched_to_its_request(self):
+        self.assertEqual(self.host.run("stale", timeout=10), ("stale", 0, ""))
+        self.assertEqual(self.host.run("second", timeout=10), ("second", 0, ""))
+
+    def test_restarts_after_host_crash(self):
+        self.assertEqual(self.host.run("first", timeout=10), ("first", 0, ""))
+        self.host.process.kill()
+        self.host.process.wait()
+        self.assertEqual(self.host.run("second", timeout=10), ("second", 0, ""))
+        self.assertEqual(self.host.restarts, 1)
+        self.assertEqual(self.received(), ["first", "second"])
+
+    def test_timeout_kills_host(self):
+        stdout, returncode, stderr = self.host.run("hang", timeout=0.5)
+        self.assertIsNone(stdout)
+        self.assertEqual(returncode, -1)
+        self.assertIn("timed out", stderr)
+        self.assertEqual(self.host.timeouts, 1)
+        self.assertFalse(self.host.is_alive())
+        self.assertEqual(self.host.run("after", timeout=10), ("after", 0, ""))
+        self.assertEqual(self.host.restarts, 1)
+
+    def test_delivered_request_is_not_run_again(self):
+        stdout, returncode, stderr = self.host.run("crash", timeout=10)
+        self.assertIsNone(stdout)
+        self.assertEqual(returncode, -1)
+        self.assertIn("exited", stderr)
+        self.assertEqual(self.received(), ["crash"])
+
+
+if __name__ == "__main__":
+    unittest.main()
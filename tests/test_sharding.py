@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tests import QuietTestCase
+from utils.file_manager import FileManager
+from utils.output_sink import ShardedTarSink, load_index, read_member, rebuild_index
+from utils.sharding import merge_shards, parse_shard, shard_of
+from utils.task_ledger import TaskLedger
+
+
+class ShardOfTest(unittest.TestCase):
+    def test_partition_is_stable_and_complete(self):
+        owners = [shard_of(index, 3) for index in range(300)]
+        self.assertEqual(owners, [shard_of(index, 3) for index in range(300)])
+        self.assertEqual(set(owners), {0, 1, 2})
+        self.assertEqual(shard_of(os.path.join("a", "b.png"), 5), shard_of("a/b.png", 5))
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("1/3"), (1, 3))
+        self.assertIsNone(parse_shard(""))
+        for spec in ("3/3", "x", "1/0"):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_shard(spec)
+
+
+class MergeTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, *parts):
+        return os.path.join(self.directory.name, *parts)
+
+    def tar_shard(self, name, items, shard=None):
+        shard_dir = self.path(name)
+        sink = ShardedTarSink(shard_dir)
+        for item in items:
+            record = {"item": item, "prompt": f"prompt {item}", "response": f"{name} answer"}
+            sink.write(item, {"png": f"{name}:{item}".encode(), "json": json.dumps(record).encode()})
+        sink.close()
+        if shard is not None:
+            ledger = TaskLedger(os.path.join(shard_dir, "task_ledger.sqlite"))
+            for number, item in enumerate(items):
+                ledger.mark(f"{item}:k", item, "hash", "captured", finished_at=1000 + number)
+            ledger.set_meta("shard", shard)
+            ledger.close()
+        return shard_dir
+
+    def flat_shard(self, name, items):
+        shard_dir = self.path(name)
+        for item in items:
+            os.makedirs(os.path.join(shard_dir, item), exist_ok=True)
+            with open(FileManager.image_path(shard_dir, item), 'wb') as file:
+                file.write(f"{name}:{item}".encode())
+            for file_name, text in (("output.txt", f"{name} answer"), ("prompt.txt", f"prompt {item}")):
+                with open(os.path.join(shard_dir, item, file_name), 'w', encoding='utf-8') as file:
+                    file.write(text)
+        return shard_dir
+
+    def test_tar_shards_merge_into_tar(self):
+        shards = [self.tar_shard("s0", ["prompt_1", "prompt_2"]), self.tar_shard("s1", ["prompt_3"])]
+        report = merge_shards(shards, self.path("merged"), expected=["prompt_1", "prompt_2", "prompt_3", "prompt_4"],
+                              count=2)
+        self.assertNotIn("Captured output missing", self.output.getvalue())
+        self.assertEqual(report["merged"], 3)
+        self.assertEqual([gap["item"] for gap in report["gaps"]], ["prompt_4"])
+
+        index = load_index(self.path("merged"))
+        self.assertEqual(read_member(self.path("merged"), "prompt_3_ChatDe", "png", index), b"s1:prompt_3")
+        record = json.loads(read_member(self.path("merged"), "prompt_1_ChatDe", "json", index))
+        self.assertEqual(record["response"], "s0 answer")
+
+    def test_owner_copy_wins_for_duplicates(self):
+        owner = shard_of(0, 2)
+        shards = [self.tar_shard(f"s{index}", ["prompt_1"], shard=f"{index}/2") for index in range(2)]
+        report = merge_shards(shards, self.path("merged"))
+        self.assertEqual(list(report["duplicates"]), ["prompt_1"])
+        index = load_index(self.path("merged"))
+        self.assertEqual(read_member(self.path("merged"), "prompt_1_ChatDe", "png", index),
+                         f"s{owner}:prompt_1".encode())
+
+    def test_flat_shards_keep_text_results(self):
+        shards = [self.flat_shard("s0", ["prompt_1"]), self.flat_shard("s1", ["prompt_2"])]
+        report = merge_shards(shards, self.path("merged"))
+        self.assertEqual(report["merged"], 2)
+        with open(self.path("merged", "prompt_2", "output.txt"), encoding='utf-8') as file:
+            self.assertEqual(file.read(), "s1 answer")
+        with open(self.path("merged", "prompt_1_ChatDe.png"), 'rb') as file:
+            self.assertEqual(file.read(), b"s0:prompt_1")
+
+    def test_mixed_layouts_merge_into_flat(self):
+        shards = [self.tar_shard("s0", ["prompt_1"]), self.flat_shard("s1", ["prompt_2"])]
+        merge_shards(shards, self.path("merged"))
+        with open(self.path("merged", "prompt_1", "prompt.txt"), encoding='utf-8') as file:
+            self.assertEqual(file.read(), "prompt prompt_1")
+        self.assertTrue(os.path.exists(self.path("merged", "prompt_2_ChatDe.png")))
+
+
+class ShardedTarSinkTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_offsets_point_at_member_data(self):
+        sink = ShardedTarSink(self.directory.name)
+        sink.write("a.jpg", {"png": b"x" * 700, "json": b"{}"})
+        sink.write("sub/b", {"png": b"y" * 10})
+        sink.close()
+        index = load_index(self.directory.name)
+        self.assertEqual(set(index), {"a_ChatDe", "sub/b_ChatDe"})
+        self.assertEqual(read_member(self.directory.name, "a_ChatDe", "png", index), b"x" * 700)
+        self.assertEqual(read_member(self.directory.name, "sub/b_ChatDe", "png", index), b"y" * 10)
+
+    def test_resume_drops_a_partly_written_item(self):
+        sink = ShardedTarSink(self.directory.name)
+        sink.write("a", {"png": b"a" * 100})
+        sink.file.write(b"garbage from an interrupted write")
+        sink.file.flush()
+        # Simulate a crash: the shard is not closed, so no end-of-archive blocks are written
+        sink.file.close()
+        sink = ShardedTarSink(self.directory.name)
+        sink.write("b", {"png": b"b" * 100})
+        sink.close()
+
+        import tarfile
+        with tarfile.open(os.path.join(self.directory.name, "shard-000000.tar")) as tar:
+            self.assertEqual(tar.getnames(), ["a_ChatDe.png", "b_ChatDe.png"])
+
+    def test_rolls_over_to_a_new_shard(self):
+        sink = ShardedTarSink(self.directory.name, max_bytes=4096)
+        for number in range(4):
+            sink.write(f"item{number}", {"png": bytes(1500)})
+        sink.close()
+        index = load_index(self.directory.name)
+        self.assertGreater(len({entry["shard"] for entry in index.values()}), 1)
+
+        # The index can be recreated from the shards alone
+        os.remove(os.path.join(self.directory.name, ShardedTarSink.INDEX_NAME))
+        self.assertEqual(rebuild_index(self.directory.name), 4)
+        rebuilt = load_index(self.directory.name)
+        self.assertEqual({key: entry["members"] for key, entry in rebuilt.items()},
+                         {key: entry["members"] for key, entry in index.items()})
+
+
+if __name__ == "__main__":
+    unittest.main()
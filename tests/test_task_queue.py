@@ -0,0 +1,75 @@
+import unittest
+
+from tests import QuietTestCase
+from utils.task_queue import TaskQueue
+
+
+def make_tasks(count):
+    return [{"item_name": f"item_{index}"} for index in range(count)]
+
+
+class TaskQueueTest(QuietTestCase):
+    def drain(self, queue):
+        names = []
+        while True:
+            task = queue.next(block=False)
+            if task is None:
+                return names
+            names.append(task["item_name"])
+
+    def test_hands_out_new_tasks_in_order(self):
+        queue = TaskQueue(make_tasks(3))
+        self.assertEqual(self.drain(queue), ["item_0", "item_1", "item_2"])
+        self.assertIsNone(queue.next())
+
+    def test_deferred_tasks_come_first(self):
+        queue = TaskQueue(make_tasks(3))
+        first = queue.next()
+        self.assertTrue(queue.defer(first))
+        self.assertEqual(self.drain(queue), ["item_0", "item_1", "item_2"])
+
+    def test_gives_up_after_max_deferrals(self):
+        queue = TaskQueue(make_tasks(1), max_deferrals=2)
+        self.assertTrue(queue.defer(queue.next()))
+        self.assertTrue(queue.defer(queue.next()))
+        task = queue.next()
+        self.assertFalse(queue.defer(task))
+        self.assertEqual(task["deferrals"], 3)
+        self.assertIsNone(queue.next())
+
+    def test_retries_after_new_tasks_until_max_attempts(self):
+        queue = TaskQueue(make_tasks(2), max_attempts=3, cooldown=0.0)
+        task = queue.next()
+        self.assertTrue(queue.retry(task))
+        self.assertEqual(self.drain(queue), ["item_1", "item_0"])
+        self.assertTrue(queue.retry(task))
+        self.assertFalse(queue.retry(task))
+        self.assertEqual(task["tries"], 4)
+        self.assertEqual(self.drain(queue), ["item_0"])
+
+    def test_interleaves_retries_once_their_cooldown_passed(self):
+        queue = TaskQueue(make_tasks(3), cooldown=0.0, interleave=True)
+        self.assertTrue(queue.retry(queue.next()))
+        self.assertEqual(self.drain(queue), ["item_0", "item_1", "item_2"])
+
+    def test_non_blocking_next_leaves_cooling_retries_queued(self):
+        queue = TaskQueue(make_tasks(1), cooldown=60.0)
+        self.assertTrue(queue.retry(queue.next()))
+        self.assertIsNone(queue.next(block=False))
+        self.assertFalse(queue.retry_ready())
+        self.assertEqual(len(queue.retries), 1)
+
+    def test_blocking_next_waits_out_the_cooldown(self):
+        queue = TaskQueue(make_tasks(1), cooldown=0.05)
+        self.assertTrue(queue.retry(queue.next()))
+        self.assertEqual(queue.next()["item_name"], "item_0")
+
+    def test_from_config(self):
+        queue = TaskQueue.from_config([], {"retry": {"max_attempts": 5, "cooldown": 2.0, "interleave": True},
+                                           "pacing": {"max_deferrals": 1}})
+        self.assertEqual((queue.max_attempts, queue.cooldown, queue.interleave, queue.max_deferrals),
+                         (5, 2.0, True, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from tests import QuietTestCase
+from utils.tracer import Tracer, applescript_delay, percentile, summarize
+
+
+class TracerTest(QuietTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "trace.jsonl")
+        self.tracer = Tracer()
+        self.tracer.start(self.path)
+        self.addCleanup(self.tracer.stop)
+
+    def test_separates_fixed_sleeps_from_useful_time(self):
+        with self.tracer.span("task"):
+            self.tracer.sleep(0.05, "image_delay")
+            with self.tracer.span("script", fixed_sleep=0.02):
+                time.sleep(0.03)
+        self.tracer.record("rollover", 0.0, "event", 0, {})
+        self.tracer.stop()
+
+        summary = summarize(self.path)
+        self.assertEqual(summary["phases"]["image_delay (sleep)"]["count"], 1)
+        self.assertEqual(summary["events"], {"rollover": 1})
+        self.assertAlmostEqual(summary["sleep"], 0.07, places=5)
+        self.assertAlmostEqual(summary["wall"], summary["phases"]["task"]["total"])
+        self.assertAlmostEqual(summary["useful"], summary["wall"] - 0.07, places=5)
+
+    def test_counts_work_on_worker_threads_once(self):
+        def work(index):
+            with self.tracer.task_scope(f"item_{index}"), self.tracer.span("finish"):
+                self.tracer.sleep(0.05, "write")
+
+        with self.tracer.span("run"), ThreadPoolExecutor(4) as pool:
+            list(pool.map(self.tracer.bind(work), range(4)))
+        self.tracer.stop()
+
+        summary = summarize(self.path)
+        self.assertEqual(summary["phases"]["finish"]["count"], 4)
+        self.assertAlmostEqual(summary["wall"], summary["phases"]["run"]["total"])
+        self.assertLess(summary["wall"], 0.15)
+
+    def test_bind_keeps_the_callers_task_and_depth(self):
+        events = []
+        self.tracer.listeners.append(events.append)
+        self.tracer.set_task("item_1")
+        with self.tracer.span("task"), ThreadPoolExecutor(1) as pool:
+            pool.submit(self.tracer.bind(self.tracer.sleep), 0.01, "http_retry").result()
+            # The worker thread is back at depth 0 without a task of its own afterwards
+            pool.submit(self.tracer.sleep, 0.01, "unbound").result()
+        self.tracer.set_task(None)
+
+        spans = {event["phase"]: event for event in events if event["kind"] != "sleep_start"}
+        self.assertEqual((spans["http_retry"]["task"], spans["http_retry"]["depth"]), ("item_1", 1))
+        self.assertEqual((spans["unbound"]["task"], spans["unbound"]["depth"]), ("item_1", 0))
+        self.assertEqual((spans["task"]["task"], spans["task"]["depth"]), ("item_1", 0))
+
+
+class HelperTest(unittest.TestCase):
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0], 50), 2.5)
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0], 100), 4.0)
+
+    def test_applescript_delay_sums_delay_statements(self):
+        script = 'tell application "ChatGPT"\n    delay 0.5\n    activate\n    delay 1\nend tell'
+        self.assertEqual(applescript_delay(script), 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,57 +2,189 @@
 Application control module: Responsible for ChatGPT application startup, window management, and interaction
 """
 
+import os
 import subprocess
 import time
 
+from utils.tracer import applescript_delay, tracer
+
 
 class AppController:
     """Application control class for handling ChatGPT application startup, interaction, and window management"""
     
-    def __init__(self):
-        """Initialize application controller"""
-        pass
+    # Prefix of the marker returned by the read-back script when the text area cannot be read
+    READ_ERROR_PREFIX = "Failed to get ChatGPT response: "
+    # Menu item used to open an additional conversation window
+    NEW_WINDOW_MENU_ITEM = "New Window"
+    
+    def __init__(self, script_host=None, liveness_ttl=0, liveness_check="system_events", script_timeout=0):
+        """
+        Initialize application controller
+        
+        Args:
+            script_host (ScriptHost, optional): Persistent host used to run scripts. Defaults to None,
+                spawning one osascript process per call.
+            liveness_ttl (float, optional): Seconds a successful running check is reused. Defaults to 0 (no cache).
+            liveness_check (str, optional): "system_events" or "pid" for a process lookup without AppleScript.
+                Defaults to "system_events".
+            script_timeout (float, optional): Seconds a script may run beyond its fixed delays before it
+                is killed. Defaults to 0 (no limit).
+        """
+        self.script_host = script_host
+        self.script_timeout = script_timeout
+        self.script_timeouts = 0
+        # Seconds spent waiting for the most recent response to complete
+        self.last_response_wait = None
+        # Number of times the prompt was sent, keyed by task identifier
+        self.send_attempts = {}
+        
+        # Liveness cache for check_chatgpt_running
+        self.liveness_ttl = liveness_ttl
+        self.liveness_check = liveness_check
+        self.liveness_hits = 0
+        self.liveness_misses = 0
+        self._alive_until = 0
+        self._chatgpt_pid = None
+        
+        # Transcript read-back metrics: characters returned by osascript and time spent reading
+        self.reads = 0
+        self.read_chars = 0
+        self.read_seconds = 0.0
     
-    def run_applescript(self, script):
+    def run_applescript(self, script, use_host=True):
         """
         Run AppleScript script
         
+        A failed call invalidates the cached liveness state. A call that runs longer than
+        script_timeout plus the script's fixed delays is killed and counted as a timeout.
+        
         Args:
             script (str): AppleScript script string
+            use_host (bool, optional): Use the script host if one is configured. Recovery actions pass
+                False so they still run while the host is busy with a hung script. Defaults to True.
             
         Returns:
             tuple: (stdout, returncode). Returns (None, -1) if an error occurs
         """
+        # Fixed `delay` statements run inside osascript, so they are recorded from the script text
+        fixed_sleep = applescript_delay(script)
+        timeout = self.script_timeout + fixed_sleep if self.script_timeout else None
         try:
-            result = subprocess.run(
-                ['osascript', '-e', script],
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            if result.returncode != 0 and result.stderr:
-                print(f"AppleScript warning: {result.stderr}")
-            return (result.stdout.strip(), result.returncode)
+            with tracer.span("applescript", fixed_sleep=fixed_sleep):
+                if self.script_host is not None and use_host:
+                    stdout, returncode, stderr = self.script_host.run(script, timeout=timeout)
+                    if stdout is None and stderr.startswith("script timed out"):
+                        self.script_timeouts += 1
+                else:
+                    result = subprocess.run(
+                        ['osascript', '-e', script],
+                        capture_output=True,
+                        text=True,
+                        check=False,
+                        timeout=timeout
+                    )
+                    stdout, returncode, stderr = result.stdout.strip(), result.returncode, result.stderr
+            if returncode != 0:
+                self.invalidate_liveness()
+                if stderr:
+                    print(f"AppleScript warning: {stderr}")
+            return (stdout, returncode)
+        except subprocess.TimeoutExpired:
+            # subprocess.run has already killed osascript
+            self.script_timeouts += 1
+            self.invalidate_liveness()
+            print(f"AppleScript timed out after {timeout:.0f} seconds and was stopped")
+            return (None, -1)
         except Exception as exc:
+            self.invalidate_liveness()
             print(f"Error running AppleScript: {exc}")
             return (None, -1)
     
+    def invalidate_liveness(self):
+        """Forget the cached running state so the next check queries the system again"""
+        self._alive_until = 0
+        self._chatgpt_pid = None
+    
+    def liveness_stats(self):
+        """
+        Get liveness cache statistics
+        
+        Returns:
+            dict: Cache hits, misses and hit rate
+        """
+        total = self.liveness_hits + self.liveness_misses
+        return {
+            "hits": self.liveness_hits,
+            "misses": self.liveness_misses,
+            "hit_rate": self.liveness_hits / total if total else 0.0
+        }
+    
+    def is_chatgpt_process_running(self):
+        """
+        Check whether a ChatGPT process exists, without starting it
+        
+        Returns:
+            bool: True if ChatGPT is running
+        """
+        if self.liveness_check == "pid":
+            # Reuse the known PID first, then fall back to a process lookup by name
+            if self._chatgpt_pid is not None:
+                try:
+                    os.kill(self._chatgpt_pid, 0)
+                    return True
+                except OSError:
+                    self._chatgpt_pid = None
+            try:
+                result = subprocess.run(
+                    ['pgrep', '-x', 'ChatGPT'],
+                    capture_output=True,
+                    text=True,
+                    check=False
+                )
+                pids = result.stdout.split()
+                if result.returncode == 0 and pids:
+                    self._chatgpt_pid = int(pids[0])
+                    return True
+                return False
+            except Exception as exc:
+                print(f"PID check failed, falling back to System Events: {exc}")
+        
+        script = '''
+            tell application "System Events"
+                return (name of processes) contains "ChatGPT"
+            end tell
+        '''
+        result, _ = self.run_applescript(script)
+        return result == "true"
+    
     def check_chatgpt_running(self):
         """
         Check if ChatGPT application is running. If not, try to start it.
         
+        A positive result is reused for liveness_ttl seconds.
+        
+        Returns:
+            bool: True if ChatGPT is running or successfully started, False otherwise
+        """
+        if self.liveness_ttl > 0 and time.time() < self._alive_until:
+            self.liveness_hits += 1
+            return True
+        self.liveness_misses += 1
+        
+        with tracer.span("check_running"):
+            return self._check_chatgpt_running()
+    
+    def _check_chatgpt_running(self):
+        """
+        Query the system for the ChatGPT process and launch the application if needed
+        
         Returns:
             bool: True if ChatGPT is running or successfully started, False otherwise
         """
         try:
-            script = '''
-                tell application "System Events"
-                    return (name of processes) contains "ChatGPT"
-                end tell
-            '''
-            result, status = self.run_applescript(script)
+            running = self.is_chatgpt_process_running()
             
-            if result != "true":
+            if not running:
                 print("ChatGPT is not running. Attempting to start...")
                 launch_script = '''
                     tell application "ChatGPT" to activate
@@ -70,15 +202,11 @@ class AppController:
                 print("ChatGPT has been started.")
                 
                 # Check again
-                verify_script = '''
-                    tell application "System Events"
-                        return (name of processes) contains "ChatGPT"
-                    end tell
-                '''
-                verify_result, _ = self.run_applescript(verify_script)
-                return verify_result == "true"
-            else:
-                return True
+                running = self.is_chatgpt_process_running()
+            
+            if running:
+                self._alive_until = time.time() + self.liveness_ttl
+            return running
         except Exception as exc:
             print(f"Error checking ChatGPT status: {exc}")
             return False
@@ -112,6 +240,7 @@ class AppController:
                 end tell
             end tell
         '''
+        # Timed as the "new_chat" phase by the processor, which covers every backend
         result, status = self.run_applescript(script)
         if status == 0 and result == "true":
             print("--- New conversation created ---")
@@ -120,28 +249,283 @@ class AppController:
             print("Failed to create new conversation.")
             return False
     
-    def ask_chatgpt(self, prompt, img_path=None, config=None):
+    def open_conversation_window(self, bounds=None):
+        """
+        Open a new ChatGPT window, which becomes the frontmost window
+        
+        Args:
+            bounds (tuple, optional): (x, y, width, height) to apply so captures use the same screen layout
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.check_chatgpt_running():
+            print("Unable to access ChatGPT.")
+            return False
+
+        script = f'''
+            tell application "ChatGPT" to activate
+            delay 0.5
+            tell application "System Events"
+                tell process "ChatGPT"
+                    click menu item "{self.NEW_WINDOW_MENU_ITEM}" of menu "File" of menu bar 1
+                    delay 1
+                    return true
+                end tell
+            end tell
+        '''
+        result, status = self.run_applescript(script)
+        if status != 0 or result != "true":
+            print("Failed to open a new ChatGPT window.")
+            return False
+        if bounds is not None:
+            self.set_window_bounds(bounds)
+        return True
+    
+    def get_window_bounds(self, window_index=1):
+        """
+        Get the position and size of a ChatGPT window
+        
+        Args:
+            window_index (int, optional): Window index, 1 being the frontmost. Defaults to 1.
+            
+        Returns:
+            tuple or None: (x, y, width, height), or None if it cannot be read
+        """
+        script = f'''
+            tell application "System Events"
+                tell process "ChatGPT"
+                    set {{x, y}} to position of window {window_index}
+                    set {{w, h}} to size of window {window_index}
+                    return (x as text) & "," & (y as text) & "," & (w as text) & "," & (h as text)
+                end tell
+            end tell
+        '''
+        result, status = self.run_applescript(script)
+        if status != 0 or not result:
+            return None
+        try:
+            return tuple(int(float(value)) for value in result.split(","))
+        except ValueError:
+            return None
+    
+    def set_window_bounds(self, bounds, window_index=1):
+        """
+        Move and resize a ChatGPT window
+        
+        Args:
+            bounds (tuple): (x, y, width, height)
+            window_index (int, optional): Window index, 1 being the frontmost. Defaults to 1.
+            
+        Returns:
+            bool: Whether the window was updated
+        """
+        x, y, width, height = bounds
+        script = f'''
+            tell application "System Events"
+                tell process "ChatGPT"
+                    set position of window {window_index} to {{{x}, {y}}}
+                    set size of window {window_index} to {{{width}, {height}}}
+                end tell
+            end tell
+        '''
+        _, status = self.run_applescript(script)
+        return status == 0
+    
+    def raise_window(self, window_index):
+        """
+        Bring a ChatGPT window to the front
+        
+        Args:
+            window_index (int): Window index, 1 being the frontmost
+            
+        Returns:
+            bool: Whether the window was raised
+        """
+        script = f'''
+            tell application "ChatGPT" to activate
+            tell application "System Events"
+                tell process "ChatGPT"
+                    set frontmost to true
+                    perform action "AXRaise" of window {window_index}
+                    delay 0.5
+                end tell
+            end tell
+        '''
+        _, status = self.run_applescript(script)
+        return status == 0
+    
+    def close_front_window(self):
+        """
+        Close the frontmost ChatGPT window
+        
+        Returns:
+            bool: Whether the close command was sent
+        """
+        script = '''
+            tell application "System Events"
+                tell process "ChatGPT"
+                    keystroke "w" using command down
+                    delay 0.5
+                end tell
+            end tell
+        '''
+        _, status = self.run_applescript(script)
+        return status == 0
+
+    def dismiss_dialog(self):
+        """
+        Press Escape in ChatGPT to close a modal dialog, sheet, save panel or context menu
+
+        Runs outside the script host so it works while the host is stuck on the dialog.
+
+        Returns:
+            bool: Whether the key press was sent
+        """
+        script = '''
+            tell application "System Events"
+                tell process "ChatGPT"
+                    key code 53
+                    delay 0.5
+                    key code 53
+                end tell
+            end tell
+        '''
+        _, status = self.run_applescript(script, use_host=False)
+        return status == 0
+
+    def reactivate_app(self):
+        """
+        Bring ChatGPT back to the front, e.g. after another application took focus
+
+        Returns:
+            bool: Whether ChatGPT was activated
+        """
+        self.invalidate_liveness()
+        script = '''
+            tell application "ChatGPT" to activate
+            delay 1
+            tell application "System Events"
+                tell process "ChatGPT"
+                    set frontmost to true
+                end tell
+            end tell
+        '''
+        _, status = self.run_applescript(script, use_host=False)
+        return status == 0
+
+    def restart_app(self):
+        """
+        Quit ChatGPT (killing it if it does not respond) and start it again
+
+        Open conversations are lost; their tasks fail and are retried in a fresh chat.
+
+        Returns:
+            bool: Whether ChatGPT is running again
+        """
+        print("Restarting ChatGPT...")
+        self.run_applescript('tell application "ChatGPT" to quit', use_host=False)
+        time.sleep(3)
+        if self.is_chatgpt_process_running():
+            subprocess.run(['pkill', '-x', 'ChatGPT'], capture_output=True, check=False)
+            time.sleep(2)
+        self.invalidate_liveness()
+        if self.script_host is not None:
+            # A host blocked on the old app instance would stay blocked
+            self.script_host.kill()
+        return self._check_chatgpt_running()
+
+    def ask_chatgpt(self, prompt, img_path, config, task_id):
         """
         Use AppleScript automation to send text prompts to ChatGPT, optionally sending an image.
         
+        The prompt is sent once and the response is polled afterwards. A failed read only
+        leads to another poll; the prompt is re-sent only when no response was observed,
+        at most max_resend_attempts times. All attempts share one response_timeout deadline.
+        
         Args:
             prompt (str): Text prompt
-            img_path (str, optional): Image file path, if not provided only text will be sent
+            img_path (str or None): Image file path, if None only text will be sent
             config (dict): Configuration dictionary containing timeout settings
+            task_id (str): Task identifier used to record send attempts
             
         Returns:
-            str: ChatGPT's response text or timeout message
+            str: ChatGPT's response text or timeout message. With incremental_read (the default)
+                only the text this turn added to the conversation, without the echoed prompt.
         """
         if not self.check_chatgpt_running():
             raise Exception("ChatGPT is not running or cannot be accessed.")
 
-        # Escape double quotes and newlines
-        safe_prompt = prompt.replace('"', '\\"').replace('\n', '\\n')
+        timeout = config.get("response_timeout", 130)
+        max_resends = config.get("max_resend_attempts", 0)
+        incremental = config.get("incremental_read", True)
+        deadline = time.time() + timeout
+        response = None
+        attempt = 0
+        since = None
+
+        while response is None and attempt <= max_resends and time.time() < deadline:
+            attempt += 1
+            self.send_attempts[task_id] = attempt
+            if attempt > 1:
+                print(f"No response observed, re-sending prompt (attempt {attempt}/{max_resends + 1})...")
+
+            # Remember the transcript before sending so an unchanged text area is not taken as the answer.
+            # Incremental reads only need its length; polling then returns just the text added after it.
+            since = self.transcript_length() if incremental else None
+            baseline = "" if since is not None else self.read_response()
+            if not self.send_prompt(prompt, img_path):
+                # The send script may have failed after the prompt went out, so check before re-sending
+                tracer.sleep(2, "send_recheck")
+                current = self.read_response() if since is None else self.read_transcript(since=since)[1]
+                if current is None or current == baseline:
+                    continue
+                print("Send reported an error but the conversation changed, polling for the response...")
+
+            response = self.wait_for_response(baseline, config, max(0, deadline - time.time()), since=since)
+
+        if response is None:
+            return f"Response timeout after waiting {timeout} seconds."
+        if since is not None:
+            response = self.latest_message(response, prompt)
+        return response
+    
+    @staticmethod
+    def latest_message(text, prompt):
+        """
+        Drop the echoed prompt from the start of the text a turn added to the conversation
+        
+        Args:
+            text (str): Text added to the conversation since the prompt was sent
+            prompt (str): Prompt that was sent
+            
+        Returns:
+            str: Assistant message, or the text unchanged if it does not start with the prompt
+        """
+        stripped = text.lstrip()
+        echo = prompt.strip()
+        if echo and stripped.startswith(echo):
+            return stripped[len(echo):].lstrip()
+        return text
+    
+    def send_prompt(self, prompt, img_path=None):
+        """
+        Paste the prompt (and optional image) into ChatGPT and press Enter
+        
+        Args:
+            prompt (str): Text prompt
+            img_path (str, optional): Image file path, if not provided only text will be sent
+            
+        Returns:
+            bool: Whether the send script completed without error
+        """
+        # Escape backslashes, double quotes and newlines for an AppleScript string literal
+        safe_prompt = prompt.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
         
         # Base script - copy and paste text prompt
         applescript_cmd = f'''
-            -- Step 1: Copy prompt to system clipboard
-            do shell script "osascript -e 'set the clipboard to \\"{safe_prompt}\\"'"
+            -- Step 1: Copy prompt to system clipboard (in-process, no nested osascript)
+            set the clipboard to "{safe_prompt}"
             delay 0.5
 
             -- Step 2: Activate ChatGPT and paste text
@@ -177,55 +561,162 @@ class AppController:
                     end tell
                 end tell
             '''
-        # if img_path:
-        #     print(f"current img_path is {img_path}")
-        #     shell_safe_img_path = img_path.replace('"', '\\"')
-        #     applescript_cmd += f'''
-        #         -- Step 3: Copy image file to system clipboard
-        #         do shell script "osascript -e 'set the clipboard to (POSIX file \\"{shell_safe_img_path}\\")'"
-        #         delay 2
-
-        #         -- Step 4: Paste image into ChatGPT
-        #         tell application "System Events"
-        #             tell application process "ChatGPT"
-        #                 keystroke "v" using {{command down}}
-        #                 delay 5
-        #             end tell
-        #         end tell
-        #     '''
-        
-        # Complete script - send and get response
+        
+        # Complete script - press Enter to send, the response is read back separately
         applescript_cmd += f'''
             -- Step 5: Press Enter to send
             tell application "System Events"
                 tell application process "ChatGPT"
                     key code 36
-                    delay 120
+                end tell
+            end tell
+        '''
 
-                    -- Step 6: Try to get latest response
-                    set responseText to ""
+        with tracer.span("send_prompt"):
+            _, status = self.run_applescript(applescript_cmd)
+        return status == 0
+    
+    def read_response(self, window_index=1):
+        """
+        Read the current conversation text from a ChatGPT window
+        
+        Background windows can be read without raising them.
+        
+        Args:
+            window_index (int, optional): Window index, 1 being the frontmost. Defaults to 1.
+            
+        Returns:
+            str or None: Text of the conversation area, or None if it cannot be read
+        """
+        return self.read_transcript(window_index, since=0)[1]
+    
+    def transcript_length(self, window_index=1):
+        """
+        Get the length of the conversation text without transferring it
+        
+        Args:
+            window_index (int, optional): Window index, 1 being the frontmost. Defaults to 1.
+            
+        Returns:
+            int or None: Length in AppleScript characters, or None if it cannot be read
+        """
+        return self.read_transcript(window_index, since=None)[0]
+    
+    def read_transcript(self, window_index=1, since=0):
+        """
+        Read the conversation text added after a position
+        
+        The whole text area is read inside osascript, but only its length and the text after
+        `since` are returned, so polling a long conversation transfers just the newest turn.
+        Positions are AppleScript character counts as returned in the length.
+        
+        Args:
+            window_index (int, optional): Window index, 1 being the frontmost. Defaults to 1.
+            since (int or None, optional): Length already read; None returns the length only.
+                If the conversation is now shorter (it was replaced), all of it is returned. Defaults to 0.
+            
+        Returns:
+            tuple: (length, text) - text is None when only the length was requested; (None, None) if it cannot be read
+        """
+        if since is None:
+            tail = "return transcriptLength as text"
+        else:
+            tail = f'''
+            set startAt to {since}
+            if startAt > transcriptLength then set startAt to 0
+            if startAt = transcriptLength then return (transcriptLength as text) & linefeed
+            return (transcriptLength as text) & linefeed & (text (startAt + 1) thru -1 of transcript)'''
+        script = f'''
+            tell application "System Events"
+                tell application process "ChatGPT"
                     try
-                        set responseText to value of text area 2 of group 1 of group 1 of window 1
+                        set transcript to value of text area 2 of group 1 of group 1 of window {window_index}
                     on error errMsg
-                        set responseText to "Failed to get ChatGPT response: " & errMsg
+                        return "{self.READ_ERROR_PREFIX}" & errMsg
                     end try
-                    return responseText
                 end tell
             end tell
+            set transcriptLength to length of transcript
+            {tail}
         '''
-
+        started = time.time()
+        with tracer.span("read_response") as fields:
+            result, status = self.run_applescript(script)
+            fields["chars"] = len(result or "")
+        self.reads += 1
+        self.read_chars += len(result or "")
+        self.read_seconds += time.time() - started
+        if status != 0 or result is None or result.startswith(self.READ_ERROR_PREFIX):
+            return (None, None)
+        length, _, text = result.partition("\n")
+        try:
+            length = int(length)
+        except ValueError:
+            return (None, None)
+        return (length, None if since is None else text)
+    
+    def read_stats(self):
+        """
+        Get transcript read-back statistics
+        
+        Returns:
+            dict: reads, mean characters returned per read and mean seconds per read
+        """
+        return {
+            "reads": self.reads,
+            "mean_chars": self.read_chars / self.reads if self.reads else 0.0,
+            "mean_seconds": self.read_seconds / self.reads if self.reads else 0.0
+        }
+    
+    def wait_for_response(self, baseline, config, timeout=None, since=None):
+        """
+        Poll the conversation text until the response stops changing
+        
+        The response is considered complete once the text differs from the baseline
+        and has stayed the same for the configured stability window.
+        
+        Args:
+            baseline (str or None): Conversation text read before the prompt was sent ("" when reading incrementally)
+            config (dict): Configuration dictionary containing polling settings
+            timeout (float, optional): Upper bound in seconds. Defaults to response_timeout.
+            since (int, optional): Conversation length before the prompt was sent; only the text
+                added after it is read. Defaults to None, reading the whole conversation.
+            
+        Returns:
+            str or None: Latest response text, or None if no response was observed
+        """
+        with tracer.span("wait_for_response"):
+            return self._wait_for_response(baseline, config, timeout, since)
+    
+    def _wait_for_response(self, baseline, config, timeout=None, since=None):
+        """Polling loop of wait_for_response"""
+        if timeout is None:
+            timeout = config.get("response_timeout", 130)
+        poll_interval = config.get("response_poll_interval", 2)
+        stable_window = config.get("response_stable_window", 6)
+        
         start_time = time.time()
-        response = None
-        timeout = config.get("response_timeout", 130)
-
-        while response is None and (time.time() - start_time) < timeout:
-            result, status = self.run_applescript(applescript_cmd)
-            if status == 0:
-                response = result
-            else:
-                time.sleep(2)
-
-        if response is None:
-            response = f"Response timeout after waiting {timeout} seconds."
-
-        return response
\ No newline at end of file
+        last_text = None
+        last_change = start_time
+        completed = False
+        
+        while time.time() - start_time < timeout:
+            text = self.read_response() if since is None else self.read_transcript(since=since)[1]
+            now = time.time()
+            if text is not None and text != last_text:
+                last_text = text
+                last_change = now
+            elif last_text is not None and last_text != baseline and now - last_change >= stable_window:
+                completed = True
+                break
+            tracer.sleep(poll_interval, "response_poll")
+        
+        self.last_response_wait = time.time() - start_time
+        if completed:
+            print(f"Response completed after {self.last_response_wait:.1f} seconds.")
+        else:
+            print(f"Response not stable after {self.last_response_wait:.1f} seconds, using latest text.")
+        
+        if last_text is None or last_text == baseline:
+            return None
+        return last_text
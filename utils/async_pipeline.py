@@ -0,0 +1,258 @@
+"""
+Async pipeline module: Overlaps input preparation and output writing with the serialized GUI work of the task loop
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.pacer import RateLimitError
+from utils.tracer import tracer
+
+
+class AsyncPipeline:
+    """
+    asyncio version of the serial task loop
+
+    Tasks pass through three stages connected by bounded queues: prepare (thread pool),
+    GUI (one dedicated thread) and write (thread pool). Everything that uses the backend -
+    pacing, new chats, sending, waiting and capturing - runs on the single GUI executor in
+    the same order as in the serial loop, while the next inputs are loaded and converted and
+    finished images are encoded and stored on the thread pool. The task queue and the
+    callbacks, which update the ledger, run on the event loop thread, because the SQLite
+    ledger may only be used from the thread that opened it. Work handed to the executors is
+    bound to the tracer span the pipeline runs in, so the run trace counts its time once.
+    """
+
+    def __init__(self, processor, queue_size=2, io_workers=4):
+        """
+        Initialize the pipeline
+
+        Args:
+            processor: Processor instance whose backend is used and which stores results
+            queue_size (int, optional): Tasks waiting between two stages. Defaults to 2.
+            io_workers (int, optional): Threads preparing inputs and writing outputs. Defaults to 4.
+        """
+        self.processor = processor
+        self.backend = processor.backend
+        self.pacer = processor.pacer
+        self.queue_size = max(1, queue_size)
+        self.io_workers = max(1, io_workers)
+        self.gui = None
+        self.io = None
+        # Tasks taken from the task queue that are neither finished nor handed back yet
+        self.in_flight = 0
+        self.changed = None
+
+    @classmethod
+    def from_config(cls, processor, config):
+        """
+        Build a pipeline from the "async_pipeline" configuration section
+
+        Args:
+            processor: Processor instance
+            config (dict): Configuration dictionary
+
+        Returns:
+            AsyncPipeline or None: Configured pipeline, or None if disabled
+        """
+        settings = config.get("async_pipeline", {})
+        if not settings.get("enabled", True):
+            return None
+        return cls(
+            processor,
+            queue_size=settings.get("queue_size", 2),
+            io_workers=settings.get("io_workers", 4)
+        )
+
+    def run(self, queue, config, on_sent=None, on_done=None, on_requeued=None):
+        """
+        Run tasks through the pipeline
+
+        Args:
+            queue (TaskQueue): Queue handing out new, deferred and retried tasks
+            config (dict): Configuration dictionary
+            on_sent (callable, optional): Called with the task before it is sent
+            on_done (callable, optional): Called with the task and its success flag when it finishes for good
+            on_requeued (callable, optional): Called with the task when it is deferred or queued for a retry
+        """
+        asyncio.run(self.pipeline(
+            queue,
+            config,
+            on_sent or (lambda task: None),
+            on_done or (lambda task, success: None),
+            on_requeued or (lambda task: None)
+        ))
+
+    async def pipeline(self, queue, config, on_sent, on_done, on_requeued):
+        """Start the stages and wait until every task is finished"""
+        self.gui = ThreadPoolExecutor(1, thread_name_prefix="gui")
+        self.io = ThreadPoolExecutor(self.io_workers, thread_name_prefix="pipeline-io")
+        self.in_flight = 0
+        self.changed = asyncio.Event()
+        prepared = asyncio.Queue(self.queue_size)
+        captured = asyncio.Queue(self.queue_size)
+        try:
+            await asyncio.gather(
+                self.feed(queue, config, prepared),
+                self.drive(queue, config, prepared, captured, on_sent, on_done, on_requeued),
+                *[self.write(queue, config, captured, on_done, on_requeued) for _ in range(self.io_workers)]
+            )
+        finally:
+            self.gui.shutdown(wait=True)
+            self.io.shutdown(wait=True)
+
+    async def feed(self, queue, config, prepared):
+        """
+        Prepare stage: take tasks from the task queue and prepare their input images
+
+        Runs until the task queue is empty and no task is left that could be handed back.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            task = queue.next(block=False)
+            if task is None:
+                if not self.in_flight:
+                    if not queue.retries:
+                        break
+                    # Nothing else can come back, so wait out the retry cooldown
+                    wait = queue.retries[0]["retry_at"] - time.time()
+                    print(f"Waiting {wait:.0f} seconds before retrying {queue.retries[0]['item_name']}...")
+                    await loop.run_in_executor(self.io, tracer.bind(tracer.sleep), wait, "retry_cooldown")
+                    continue
+                # Tasks still in the pipeline may be deferred or queued for a retry
+                self.changed.clear()
+                timeout = queue.retries[0]["retry_at"] - time.time() if queue.retries else None
+                try:
+                    await asyncio.wait_for(self.changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.in_flight += 1
+            if task["img_path"]:
+                task["send_path"] = await loop.run_in_executor(self.io, tracer.bind(self.prepare), task, config)
+            await prepared.put(task)
+        await prepared.put(None)
+
+    def prepare(self, task, config):
+        """
+        Get the input file to send for a task (runs on the thread pool)
+
+        Args:
+            task (dict): Task dictionary
+            config (dict): Configuration dictionary
+
+        Returns:
+            str: Path of the image to send
+        """
+        with tracer.task_scope(task["item_name"]), tracer.span("prepare_input"):
+            try:
+                return self.backend.prepare_input(task["img_path"], config)
+            except Exception as exc:
+                print(f"Could not prepare {task['img_path']}, sending it unchanged: {exc}")
+                return task["img_path"]
+
+    async def drive(self, queue, config, prepared, captured, on_sent, on_done, on_requeued):
+        """GUI stage: send each task and capture its output on the GUI executor"""
+        loop = asyncio.get_running_loop()
+        first_task = True
+        while True:
+            task = await prepared.get()
+            if task is None:
+                break
+
+            # Determine whether to create a new chat - if in single window mode, only create a new chat for the first task
+            create_new = config["mode"]["window_type"] == "multi" or first_task
+            first_task = False
+
+            if self.pacer is not None:
+                await loop.run_in_executor(self.gui, tracer.bind(self.pacer.acquire))
+            on_sent(task)
+            try:
+                outcome = await loop.run_in_executor(self.gui, tracer.bind(self.interact), task, config, create_new)
+            except RateLimitError:
+                if queue.defer(task):
+                    self.settled(on_requeued, task)
+                    continue
+                outcome = None
+            if outcome is None:
+                self.settle(queue, task, False, on_done, on_requeued)
+                continue
+            await captured.put((task, outcome))
+        for _ in range(self.io_workers):
+            await captured.put(None)
+
+    def interact(self, task, config, new_chat):
+        """
+        Run the backend phases of a task (runs on the GUI executor)
+
+        Args:
+            task (dict): Task dictionary
+            config (dict): Configuration dictionary
+            new_chat (bool): Whether to create a new chat in multi-window mode
+
+        Returns:
+            dict or None: Outcome for Processor.finish, or None if the task failed
+
+        Raises:
+            RateLimitError: If the response is a rate-limit message
+        """
+        tracer.set_task(task["item_name"])
+        with tracer.span("task"):
+            return self.processor.interact(
+                task["item_name"],
+                task["prompt"],
+                config,
+                img_path=task.get("send_path") or task["img_path"],
+                new_chat=new_chat,
+                fresh_chat=task.get("tries", 1) > 1
+            )
+
+    async def write(self, queue, config, captured, on_done, on_requeued):
+        """Write stage: store captured images and results on the thread pool"""
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = await captured.get()
+            if entry is None:
+                break
+            task, outcome = entry
+            success = await loop.run_in_executor(self.io, tracer.bind(self.finish), task, outcome, config)
+            self.settle(queue, task, success, on_done, on_requeued)
+
+    def finish(self, task, outcome, config):
+        """
+        Store the results of a task (runs on the thread pool)
+
+        Args:
+            task (dict): Task dictionary
+            outcome (dict): Result of Processor.interact
+            config (dict): Configuration dictionary
+
+        Returns:
+            bool: Whether the results were stored
+        """
+        with tracer.task_scope(task["item_name"]), tracer.span("finish"):
+            return self.processor.finish(task["item_name"], task["prompt"], outcome, config, img_path=task["img_path"])
+
+    def settle(self, queue, task, success, on_done, on_requeued):
+        """
+        Queue a failed task for a retry while it has tries left, otherwise finish it
+
+        Args:
+            queue (TaskQueue): Task queue
+            task (dict): Task dictionary
+            success (bool): Whether the task succeeded
+            on_done (callable): Called with the task and its success flag when it finishes for good
+            on_requeued (callable): Called with the task when it is queued for a retry
+        """
+        if not success and queue.retry(task):
+            self.settled(on_requeued, task)
+            return
+        self.settled(on_done, task, success)
+
+    def settled(self, callback, *args):
+        """Run a callback for a task leaving the pipeline and wake the prepare stage"""
+        self.in_flight -= 1
+        self.changed.set()
+        callback(*args)
@@ -0,0 +1,466 @@
+"""
+Backend module: Defines the calls the pipeline makes to a chat service and the GUI implementation
+"""
+
+import os
+import time
+from abc import ABC, abstractmethod
+
+from utils.tracer import tracer
+
+
+class ChatBackend(ABC):
+    """
+    Interface of the chat backend used by Processor and PipelineScheduler
+
+    Conversations are referred to by opaque handles returned from new_chat.
+    Blocking calls (ask, await_image) are used by the serial path; non-blocking
+    calls (send, poll, response_text) are used by the pipeline scheduler.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        """Initialize the backend"""
+        # Number of times each task's prompt was sent, keyed by task identifier
+        self.send_attempts = {}
+
+    def forget(self, task_id):
+        """
+        Drop the send attempts of a task that finished for good
+
+        Args:
+            task_id (str): Task identifier
+        """
+        self.send_attempts.pop(task_id, None)
+
+    @abstractmethod
+    def check_running(self):
+        """
+        Check that the service is reachable, starting it if needed
+
+        Returns:
+            bool: True if the backend can accept prompts
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def new_chat(self, config, separate=False):
+        """
+        Start a new conversation
+
+        Args:
+            config (dict): Configuration dictionary
+            separate (bool, optional): Keep the conversation alongside the others instead of
+                replacing the current one. Defaults to False.
+
+        Returns:
+            object or None: Conversation handle, or None if it could not be created
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def current_chat(self):
+        """
+        Get the handle of the current conversation
+
+        Returns:
+            object: Conversation handle
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def ask(self, handle, prompt, img_path, config, task_id):
+        """
+        Send a prompt (and optional image) and wait for the response
+
+        Args:
+            handle: Conversation handle
+            prompt (str): Text prompt
+            img_path (str or None): Input image path
+            config (dict): Configuration dictionary
+            task_id (str): Task identifier used to record send attempts
+
+        Returns:
+            str: Response text or a timeout message
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def send(self, handle, prompt, img_path, config, task_id):
+        """
+        Send a prompt (and optional image) without waiting for the response
+
+        Args:
+            handle: Conversation handle
+            prompt (str): Text prompt
+            img_path (str or None): Input image path
+            config (dict): Configuration dictionary
+            task_id (str): Task identifier used to record send attempts
+
+        Returns:
+            bool: Whether the prompt was sent
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def poll(self, handle, config):
+        """
+        Check without blocking whether a conversation's output can be fetched
+
+        Args:
+            handle: Conversation handle
+            config (dict): Configuration dictionary
+
+        Returns:
+            bool: True if the response and generated image are ready
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def response_text(self, handle):
+        """
+        Get the latest response text of a conversation
+
+        Args:
+            handle: Conversation handle
+
+        Returns:
+            str or None: Response text, or None if nothing was received
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def await_image(self, handle, config, elapsed, location=None):
+        """
+        Block until the generated image of a conversation is expected to be final
+
+        Args:
+            handle: Conversation handle
+            config (dict): Configuration dictionary
+            elapsed (float): Seconds already spent since the prompt was sent
+            location (tuple, optional): (x, y, x_shift, y_shift) screen location for GUI backends
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_image(self, handle, img_name, target, location=None):
+        """
+        Save the generated image of a conversation
+
+        Args:
+            handle: Conversation handle
+            img_name (str): Item name, used in messages
+            target (str or file): Image path, or a binary file object that receives the PNG data
+            location (tuple, optional): (x, y, x_shift, y_shift) screen location for GUI backends
+
+        Returns:
+            bool: Whether the image was saved
+        """
+        raise NotImplementedError
+
+    def capture_image(self, handle, img_name, target, location=None):
+        """
+        Capture the generated image of a conversation, leaving the file write to the caller
+
+        Backends that hold the captured image in memory return a writer that can run on another
+        thread while the next task already uses the backend. By default the image is saved by
+        fetch_image right away.
+
+        Args:
+            handle: Conversation handle
+            img_name (str): Item name, used in messages
+            target (str or file): Image path, or a binary file object that receives the PNG data
+            location (tuple, optional): (x, y, x_shift, y_shift) screen location for GUI backends
+
+        Returns:
+            callable or None: Writes the image and returns whether it was saved, or None if nothing was captured
+        """
+        if not self.fetch_image(handle, img_name, target, location):
+            return None
+        return lambda: True
+
+    def prepare_input(self, img_path, config):
+        """
+        Get the input image file to send, converting it if the backend needs another format
+
+        Args:
+            img_path (str): Input image path
+            config (dict): Configuration dictionary
+
+        Returns:
+            str: Path of the image to send
+        """
+        return img_path
+
+    def poll_interval(self, config):
+        """
+        Get the number of seconds to wait between polls of in-flight conversations
+
+        Args:
+            config (dict): Configuration dictionary
+
+        Returns:
+            float: Poll interval in seconds
+        """
+        return config.get("response_poll_interval", 2)
+
+    @abstractmethod
+    def close(self, handle):
+        """
+        Release a conversation started with separate=True
+
+        Args:
+            handle: Conversation handle
+        """
+        raise NotImplementedError
+
+
+class GUIBackend(ChatBackend):
+    """
+    Backend driving the ChatGPT desktop app through AppController and ImageProcessor
+
+    Separate conversations are separate windows. Windows are addressed by index
+    (1 is the frontmost), so a front-to-back model of the opened windows is kept
+    to find each conversation again after others were opened, raised or closed.
+    """
+
+    name = "gui"
+
+    # Handle of the conversation in the front window used by the serial path
+    MAIN = 0
+
+    def __init__(self, app_controller, image_processor):
+        """
+        Initialize the GUI backend
+
+        Args:
+            app_controller: AppController instance for ChatGPT interaction
+            image_processor: ImageProcessor instance for image capture processing
+        """
+        super().__init__()
+        self.app_controller = app_controller
+        self.image_processor = image_processor
+        # Share the attempt record with the controller's retry policy
+        self.send_attempts = app_controller.send_attempts
+        self.window_order = []  # Separate conversation handles, front to back
+        self.next_handle = 1
+        self.conversations = {}
+        self.window_bounds = None
+        # Image region hash of each conversation before its last prompt, used by the image watch
+        self.region_baselines = {}
+        self.watch_location = None
+        # Preflight cache that converts non-PNG inputs, built on first use
+        self.preflight = None
+
+    def window_index(self, handle):
+        """
+        Get the current window index of a conversation
+
+        Args:
+            handle (int): Conversation handle
+
+        Returns:
+            int: Window index, 1 being the frontmost
+        """
+        if handle == self.MAIN:
+            return 1
+        return self.window_order.index(handle) + 1
+
+    def raise_conversation(self, handle):
+        """
+        Bring the window of a conversation to the front
+
+        Args:
+            handle (int): Conversation handle
+        """
+        if handle == self.MAIN:
+            return
+        index = self.window_index(handle)
+        if index != 1:
+            self.app_controller.raise_window(index)
+        self.window_order.remove(handle)
+        self.window_order.insert(0, handle)
+
+    def check_running(self):
+        return self.app_controller.check_chatgpt_running()
+
+    def new_chat(self, config, separate=False):
+        if not separate:
+            if not self.app_controller.create_new_chat():
+                return None
+            return self.MAIN
+
+        # New windows copy the layout of the main window so capture coordinates stay valid
+        if self.window_bounds is None:
+            self.window_bounds = self.app_controller.get_window_bounds()
+        if not self.app_controller.open_conversation_window(self.window_bounds):
+            return None
+        handle = self.next_handle
+        self.next_handle += 1
+        self.window_order.insert(0, handle)
+        return handle
+
+    def current_chat(self):
+        return self.MAIN
+
+    def record_region(self, handle, config):
+        """
+        Remember what the image region shows before a prompt is sent
+
+        In single-window mode the region still shows the previous turn's image, which would
+        otherwise read as a stable new image right away.
+
+        Args:
+            handle (int): Conversation handle
+            config (dict): Configuration dictionary
+        """
+        if not config.get("image_watch", False):
+            return
+        x, y = self.watch_location or (config["x"], config["y"])
+        self.image_processor.scroll_to_bottom()
+        self.region_baselines[handle] = self.image_processor.sample_region(
+            x, y, config.get("image_watch_size", 96)
+        )[0]
+
+    def ask(self, handle, prompt, img_path, config, task_id):
+        self.raise_conversation(handle)
+        self.record_region(handle, config)
+        return self.app_controller.ask_chatgpt(prompt, img_path, config, task_id)
+
+    def send(self, handle, prompt, img_path, config, task_id):
+        self.raise_conversation(handle)
+        self.record_region(handle, config)
+        self.send_attempts[task_id] = self.send_attempts.get(task_id, 0) + 1
+        # Incremental reads poll only the text added after the current length
+        since = self.app_controller.transcript_length() if config.get("incremental_read", True) else None
+        baseline = "" if since is not None else self.app_controller.read_response()
+        if not self.app_controller.send_prompt(prompt, img_path):
+            return False
+        now = time.time()
+        self.conversations[handle] = {
+            "prompt": prompt,
+            "since": since,
+            "baseline": baseline,
+            "sent_at": now,
+            "last_text": None,
+            "last_change": now,
+            "completed_at": None
+        }
+        return True
+
+    def poll(self, handle, config):
+        """
+        Read a conversation in the background and decide whether it can be fetched
+
+        A conversation is ready once its response text is stable and the image capture time
+        used by the serial path (response_timeout - save_image_delay after sending) has passed,
+        or once response_timeout has elapsed.
+        """
+        state = self.conversations[handle]
+        now = time.time()
+        if state["since"] is None:
+            text = self.app_controller.read_response(self.window_index(handle))
+        else:
+            text = self.app_controller.read_transcript(self.window_index(handle), since=state["since"])[1]
+        if text is not None and text != state["last_text"]:
+            state["last_text"] = text
+            state["last_change"] = now
+        elif (state["completed_at"] is None and state["last_text"] is not None
+              and state["last_text"] != state["baseline"]
+              and now - state["last_change"] >= config.get("response_stable_window", 6)):
+            state["completed_at"] = now
+
+        elapsed = now - state["sent_at"]
+        capture_after = max(0, config["response_timeout"] - config.get("save_image_delay", 15))
+        if state["completed_at"] is not None and elapsed >= capture_after:
+            return True
+        return elapsed >= config["response_timeout"]
+
+    def response_text(self, handle):
+        state = self.conversations.get(handle)
+        if not state or state["last_text"] is None:
+            return None
+        if state["since"] is not None:
+            return self.app_controller.latest_message(state["last_text"], state["prompt"])
+        return state["last_text"]
+
+    def await_image(self, handle, config, elapsed, location=None):
+        """
+        Wait for the generated image, either by watching the image region for pixel changes
+        or for the fixed delay derived from response_timeout and save_image_delay
+        """
+        if config["mode"]["window_type"] == "multi":
+            # Capture before opening a new window
+            save_image_delay = config.get("save_image_delay", 15)
+            wait_time = max(0, (config["response_timeout"] - save_image_delay) - elapsed)
+        else:
+            # In single-window mode, wait briefly after response
+            wait_time = 2
+
+        if config.get("image_watch", False) and location is not None:
+            self.raise_conversation(handle)
+            x, y = location[0], location[1]
+            self.watch_location = (x, y)
+            # Bound the watch by the remaining response time, but never below the fixed wait
+            timeout = max(wait_time, config["response_timeout"] - elapsed)
+            with tracer.span("image_watch"):
+                stable, waited = self.image_processor.wait_for_stable_image(
+                    x, y, timeout,
+                    interval=config.get("image_watch_interval", 1.0),
+                    stable_samples=config.get("image_stable_samples", 3),
+                    region_size=config.get("image_watch_size", 96),
+                    min_stddev=config.get("image_placeholder_stddev", 8.0),
+                    baseline=self.region_baselines.pop(handle, None)
+                )
+            if stable and waited <= wait_time:
+                print(f"Image stable after {waited:.1f} seconds "
+                      f"(saved {wait_time - waited:.1f} seconds versus the fixed delay)")
+            elif stable:
+                print(f"Image stable after {waited:.1f} seconds "
+                      f"({waited - wait_time:.1f} seconds longer than the fixed delay)")
+            else:
+                print(f"Image not stable after {waited:.1f} seconds, capturing anyway")
+            return
+
+        if wait_time > 0:
+            print(f"Waiting {wait_time:.1f} seconds before capturing image...")
+            tracer.sleep(wait_time, "image_delay")
+
+    def fetch_image(self, handle, img_name, target, location=None):
+        self.raise_conversation(handle)
+        x, y, x_shift, y_shift = location
+        return self.image_processor.copy_and_save_gpt_output_image(
+            x=x,
+            y=y,
+            x_shift=x_shift,
+            y_shift=y_shift,
+            target=target
+        )
+
+    def capture_image(self, handle, img_name, target, location=None):
+        self.raise_conversation(handle)
+        x, y, x_shift, y_shift = location
+        image = self.image_processor.capture_gpt_output_image(x, y, x_shift, y_shift)
+        if image is None:
+            return None
+        return lambda: self.image_processor.save_image(image, target)
+
+    def prepare_input(self, img_path, config):
+        # The send script pastes the file as PNG data; preflight output is PNG already
+        if os.path.splitext(img_path)[1].lower() == ".png":
+            return img_path
+        if self.preflight is None:
+            from utils.preflight import ImagePreflight
+
+            self.preflight = ImagePreflight.from_config(config)
+        return self.preflight.convert(img_path)
+
+    def close(self, handle):
+        self.conversations.pop(handle, None)
+        self.region_baselines.pop(handle, None)
+        if handle == self.MAIN:
+            return
+        self.raise_conversation(handle)
+        self.app_controller.close_front_window()
+        self.window_order.remove(handle)
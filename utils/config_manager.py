@@ -13,20 +13,103 @@ class ConfigManager:
     
     DEFAULT_CONFIG = {
         "response_timeout": 120,
+        "response_poll_interval": 2,   # Seconds between reads of the response text
+        "response_stable_window": 6,   # Seconds the response must stay unchanged to count as complete
+        "max_resend_attempts": 0,      # Times a prompt may be re-sent when no response is observed (0 = never)
+        "incremental_read": True,      # Read back only the text added since the prompt was sent
+        "use_script_host": False,      # Run AppleScript through one persistent osascript process
+        "script_timeout": 60,          # Seconds an AppleScript call may run beyond its fixed delays before it is killed (0 = no limit)
+        "liveness_ttl": 30,            # Seconds a successful ChatGPT running check is reused
+        "liveness_check": "pid",       # "pid" (process lookup) or "system_events" (AppleScript)
         "output_dir": "./data/example/chatgpt_results", # Default output directory
-        "save_results": False,
+        "save_results": False,  # Flat layout: also save each response and prompt to <output_dir>/<item>/
+        "output_format": "flat",  # "flat" (one PNG per item) or "tar" (image + JSON record per item in tar shards)
+        "shard_max_mb": 1024,  # Size at which a new tar shard is started
         "default_prompts_file": "example/text-only/prompts.txt",
         "num_images_to_process": 100,
+        "num_prompts_to_process": 0,  # Text-only items to process, cycling through the prompts (0 = one per line)
+        "prompt_field": "prompt",  # JSON key or CSV column holding the prompt in .jsonl/.csv prompt files
+        "resume": True,  # Skip tasks already captured according to the task ledger
+        "ledger_path": "",  # Task ledger database, defaults to task_ledger.sqlite in output_dir
+        "shard": "",  # "i/n" to process only shard i of n of the batch, e.g. "0/3" (empty = everything)
         "mode": {
             "window_type": "multi",  # "single" or "multi"
             "input_type": "text_only",  # "text_only" or "text_image"
-            "capture_images": True   # True or False
+            "capture_images": True,  # True or False
+            "pipeline_depth": 1,     # Conversations generating at once in multi-window mode
+            "backend": "gui"         # "gui" (ChatGPT desktop app) or "simulated" (offline simulator)
         },
+        "simulator": {},  # Overrides for SimulatedBackend.DEFAULT_SETTINGS
         "text_prefix": "Please generate an image based on the following prompts:\n",  # Prefix to add to each text input in text_only mode
         "use_prefix": True,  # Whether to use the prefix
         "image_folder": "",  # Default folder for images
+        "preflight_images": True,  # Validate and convert input images to PNG before the run starts
+        "max_input_image_size": 2048,  # Longest side of converted input images in pixels
+        "image_cache_dir": "",  # Converted image cache, defaults to image_cache in output_dir
+        "image_cache_max_mb": 2048,  # Converted image cache size limit
         "scroll_amount": 10,         # Number of scroll wheel clicks
         "save_image_delay": 15,       # Seconds to wait before saving images (15s before new window)
+        "capture_mode": "clipboard",  # "clipboard" (original image) or "region" (direct screen grab, faster)
+        "image_watch": False,         # Capture as soon as the image region changes and stops changing
+        "image_watch_interval": 1.0,  # Seconds between image region samples
+        "image_stable_samples": 3,    # Identical samples required before capturing
+        "image_watch_size": 96,       # Size in pixels of the sampled square around (x, y)
+        "image_placeholder_stddev": 8.0,  # Regions flatter than this are treated as placeholders
+        "auto_locate": False,  # Locate the newest image on screen and update x/y before each capture
+        "locator_cache": "",   # Image positions per window layout, defaults to image_positions.json next to the config
+        "trace": True,  # Write per-phase timings of each run to a JSONL trace
+        "trace_path": "",  # Trace file, defaults to traces/trace_<timestamp>.jsonl in the output folder
+        "recursive_images": True,  # Include images in subfolders of image_folder
+        "image_sample_seed": 0,  # Seed for choosing num_images_to_process images; the same seed picks the same subset
+        "image_manifest": "",  # Image folder index, defaults to image_manifest.json in the output folder
+        "retry": {
+            "max_attempts": 3,    # Tries per item, including the first, before it is reported as failed
+            "cooldown": 60.0,     # Seconds before a failed item is tried again in a fresh chat
+            "interleave": False   # Retry as soon as the cooldown passes instead of after all new items
+        },
+        "pacing": {
+            "hourly_budget": 0,     # Sends allowed per hour, 0 for no limit
+            "daily_budget": 0,      # Sends allowed per day, 0 for no limit
+            "min_interval": 1.0,    # Minimum seconds between sends
+            "backoff_base": 30.0,   # First backoff after a rate-limit or error response, doubled per repeat
+            "backoff_max": 3600.0,  # Upper bound of the backoff
+            "max_deferrals": 5,     # Times a rate-limited task is deferred before it counts as failed
+            "rate_limit_patterns": []  # Extra regular expressions that mark a response as rate limited
+        },
+        "rollover": {
+            "max_turns": 0,            # Single-window mode: new chat after this many turns, 0 for no limit
+            "max_chars": 0,            # New chat once prompts and responses exceed this many characters, 0 for no limit
+            "latency_threshold": 0.0,  # New chat when the mean turn latency exceeds this many seconds, 0 to disable
+            "latency_window": 3        # Recent turns averaged for the latency threshold
+        },
+        "watchdog": {
+            "enabled": True,       # Watch for tasks whose phases stop progressing (GUI backend)
+            "hang_timeout": 300,   # Seconds without progress before a task counts as hung
+            "actions": ["dismiss_dialog", "reactivate_app", "restart_app"]  # Recovery actions in escalation order
+        },
+        "service": {
+            "host": "127.0.0.1",     # Job service listen address (--serve)
+            "port": 8765,            # Job service port
+            "socket": "",            # Unix socket path used instead of host/port if set
+            "max_queue": 100,        # Queued and running jobs before submissions get HTTP 429
+            "max_per_submitter": 20, # Queued jobs per submitter before their submissions get HTTP 429
+            "db_path": ""            # Job database, defaults to jobs.sqlite in output_dir
+        },
+        "async_pipeline": {
+            "enabled": True,         # Prepare inputs and write outputs on a thread pool while the GUI waits
+            "queue_size": 2,         # Tasks waiting between two pipeline stages
+            "io_workers": 4          # Threads preparing inputs and writing outputs
+        },
+        "http_backend": {
+            "base_url": "https://api.openai.com/v1",  # OpenAI-compatible API base URL (mode.backend "http")
+            "api_key_env": "OPENAI_API_KEY",  # Environment variable holding the API key
+            "model": "gpt-image-1",  # Image model
+            "size": "1024x1024",     # Image size
+            "concurrency": 4,        # Requests in flight at once over pooled keep-alive connections
+            "timeout": 120,          # Socket timeout in seconds
+            "max_retries": 3,        # Retries of connection errors, 429 and 5xx responses
+            "retry_base": 1.0        # First retry delay in seconds, doubled per retry (Retry-After wins if longer)
+        },
         "x": 518,  # X coordinate for image capture
         "y": 580  # Y coordinate for image capture
     }
@@ -92,6 +175,18 @@ class ConfigManager:
         Returns:
             dict: Updated configuration
         """
+        self.set(key, value)
+        self.save()
+        return self.config
+    
+    def set(self, key, value):
+        """
+        Set specific configuration item in memory without saving
+        
+        Args:
+            key (str): Configuration key, supports dot notation for nested items
+            value: New configuration value
+        """
         # Handle nested keys
         if "." in key:
             parts = key.split(".")
@@ -103,9 +198,6 @@ class ConfigManager:
             current[parts[-1]] = value
         else:
             self.config[key] = value
-        
-        self.save()
-        return self.config
     
     def get(self, key, default=None):
         """
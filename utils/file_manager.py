@@ -2,8 +2,13 @@
 File management module: Responsible for file reading, saving, and image file collection
 """
 
+import io
+import json
 import os
-import random
+import threading
+
+from utils.image_index import ImageIndex
+from utils.output_sink import ShardedTarSink
 
 
 class FileManager:
@@ -11,6 +16,9 @@ class FileManager:
     File management class for handling file operations and image file collection
     """
     
+    # Appended to an item's base name to name its captured image
+    IMAGE_SUFFIX = "_ChatDe.png"
+    
     def __init__(self, output_dir=None):
         """
         Initialize file manager
@@ -19,6 +27,10 @@ class FileManager:
             output_dir (str, optional): Output directory path. Defaults to None.
         """
         self.output_dir = output_dir
+        self.sink = None  # ShardedTarSink when outputs are written to tar shards
+        self.save_text = False
+        # Results may be saved from several writer threads, while a tar shard takes one item at a time
+        self.lock = threading.Lock()
         if output_dir:
             self.prepare_output_folder(output_dir)
     
@@ -64,40 +76,45 @@ class FileManager:
             print(f"Error saving text to file: {exc}")
             return False
     
-    def collect_image_files(self, folder_path, num_to_process=None):
+    def collect_image_files(self, folder_path, num_to_process=None, seed=0, recursive=True, manifest_path=None,
+                            exclude=None):
         """
-        Collect image files from a folder
+        Collect image files from a folder and its subfolders
+        
+        The folder is indexed into a manifest that later runs refresh incrementally. A subset is
+        chosen with seeded reservoir sampling, so the same seed always selects the same images.
         
         Args:
             folder_path (str): Folder path
             num_to_process (int, optional): Number of images to process. Defaults to None (all).
+            seed (int, optional): Sampling seed. Defaults to 0.
+            recursive (bool, optional): Include subfolders. Defaults to True.
+            manifest_path (str, optional): Manifest file. Defaults to "<folder>.manifest.json" next to the folder.
+            exclude (list, optional): Directories not indexed, e.g. an output folder inside the image folder
             
         Returns:
-            list: List of image filenames
+            list: List of image paths relative to the folder
         """
         if not os.path.isdir(folder_path):
             print(f"Error: Invalid image folder: {folder_path}")
             return []
         
-        valid_exts = [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff"]
-        images = sorted([
-            f for f in os.listdir(folder_path)
-            if not f.startswith('.') and os.path.splitext(f)[1].lower() in valid_exts
-        ])
+        # The manifest is kept outside the folder so writing it does not change the folder's mtime
+        manifest_path = manifest_path or f"{os.path.abspath(folder_path).rstrip(os.sep)}.manifest.json"
+        index = ImageIndex(folder_path, manifest_path, recursive=recursive, exclude=exclude)
+        total_images = index.refresh()
         
-        if not images:
+        if not total_images:
             print(f"No valid images found in folder: {folder_path}")
             return []
         
-        total_images = len(images)
-        print(f"Found {total_images} images in folder: {folder_path}")
+        print(f"Found {total_images} images in folder: {folder_path} "
+              f"({index.rescanned} folders scanned, {index.reused} unchanged)")
         
         if num_to_process and num_to_process < total_images:
-            selected_images = random.sample(images, num_to_process)
-            selected_images.sort()
-            return selected_images
+            return index.sample(num_to_process, seed)
         
-        return images
+        return list(index.iter_images())
     
     def prepare_output_folder(self, base_path):
         """
@@ -112,33 +129,127 @@ class FileManager:
         os.makedirs(base_path, exist_ok=True)
         return base_path
     
-    def save_results(self, output_dir, img_name, response_text, prompt_text):
+    def configure_output(self, output_dir, config):
+        """
+        Select the output layout of a run
+        
+        Args:
+            output_dir (str): Output directory
+            config (dict): Configuration dictionary
+        """
+        self.close_output()
+        self.save_text = config.get("save_results", False)
+        output_format = config.get("output_format", "flat")
+        if output_format == "tar":
+            self.sink = ShardedTarSink(output_dir, max_bytes=int(config.get("shard_max_mb", 1024) * 1024 * 1024))
+            print(f"Writing outputs to tar shards in {output_dir}")
+        elif output_format != "flat":
+            print(f"Unknown output_format '{output_format}', writing loose files")
+    
+    def close_output(self):
+        """Close the output shard of a run"""
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+    
+    def output_location(self, output_dir, img_name):
+        """
+        Get where the output of an item is stored
+        
+        Args:
+            output_dir (str): Output directory
+            img_name (str): Item name
+            
+        Returns:
+            str: Image path, or "<shard file>#<key>" when outputs are written to tar shards
+        """
+        if self.sink is not None:
+            return self.sink.locations.get(img_name) or f"#{ShardedTarSink.make_key(img_name)}"
+        return self.image_path(output_dir, img_name)
+
+    @staticmethod
+    def image_path(output_dir, img_name):
+        """
+        Get the path of an item's captured image in the flat layout
+        
+        Args:
+            output_dir (str): Output directory
+            img_name (str): Item name, e.g. "sub/photo.jpg" or "prompt_3"
+            
+        Returns:
+            str: Image path, e.g. "<output_dir>/sub/photo_ChatDe.png"
+        """
+        base_name = os.path.splitext(img_name)[0] if '.' in img_name else img_name
+        return os.path.join(output_dir, base_name + FileManager.IMAGE_SUFFIX)
+
+    def image_target(self, output_dir, img_name):
+        """
+        Get where a backend writes an item's captured image
+        
+        Args:
+            output_dir (str): Output directory
+            img_name (str): Item name
+            
+        Returns:
+            str or io.BytesIO: Image path, or an in-memory buffer when outputs go to tar shards,
+                so the image is not written to disk only to be read back into the shard
+        """
+        if self.sink is not None:
+            return io.BytesIO()
+        return self.image_path(output_dir, img_name)
+    
+    def save_results(self, output_dir, img_name, response_text, prompt_text, metadata=None, image=None):
         """
         Save results for processed image
         
+        With tar shards, the captured image and a JSON record (prompt, response, source image,
+        timings) are appended to the current shard. Otherwise the image is already in place and
+        the response and prompt are written to <output_dir>/<item>/ if save_results is enabled.
+        
         Args:
             output_dir (str): Output directory
             img_name (str): Image filename
             response_text (str): Response text
             prompt_text (str): Prompt used
+            metadata (dict, optional): Additional record fields such as the source image and timings
+            image (str or io.BytesIO, optional): Captured image from image_target, None if no image was captured
             
         Returns:
             bool: Whether operation was successful
         """
+        if self.sink is not None:
+            record = {"item": img_name, "prompt": prompt_text, "response": response_text}
+            record.update(metadata or {})
+            members = {}
+            try:
+                if image is not None:
+                    members["png"] = image.getvalue()
+                members["json"] = json.dumps(record, ensure_ascii=False).encode("utf-8")
+                with self.lock:
+                    location = self.sink.write(img_name, members)
+            except Exception as exc:
+                print(f"Error writing {img_name} to the output shard: {exc}")
+                return False
+            print(f"Result stored in {location}")
+            return True
+        
+        if not self.save_text:
+            return True
+        
         base_name, _ = os.path.splitext(img_name)
         save_folder = os.path.join(output_dir, base_name)
-        # os.makedirs(save_folder, exist_ok=True)
+        os.makedirs(save_folder, exist_ok=True)
         
-        # # Save response text
-        # result_file = os.path.join(save_folder, "output.txt")
-        # response_saved = self.save_text_to_file(response_text, result_file)
-        # if response_saved:
-        #     print(f"Text result saved to: {result_file}")
+        # Save response text
+        result_file = os.path.join(save_folder, "output.txt")
+        response_saved = self.save_text_to_file(response_text, result_file)
+        if response_saved:
+            print(f"Text result saved to: {result_file}")
         
-        # # Save prompt text
-        # prompt_file = os.path.join(save_folder, "prompt.txt")
-        # prompt_saved = self.save_text_to_file(prompt_text, prompt_file)
-        # if prompt_saved:
-        #     print(f"Prompt saved to: {prompt_file}")
+        # Save prompt text
+        prompt_file = os.path.join(save_folder, "prompt.txt")
+        prompt_saved = self.save_text_to_file(prompt_text, prompt_file)
+        if prompt_saved:
+            print(f"Prompt saved to: {prompt_file}")
         
-        return
\ No newline at end of file
+        return response_saved and prompt_saved
\ No newline at end of file
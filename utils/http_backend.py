@@ -0,0 +1,544 @@
+"""
+HTTP backend module: Generates images through an OpenAI-compatible image API with pooled, concurrent requests
+"""
+
+import base64
+import http.client
+import itertools
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from utils.backends import ChatBackend
+from utils.tracer import tracer
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections reused across requests, at most `size` idle per host
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, size=4, timeout=120.0):
+        """
+        Initialize the pool
+
+        Args:
+            size (int, optional): Idle connections kept per host. Defaults to 4.
+            timeout (float, optional): Socket timeout in seconds. Defaults to 120.0.
+        """
+        self.size = size
+        self.timeout = timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, scheme, netloc):
+        """
+        Take an idle connection to a host or open a new one
+
+        Args:
+            scheme (str): "http" or "https"
+            netloc (str): Host and optional port
+
+        Returns:
+            http.client.HTTPConnection: Connection
+        """
+        with self.lock:
+            connections = self.idle.get((scheme, netloc))
+            if connections:
+                self.reused += 1
+                return connections.pop()
+            self.created += 1
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def release(self, scheme, netloc, connection):
+        """
+        Return a connection for reuse
+
+        Args:
+            scheme (str): "http" or "https"
+            netloc (str): Host and optional port
+            connection (http.client.HTTPConnection): Connection whose response was read completely
+        """
+        with self.lock:
+            connections = self.idle.setdefault((scheme, netloc), [])
+            if len(connections) < self.size:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, url, body=None, headers=None, download_path=None):
+        """
+        Send a request on a pooled connection
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute URL
+            body (bytes, optional): Request body
+            headers (dict, optional): Request headers
+            download_path (str, optional): Stream a successful response body into this file
+                instead of returning it; the file only appears once it is complete
+
+        Returns:
+            tuple: (status, headers, body) - body is None when it was streamed to download_path
+
+        Raises:
+            OSError, http.client.HTTPException: If the connection fails
+        """
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        connection = self.acquire(parts.scheme, parts.netloc)
+        try:
+            connection.request(method, path or "/", body=body, headers=headers or {})
+            response = connection.getresponse()
+            response_headers = {name.lower(): value for name, value in response.getheaders()}
+            if download_path is not None and response.status == 200:
+                partial_path = f"{download_path}.part"
+                with open(partial_path, 'wb') as file:
+                    while True:
+                        chunk = response.read(self.CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        file.write(chunk)
+                os.replace(partial_path, download_path)
+                data = None
+            else:
+                data = response.read()
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self.release(parts.scheme, parts.netloc, connection)
+        return (response.status, response_headers, data)
+
+    def close(self):
+        """Close all idle connections"""
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle = {}
+
+
+class HTTPImageBackend(ChatBackend):
+    """
+    Backend for OpenAI-compatible image endpoints
+
+    Text prompts go to /images/generations, prompts with an input image to /images/edits.
+    Requests run on a thread pool of `concurrency` workers sharing a keep-alive connection
+    pool, so the pipeline scheduler can keep that many generations in flight. Result images
+    are streamed to disk (or decoded from b64_json) and moved to the usual output path by
+    fetch_image. Connection errors, 429 and 5xx responses are retried with exponential
+    backoff, honoring Retry-After; a final rate-limit response is returned as the response
+    text, where the pacer recognizes it.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url, api_key=None, model="gpt-image-1", size="1024x1024", concurrency=4, timeout=120.0,
+                 max_retries=3, retry_base=1.0, extra_body=None):
+        """
+        Initialize the backend
+
+        Args:
+            base_url (str): API base URL, e.g. "https://api.openai.com/v1"
+            api_key (str, optional): Bearer token
+            model (str, optional): Image model. Defaults to "gpt-image-1".
+            size (str, optional): Image size. Defaults to "1024x1024".
+            concurrency (int, optional): Requests in flight at once. Defaults to 4.
+            timeout (float, optional): Socket timeout in seconds. Defaults to 120.0.
+            max_retries (int, optional): Retries per request after the first try. Defaults to 3.
+            retry_base (float, optional): First retry delay in seconds, doubled per retry. Defaults to 1.0.
+            extra_body (dict, optional): Additional request fields, e.g. {"quality": "high"}
+        """
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.size = size
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.extra_body = extra_body or {}
+        self.pool = ConnectionPool(self.concurrency, timeout)
+        self.executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="http-backend")
+        self.handles = itertools.count(1)
+        self.conversations = {}
+        self.current = None
+        self.retries = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the backend from the "http_backend" configuration section
+
+        Args:
+            config (dict): Configuration dictionary
+
+        Returns:
+            HTTPImageBackend: Configured backend
+        """
+        settings = config.get("http_backend", {})
+        return cls(
+            settings.get("base_url", "https://api.openai.com/v1"),
+            api_key=os.environ.get(settings.get("api_key_env", "OPENAI_API_KEY")),
+            model=settings.get("model", "gpt-image-1"),
+            size=settings.get("size", "1024x1024"),
+            concurrency=settings.get("concurrency", 4),
+            timeout=settings.get("timeout", 120.0),
+            max_retries=settings.get("max_retries", 3),
+            retry_base=settings.get("retry_base", 1.0),
+            extra_body=settings.get("extra_body")
+        )
+
+    def headers(self, content_type):
+        """Get the request headers"""
+        headers = {"Content-Type": content_type}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def call(self, method, url, body=None, headers=None, download_path=None):
+        """
+        Send a request, retrying connection errors, 429 and 5xx responses
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute URL
+            body (bytes, optional): Request body
+            headers (dict, optional): Request headers
+            download_path (str, optional): Stream a successful response body into this file
+
+        Returns:
+            tuple: (status, headers, body) of the last response
+
+        Raises:
+            OSError, http.client.HTTPException: If the last try failed to connect
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with tracer.span("http_request", method=method):
+                    status, response_headers, data = self.pool.request(method, url, body, headers, download_path)
+                if status != 429 and status < 500:
+                    return (status, response_headers, data)
+                retry_after = response_headers.get("retry-after")
+                reason = f"HTTP {status}"
+            except (OSError, http.client.HTTPException) as exc:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = None
+                reason = str(exc) or type(exc).__name__
+            if attempt == self.max_retries:
+                return (status, response_headers, data)
+            delay = self.retry_base * 2 ** attempt
+            # Equal jitter, so concurrent workers do not retry in lockstep
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            if retry_after is not None:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            self.retries += 1
+            print(f"{reason} from {urlsplit(url).path}, retrying in {delay:.1f} seconds "
+                  f"({attempt + 1}/{self.max_retries})")
+            tracer.sleep(delay, "http_retry")
+
+    @staticmethod
+    def multipart(fields, files):
+        """
+        Encode a multipart/form-data body
+
+        Args:
+            fields (dict): Form fields
+            files (dict): File fields, name -> (file name, bytes, content type)
+
+        Returns:
+            tuple: (body, content type)
+        """
+        boundary = uuid.uuid4().hex
+        lines = []
+        for name, value in fields.items():
+            lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8"))
+        for name, (file_name, data, content_type) in files.items():
+            lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{file_name}"\r\n'
+                         f'Content-Type: {content_type}\r\n\r\n'.encode("utf-8") + data + b"\r\n")
+        lines.append(f"--{boundary}--\r\n".encode("utf-8"))
+        return (b"".join(lines), f"multipart/form-data; boundary={boundary}")
+
+    def generate(self, prompt, img_path, download_path):
+        """
+        Run one generation request and download its image (runs on a worker thread)
+
+        Args:
+            prompt (str): Text prompt
+            img_path (str or None): Input image
+            download_path (str): File the result image is written to
+
+        Returns:
+            dict: "text" (revised prompt, or the error message) and "image" (path, or None)
+        """
+        fields = {"model": self.model, "prompt": prompt, "size": self.size, "n": 1}
+        fields.update(self.extra_body)
+        try:
+            if img_path:
+                with open(img_path, 'rb') as file:
+                    image = file.read()
+                body, content_type = self.multipart(
+                    {key: value if isinstance(value, str) else json.dumps(value) for key, value in fields.items()},
+                    {"image": (os.path.basename(img_path), image, "image/png")}
+                )
+                url = f"{self.base_url}/images/edits"
+            else:
+                body, content_type = json.dumps(fields).encode("utf-8"), "application/json"
+                url = f"{self.base_url}/images/generations"
+            status, _, data = self.call("POST", url, body, self.headers(content_type))
+            if status != 200:
+                return {"text": self.error_message(status, data), "image": None}
+
+            item = json.loads(data)["data"][0]
+            if item.get("b64_json"):
+                with open(download_path, 'wb') as file:
+                    file.write(base64.b64decode(item["b64_json"]))
+            elif item.get("url"):
+                with tracer.span("http_download"):
+                    status, _, data = self.call("GET", item["url"], download_path=download_path)
+                if status != 200:
+                    return {"text": f"Image download failed: {self.error_message(status, data)}", "image": None}
+            else:
+                return {"text": "Response contained no image", "image": None}
+            return {"text": item.get("revised_prompt") or f"Image generated for: {prompt[:200]}",
+                    "image": download_path}
+        except Exception as exc:
+            return {"text": f"Request failed: {exc}", "image": None}
+
+    @staticmethod
+    def error_message(status, data):
+        """
+        Get the error message of a failed response
+
+        Args:
+            status (int): HTTP status code
+            data (bytes): Response body
+
+        Returns:
+            str: Message, e.g. the "error.message" of an OpenAI error body
+        """
+        try:
+            message = json.loads(data)["error"]["message"]
+        except Exception:
+            message = (data or b"").decode("utf-8", "replace")[:300]
+        if status == 429 and "rate limit" not in message.lower():
+            message = f"Rate limit reached: {message}"
+        return f"HTTP {status}: {message}"
+
+    def check_running(self):
+        try:
+            status, _, _ = self.call("GET", f"{self.base_url}/models", headers=self.headers("application/json"))
+        except (OSError, http.client.HTTPException) as exc:
+            print(f"Image API not reachable at {self.base_url}: {exc}")
+            return False
+        # Any answer below 500 means the server is up, even if it does not list models
+        return status < 500
+
+    def new_chat(self, config, separate=False):
+        handle = next(self.handles)
+        self.conversations[handle] = None
+        if not separate:
+            self.current = handle
+        return handle
+
+    def current_chat(self):
+        if self.current is None:
+            self.new_chat(None)
+        return self.current
+
+    def send(self, handle, prompt, img_path, config, task_id):
+        self.send_attempts[task_id] = self.send_attempts.get(task_id, 0) + 1
+        download_dir = os.path.join(config["output_dir"], ".downloads")
+        os.makedirs(download_dir, exist_ok=True)
+        download_path = os.path.join(download_dir, f"{handle}_{uuid.uuid4().hex[:8]}.png")
+        self.conversations[handle] = {
+            "future": self.executor.submit(tracer.bind(self.generate), prompt, img_path, download_path),
+            "download_path": download_path
+        }
+        return True
+
+    def ask(self, handle, prompt, img_path, config, task_id):
+        self.send(handle, prompt, img_path, config, task_id)
+        return self.conversations[handle]["future"].result()["text"]
+
+    def poll(self, handle, config):
+        state = self.conversations.get(handle)
+        return state is None or state["future"].done()
+
+    def response_text(self, handle):
+        state = self.conversations.get(handle)
+        if state is None or not state["future"].done():
+            return None
+        return state["future"].result()["text"]
+
+    def await_image(self, handle, config, elapsed, location=None):
+        # The image is downloaded together with the response
+        pass
+
+    def poll_interval(self, config):
+        return 0.1
+
+    def fetch_image(self, handle, img_name, target, location=None):
+        state = self.conversations.get(handle)
+        result = state["future"].result() if state is not None else None
+        if result is None or result["image"] is None or not os.path.exists(result["image"]):
+            print(f"No image returned for {img_name}")
+            return False
+        if not isinstance(target, str):
+            with open(result["image"], "rb") as file:
+                shutil.copyfileobj(file, target)
+            os.remove(result["image"])
+            return True
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(result["image"], target)
+        print(f"Image saved: {target}")
+        return True
+
+    def close(self, handle):
+        state = self.conversations.pop(handle, None)
+        if handle == self.current:
+            self.current = None
+        if state is None:
+            return
+        if not state["future"].cancel():
+            # Drop a downloaded image that was not fetched, e.g. after a rate-limit response
+            state["future"].add_done_callback(lambda _: self.discard(state["download_path"]))
+
+    @staticmethod
+    def discard(path):
+        """Remove a leftover download"""
+        if os.path.exists(path):
+            os.remove(path)
+
+    def shutdown(self):
+        """Stop the worker threads and close pooled connections"""
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+
+def make_stand_in(port=8099, failure_rate=0.0, latency=0.5, seed=0):
+    """
+    Stand-in image API for testing the HTTP backend without a real service
+
+    Serves /v1/images/generations and /v1/images/edits with URL results that are downloaded
+    from /files/<name>.png in chunks. A fraction of requests fail with 429 or 500.
+
+    Args:
+        port (int, optional): Port on 127.0.0.1, 0 for any free port. Defaults to 8099.
+        failure_rate (float, optional): Probability that a generation request fails. Defaults to 0.0.
+        latency (float, optional): Seconds each generation takes. Defaults to 0.5.
+        seed (int, optional): Random seed for failures. Defaults to 0.
+
+    Returns:
+        ThreadingHTTPServer: Bound server, not yet serving
+    """
+    import hashlib
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from io import BytesIO
+
+    from utils.simulated_backend import write_png
+
+    rng = random.Random(seed)
+    files = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status, body, content_type="application/json", headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/v1/models":
+                return self.reply(200, json.dumps({"data": [{"id": "stand-in"}]}).encode())
+            name = self.path.rsplit("/", 1)[-1]
+            with lock:
+                data = files.pop(name, None)
+            if data is None:
+                return self.reply(404, b'{"error": {"message": "not found"}}')
+            self.reply(200, data, "image/png")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path not in ("/v1/images/generations", "/v1/images/edits"):
+                return self.reply(404, b'{"error": {"message": "not found"}}')
+            with lock:
+                roll = rng.random()
+            if roll < failure_rate / 2:
+                return self.reply(429, b'{"error": {"message": "Rate limit reached. Please try again in 1s."}}',
+                                  headers={"Retry-After": "1"})
+            if roll < failure_rate:
+                return self.reply(500, b'{"error": {"message": "The server had an error"}}')
+            time.sleep(latency)
+            digest = hashlib.sha1(body).digest()
+            image = BytesIO()
+            write_png(image, 64, 64, lambda x, y: ((digest[0] + x) & 0xff, (digest[1] + y) & 0xff, digest[2]))
+            name = f"{digest.hex()[:16]}.png"
+            with lock:
+                files[name] = image.getvalue()
+            url = f"http://127.0.0.1:{self.server.server_address[1]}/files/{name}"
+            result = {"data": [{"url": url, "revised_prompt": "stand-in image"}]}
+            self.reply(200, json.dumps(result).encode())
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+
+def serve_stand_in(port=8099, failure_rate=0.0, latency=0.5, seed=0):
+    """
+    Run the stand-in image API until interrupted
+
+    Args:
+        port (int, optional): Port on 127.0.0.1. Defaults to 8099.
+        failure_rate (float, optional): Probability that a generation request fails. Defaults to 0.0.
+        latency (float, optional): Seconds each generation takes. Defaults to 0.5.
+        seed (int, optional): Random seed for failures. Defaults to 0.
+    """
+    server = make_stand_in(port, failure_rate, latency, seed)
+    print(f"Stand-in image API on http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible image API backend tools")
+    parser.add_argument("--stand-in", action="store_true", help="Run a local stand-in image API")
+    parser.add_argument("--port", type=int, default=8099, help="Stand-in port")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 429/500")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per generation")
+    args = parser.parse_args()
+
+    if args.stand_in:
+        serve_stand_in(args.port, args.failure_rate, args.latency)
@@ -0,0 +1,169 @@
+"""
+Image index module: Recursively indexes an image folder into a manifest and samples it reproducibly
+"""
+
+import json
+import os
+import random
+
+
+class ImageIndex:
+    """
+    Recursive image folder index with an incrementally refreshed manifest
+
+    The manifest stores, per directory, its modification time, its image files (name, size,
+    mtime) and its subdirectories. Adding, removing or renaming an entry changes the
+    directory's mtime, so on later runs unchanged directories are taken from the manifest
+    without listing them again and only changed directories are rescanned.
+    """
+
+    VALID_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff")
+
+    def __init__(self, folder_path, manifest_path, recursive=True, exclude=None):
+        """
+        Initialize the index
+
+        Args:
+            folder_path (str): Image folder
+            manifest_path (str): Manifest JSON file
+            recursive (bool, optional): Include subfolders. Defaults to True.
+            exclude (list, optional): Directories skipped while scanning, e.g. an output folder inside the image folder
+        """
+        self.folder_path = os.path.abspath(folder_path)
+        self.manifest_path = manifest_path
+        self.recursive = recursive
+        self.exclude = {os.path.abspath(path) for path in (exclude or [])}
+        self.dirs = {}
+        self.rescanned = 0
+        self.reused = 0
+
+    def load_manifest(self):
+        """
+        Load the directory entries of an earlier scan of the same folder
+
+        Returns:
+            dict: Directory entries keyed by relative path
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            if manifest.get("folder") == self.folder_path and manifest.get("recursive") == self.recursive:
+                return manifest.get("dirs", {})
+        except Exception as exc:
+            print(f"Ignoring unreadable image manifest: {exc}")
+        return {}
+
+    def save_manifest(self):
+        """Write the manifest"""
+        try:
+            directory = os.path.dirname(self.manifest_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({"folder": self.folder_path, "recursive": self.recursive, "dirs": self.dirs}, file)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as exc:
+            print(f"Unable to save image manifest: {exc}")
+
+    def scan_dir(self, rel_dir, mtime):
+        """
+        List one directory
+
+        Args:
+            rel_dir (str): Directory relative to the folder ("" for the folder itself)
+            mtime (float): Directory modification time
+
+        Returns:
+            dict: Entry with mtime, files [[name, size, mtime], ...] and subdirs
+        """
+        files = []
+        subdirs = []
+        with os.scandir(os.path.join(self.folder_path, rel_dir)) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive and os.path.abspath(entry.path) not in self.exclude:
+                            subdirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in self.VALID_EXTS:
+                        stat = entry.stat()
+                        files.append([entry.name, stat.st_size, stat.st_mtime])
+                except OSError:
+                    continue
+        files.sort()
+        subdirs.sort()
+        return {"mtime": mtime, "files": files, "subdirs": subdirs}
+
+    def refresh(self):
+        """
+        Bring the index up to date, rescanning only directories whose mtime changed
+
+        Returns:
+            int: Number of indexed images
+        """
+        previous = self.load_manifest()
+        self.dirs = {}
+        self.rescanned = 0
+        self.reused = 0
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            try:
+                mtime = os.stat(os.path.join(self.folder_path, rel_dir)).st_mtime
+            except OSError:
+                continue
+            cached = previous.get(rel_dir)
+            if cached is not None and cached["mtime"] == mtime:
+                entry = cached
+                self.reused += 1
+            else:
+                try:
+                    entry = self.scan_dir(rel_dir, mtime)
+                except OSError as exc:
+                    print(f"Unable to read folder {rel_dir or self.folder_path}: {exc}")
+                    continue
+                self.rescanned += 1
+            self.dirs[rel_dir] = entry
+            pending.extend(os.path.join(rel_dir, name) for name in reversed(entry["subdirs"]))
+
+        self.save_manifest()
+        return sum(len(entry["files"]) for entry in self.dirs.values())
+
+    def iter_images(self):
+        """
+        Yield indexed images in a stable order
+
+        Yields:
+            str: Image path relative to the folder
+        """
+        for rel_dir in sorted(self.dirs):
+            for name, _, _ in self.dirs[rel_dir]["files"]:
+                yield os.path.join(rel_dir, name) if rel_dir else name
+
+    def sample(self, count, seed=0):
+        """
+        Choose `count` images in one pass with seeded reservoir sampling
+
+        The same seed over the same index always gives the same subset.
+
+        Args:
+            count (int): Number of images to choose
+            seed (int, optional): Random seed. Defaults to 0.
+
+        Returns:
+            list: Chosen relative paths, sorted
+        """
+        rng = random.Random(seed)
+        reservoir = []
+        for position, path in enumerate(self.iter_images()):
+            if position < count:
+                reservoir.append(path)
+            else:
+                slot = rng.randint(0, position)
+                if slot < count:
+                    reservoir[slot] = path
+        return sorted(reservoir)
@@ -0,0 +1,177 @@
+"""
+Image locator module: Finds the newest generated image on screen and caches its position per window layout
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+class ImageLocator:
+    """
+    Locates the newest image card in the ChatGPT window with NumPy rectangle detection
+
+    Image cards are solid blocks of non-background pixels, while text lines are broken up by
+    background gaps. Rows whose longest foreground run is at least min_width wide are grouped
+    into blocks, and the bottom-most block tall enough to be an image is the newest card.
+    Found positions are cached per window geometry and reused while they still validate.
+    """
+
+    def __init__(self, image_processor, cache_path, min_width=200, min_height=200, tolerance=12):
+        """
+        Initialize the image locator
+
+        Args:
+            image_processor: ImageProcessor instance used for screenshots
+            cache_path (str): JSON file storing positions per window geometry
+            min_width (int, optional): Minimum image width in screen points. Defaults to 200.
+            min_height (int, optional): Minimum image height in screen points. Defaults to 200.
+            tolerance (int, optional): Maximum gray difference from the background. Defaults to 12.
+        """
+        self.image_processor = image_processor
+        self.cache_path = cache_path
+        self.min_width = min_width
+        self.min_height = min_height
+        self.tolerance = tolerance
+        self.cache = self.load_cache()
+        self.hits = 0
+        self.searches = 0
+
+    def load_cache(self):
+        """
+        Load cached positions
+
+        Returns:
+            dict: Positions keyed by window geometry
+        """
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except Exception as exc:
+            print(f"Unable to read image position cache, starting empty: {exc}")
+            return {}
+
+    def save_cache(self):
+        """Save cached positions"""
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.cache_path, 'w', encoding='utf-8') as file:
+                json.dump(self.cache, file, indent=2)
+        except Exception as exc:
+            print(f"Unable to save image position cache: {exc}")
+
+    @staticmethod
+    def geometry_key(bounds):
+        """
+        Build the cache key of a window geometry
+
+        Args:
+            bounds (tuple): (x, y, width, height)
+
+        Returns:
+            str: Cache key
+        """
+        return ",".join(str(int(value)) for value in bounds)
+
+    def validate(self, x, y):
+        """
+        Check that a position is still inside an image card
+
+        Text and window chrome are not flat either, so the card around the point is detected
+        and must be at least as large as an image.
+
+        Args:
+            x (int): X coordinate
+            y (int): Y coordinate
+
+        Returns:
+            bool: True if the position is inside an image card
+        """
+        region = self.image_processor.detect_image_region(
+            x, y, tolerance=self.tolerance, min_size=min(self.min_width, self.min_height)
+        )
+        return region is not None
+
+    def find_newest_image(self, image, scale=1.0):
+        """
+        Find the center of the bottom-most image card in a screenshot
+
+        Args:
+            image (PIL.Image.Image): Screenshot
+            scale (float, optional): Screenshot pixels per screen point. Defaults to 1.0.
+
+        Returns:
+            tuple or None: (x, y) in screenshot pixels, or None if no card was found
+        """
+        gray = np.asarray(image.convert("L"), dtype=np.int16)
+        height, width = gray.shape
+        min_width = int(self.min_width * scale)
+        min_height = int(self.min_height * scale)
+
+        # The most common (coarsely binned) gray level is the window background
+        background = int(np.argmax(np.bincount((gray // 4).ravel(), minlength=64))) * 4 + 2
+        mask = np.abs(gray - background) > self.tolerance
+
+        # Longest horizontal run of foreground pixels per row, and where it ends
+        run = np.zeros(height, dtype=np.int32)
+        best = np.zeros(height, dtype=np.int32)
+        best_end = np.zeros(height, dtype=np.int32)
+        for col in range(width):
+            run = np.where(mask[:, col], run + 1, 0)
+            longer = run > best
+            best = np.where(longer, run, best)
+            best_end = np.where(longer, col, best_end)
+
+        dense = np.flatnonzero(best >= min_width)
+        if dense.size == 0:
+            return None
+
+        # Group dense rows into blocks, tolerating short gaps inside an image
+        max_gap = max(2, int(4 * scale))
+        splits = np.flatnonzero(np.diff(dense) > max_gap) + 1
+        blocks = [block for block in np.split(dense, splits) if block[-1] - block[0] + 1 >= min_height]
+        if not blocks:
+            return None
+
+        rows = blocks[-1]
+        left = int(np.median(best_end[rows] - best[rows] + 1))
+        right = int(np.median(best_end[rows]))
+        return ((left + right) // 2, (int(rows[0]) + int(rows[-1])) // 2)
+
+    def locate(self, bounds):
+        """
+        Get the position of the newest image, reusing the cached position while it validates
+
+        Args:
+            bounds (tuple): Window (x, y, width, height) in screen points
+
+        Returns:
+            tuple or None: (x, y) in screen points, or None if no image was found
+        """
+        key = self.geometry_key(bounds)
+        cached = self.cache.get(key)
+        if cached and self.validate(cached["x"], cached["y"]):
+            self.hits += 1
+            return (cached["x"], cached["y"])
+
+        self.searches += 1
+        left, top, width, height = bounds
+        screenshot = self.image_processor.grab_region((left, top, left + width, top + height))
+        # Screenshots on Retina displays have more pixels than screen points
+        scale = screenshot.size[0] / float(width)
+        found = self.find_newest_image(screenshot, scale)
+        if found is None:
+            print("Image locator found no image card in the window.")
+            return None
+
+        x = left + int(found[0] / scale)
+        y = top + int(found[1] / scale)
+        print(f"Image located at ({x}, {y}) for window layout {key}")
+        self.cache[key] = {"x": x, "y": y}
+        self.save_cache()
+        return (x, y)
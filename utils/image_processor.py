@@ -2,10 +2,19 @@
 Image processing module: Responsible for image capture, saving, and related mouse operations
 """
 
+import hashlib
 import os
 import time
+from collections import Counter
 import pyautogui
-from PIL import ImageGrab
+from PIL import Image, ImageGrab
+
+from utils.tracer import tracer
+
+try:
+    import mss  # Optional faster screen grabber
+except ImportError:
+    mss = None
 
 
 class ImageProcessor:
@@ -13,14 +22,18 @@ class ImageProcessor:
     Image processing class for screen operations, image capture and saving
     """
     
-    def __init__(self, scroll_amount=10):
+    def __init__(self, scroll_amount=10, capture_mode="clipboard"):
         """
         Initialize the image processor
         
         Args:
             scroll_amount (int, optional): Number of scroll actions. Defaults to 10.
+            capture_mode (str, optional): "clipboard" copies the original image through the right-click menu,
+                "region" grabs the detected image area straight from the screen. Defaults to "clipboard".
         """
         self.scroll_amount = scroll_amount
+        self.capture_mode = capture_mode
+        self._screen_grabber = None
     
     def scroll_to_bottom(self):
         """
@@ -38,12 +51,78 @@ class ImageProcessor:
         # Multiple scroll-down actions to reach the bottom
         for _ in range(self.scroll_amount):
             pyautogui.scroll(-1)  # Negative value for scrolling down
-            time.sleep(0.1)
+            tracer.sleep(0.1, "scroll_step")
         
         # Restore mouse position
         pyautogui.moveTo(current_x, current_y, duration=0.2)
         print("Scrolled to window bottom")
     
+    def sample_region(self, x, y, region_size=96):
+        """
+        Take a small screenshot around a point and summarize it
+        
+        Args:
+            x (int): Region center X coordinate
+            y (int): Region center Y coordinate
+            region_size (int, optional): Width and height of the sampled square. Defaults to 96.
+            
+        Returns:
+            tuple: (hash, stddev) of a quantized 16x16 grayscale thumbnail
+        """
+        half = region_size // 2
+        thumbnail = ImageGrab.grab(bbox=(x - half, y - half, x + half, y + half)).convert("L").resize((16, 16))
+        pixels = list(thumbnail.getdata())
+        mean = sum(pixels) / len(pixels)
+        stddev = (sum((value - mean) ** 2 for value in pixels) / len(pixels)) ** 0.5
+        # Drop the lowest bits so compression noise does not count as a change
+        quantized = bytes(value >> 3 for value in pixels)
+        return (hashlib.md5(quantized).hexdigest(), stddev)
+    
+    def wait_for_stable_image(self, x, y, timeout, interval=1.0, stable_samples=3, region_size=96, min_stddev=8.0,
+                              baseline=None):
+        """
+        Wait until the image region stops changing
+        
+        The region counts as final once it is not a flat placeholder (its standard deviation
+        is at least min_stddev), differs from what it showed before the prompt was sent, and
+        the same thumbnail was seen stable_samples times in a row.
+        
+        Args:
+            x (int): Image X coordinate
+            y (int): Image Y coordinate
+            timeout (float): Maximum seconds to wait
+            interval (float, optional): Seconds between samples. Defaults to 1.0.
+            stable_samples (int, optional): Identical samples required. Defaults to 3.
+            region_size (int, optional): Width and height of the sampled square. Defaults to 96.
+            min_stddev (float, optional): Minimum standard deviation of a non-placeholder region. Defaults to 8.0.
+            baseline (str, optional): Region hash taken before the prompt was sent; samples matching it
+                (e.g. the previous turn's image) are not counted. Defaults to None.
+            
+        Returns:
+            tuple: (stable, waited) - whether the image became stable and the seconds waited
+        """
+        start_time = time.time()
+        self.scroll_to_bottom()
+        last_hash = None
+        stable = 0
+        
+        while True:
+            region_hash, stddev = self.sample_region(x, y, region_size)
+            if stddev < min_stddev or region_hash == baseline:
+                stable = 0
+            elif region_hash == last_hash:
+                stable += 1
+            else:
+                stable = 1
+            last_hash = region_hash
+            
+            waited = time.time() - start_time
+            if stable >= stable_samples:
+                return (True, waited)
+            if waited + interval > timeout:
+                return (False, waited)
+            tracer.sleep(interval, "image_watch")
+    
     def copy_image_from_screen(self, x, y, x_shift=20, y_shift=0):
         """
         Automatically copy an image from screen using right-click menu
@@ -56,7 +135,7 @@ class ImageProcessor:
         """
         pyautogui.moveTo(x, y, duration=0.2)
         pyautogui.rightClick()
-        time.sleep(0.5)
+        tracer.sleep(0.5, "context_menu")
         pyautogui.moveTo(x + x_shift, y + y_shift, duration=0.2)
         pyautogui.click()
     
@@ -72,56 +151,222 @@ class ImageProcessor:
         """
         pyautogui.moveTo(x, y, duration=0.2)
         pyautogui.rightClick()
-        time.sleep(0.5)
+        tracer.sleep(0.5, "context_menu")
         # Adjust these coordinates to match the "Save Image" option in the right-click menu
         pyautogui.moveTo(x + x_shift, y + y_shift + 20, duration=0.2)  # +20 to position on "Save Image" instead of "Copy Image"
         pyautogui.click()
         # Wait for save dialog and press Enter
-        time.sleep(1)
+        tracer.sleep(1, "save_dialog")
         pyautogui.press('enter')
     
-    def copy_and_save_gpt_output_image(self, x, y, x_shift, y_shift, img_name, output_dir):
+    def grab_region(self, bbox):
         """
-        Use PyAutoGUI and PIL to capture and save ChatGPT output image from screen
+        Grab a screen region, using mss when it is installed and PIL otherwise
+        
+        Args:
+            bbox (tuple): (left, top, right, bottom) in screen coordinates
+            
+        Returns:
+            PIL.Image.Image: RGB screenshot of the region
+        """
+        left, top, right, bottom = bbox
+        if mss is not None:
+            if self._screen_grabber is None:
+                self._screen_grabber = mss.mss()
+            shot = self._screen_grabber.grab({"left": left, "top": top, "width": right - left, "height": bottom - top})
+            return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+        return ImageGrab.grab(bbox=bbox).convert("RGB")
+    
+    def detect_image_region(self, x, y, search_size=1400, tolerance=12, gap=12, min_size=64):
+        """
+        Detect the image containing a point and return it cropped from a single screenshot
+        
+        Starting from the point, the row and column are scanned outwards until `gap` consecutive
+        pixels match the background color, which is taken as the most common border color.
+        
+        Args:
+            x (int): Point inside the image, X coordinate
+            y (int): Point inside the image, Y coordinate
+            search_size (int, optional): Size of the searched square around the point. Defaults to 1400.
+            tolerance (int, optional): Maximum per-channel difference from the background. Defaults to 12.
+            gap (int, optional): Consecutive background pixels that end the image. Defaults to 12.
+            min_size (int, optional): Minimum width and height of a valid image in pixels. Defaults to 64.
+            
+        Returns:
+            PIL.Image.Image or None: Cropped image, or None if no image was found
+        """
+        screen_width, screen_height = pyautogui.size()
+        half = search_size // 2
+        left, top = max(0, x - half), max(0, y - half)
+        right, bottom = min(screen_width, x + half), min(screen_height, y + half)
+        shot = self.grab_region((left, top, right, bottom))
+        pixels = shot.load()
+        width, height = shot.size
+        
+        # Screenshots on Retina displays have more pixels than screen points
+        scale = width / float(right - left)
+        cx = min(width - 1, int((x - left) * scale))
+        cy = min(height - 1, int((y - top) * scale))
+        
+        border = [pixels[i, 0] for i in range(0, width, 8)] + [pixels[i, height - 1] for i in range(0, width, 8)]
+        border += [pixels[0, j] for j in range(0, height, 8)] + [pixels[width - 1, j] for j in range(0, height, 8)]
+        background = Counter(border).most_common(1)[0][0]
+        
+        def is_background(pixel):
+            return max(abs(pixel[c] - background[c]) for c in range(3)) <= tolerance
+        
+        def find_edge(positions, pixel_at):
+            edge = None
+            run = 0
+            for position in positions:
+                if is_background(pixel_at(position)):
+                    run += 1
+                    if run >= gap:
+                        break
+                else:
+                    run = 0
+                    edge = position
+            return edge
+        
+        if is_background(pixels[cx, cy]):
+            return None
+        edge_left = find_edge(range(cx, -1, -1), lambda i: pixels[i, cy])
+        edge_right = find_edge(range(cx, width), lambda i: pixels[i, cy])
+        edge_top = find_edge(range(cy, -1, -1), lambda j: pixels[cx, j])
+        edge_bottom = find_edge(range(cy, height), lambda j: pixels[cx, j])
+        
+        if edge_right - edge_left + 1 < min_size or edge_bottom - edge_top + 1 < min_size:
+            return None
+        # Light areas on the scan lines stop the scans early, so check the whole rectangle
+        if not self.is_image_card(pixels, is_background, (edge_left, edge_top, edge_right, edge_bottom), width, height):
+            print("Detected region does not match an image card.")
+            return None
+        return shot.crop((edge_left, edge_top, edge_right + 1, edge_bottom + 1))
+    
+    @staticmethod
+    def is_image_card(pixels, is_background, box, width, height, step=4, max_outline_miss=0.1, max_inner_background=0.5):
+        """
+        Check that a detected rectangle is a whole image card
+        
+        The lines just outside the rectangle must be background, so the card was not cut short,
+        and its inside must mostly not be background.
+        
+        Args:
+            pixels: Pixel access object of the screenshot
+            is_background (callable): Tells whether a pixel matches the background color
+            box (tuple): (left, top, right, bottom) inclusive pixel bounds of the rectangle
+            width (int): Screenshot width
+            height (int): Screenshot height
+            step (int, optional): Distance in pixels between checked pixels. Defaults to 4.
+            max_outline_miss (float, optional): Fraction of outline pixels allowed to differ from the
+                background. Defaults to 0.1.
+            max_inner_background (float, optional): Fraction of inner pixels allowed to match the
+                background. Defaults to 0.5.
+            
+        Returns:
+            bool: Whether the rectangle is bounded by background and filled with content
+        """
+        left, top, right, bottom = box
+        # A card touching the screenshot border may continue beyond it
+        if left < 1 or top < 1 or right > width - 2 or bottom > height - 2:
+            return False
+        outline = [pixels[i, top - 1] for i in range(left, right + 1, step)]
+        outline += [pixels[i, bottom + 1] for i in range(left, right + 1, step)]
+        outline += [pixels[left - 1, j] for j in range(top, bottom + 1, step)]
+        outline += [pixels[right + 1, j] for j in range(top, bottom + 1, step)]
+        misses = sum(1 for pixel in outline if not is_background(pixel))
+        if misses > max_outline_miss * len(outline):
+            return False
+        inner = [pixels[i, j] for i in range(left, right + 1, step * 2) for j in range(top, bottom + 1, step * 2)]
+        return sum(1 for pixel in inner if is_background(pixel)) <= max_inner_background * len(inner)
+    
+    def save_image(self, image, target):
+        """
+        Save a captured image as PNG
+        
+        Args:
+            image (PIL.Image.Image): Captured image
+            target (str or file): Image path, or a binary file object that receives the PNG data
+            
+        Returns:
+            bool: Whether the image was saved
+        """
+        try:
+            if isinstance(target, str):
+                # Images from subfolders keep their relative path under the output folder
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+            with tracer.span("png_save"):
+                image.save(target, "PNG")
+            if isinstance(target, str):
+                print(f"Image saved: {target}")
+            return True
+        except Exception as exc:
+            print(f"Failed to save image: {exc}")
+            return False
+    
+    def capture_gpt_output_image(self, x, y, x_shift, y_shift):
+        """
+        Use PyAutoGUI and PIL to capture the ChatGPT output image from screen
+        
+        In "region" capture mode the image is grabbed directly from the screen, which skips the
+        context menu and clipboard waits but yields screen resolution instead of the original file.
+        The clipboard path is used when no image region is detected.
         
         Args:
             x (int): Image X coordinate
             y (int): Image Y coordinate
             x_shift (int): Right-click menu X offset
             y_shift (int): Right-click menu Y offset
-            img_name (str): Image name (without extension)
-            output_dir (str): Output directory path
             
         Returns:
-            bool: Whether the operation was successful
+            PIL.Image.Image or None: Captured image, or None if nothing was captured
         """
         print(f"Attempting to copy GPT output image at coordinates ({x}, {y})...")
         
         # First scroll to the bottom of the window
-        self.scroll_to_bottom()
-        time.sleep(1)
+        with tracer.span("scroll"):
+            self.scroll_to_bottom()
+        
+        if self.capture_mode == "region":
+            # Short settle time for the scroll animation, no clipboard round trip needed
+            tracer.sleep(0.3, "scroll_settle")
+            with tracer.span("region_detect"):
+                image = self.detect_image_region(x, y)
+            if image is not None:
+                return image
+            print("No image region detected on screen, falling back to clipboard capture.")
+        else:
+            tracer.sleep(1, "scroll_settle")
         
         # Copy image to clipboard
-        self.copy_image_from_screen(x, y, x_shift, y_shift)
+        with tracer.span("copy_image"):
+            self.copy_image_from_screen(x, y, x_shift, y_shift)
 
         # Wait for clipboard to update
-        time.sleep(2)
+        tracer.sleep(2, "clipboard_wait")
 
         # Get image from clipboard
-        image = ImageGrab.grabclipboard()
+        with tracer.span("clipboard_grab"):
+            image = ImageGrab.grabclipboard()
         if image is None:
             print("No image found in clipboard.")
+        return image
+    
+    def copy_and_save_gpt_output_image(self, x, y, x_shift, y_shift, target):
+        """
+        Capture the ChatGPT output image from screen and save it
+        
+        Args:
+            x (int): Image X coordinate
+            y (int): Image Y coordinate
+            x_shift (int): Right-click menu X offset
+            y_shift (int): Right-click menu Y offset
+            target (str or file): Image path, or a binary file object that receives the PNG data
+            
+        Returns:
+            bool: Whether the operation was successful
+        """
+        image = self.capture_gpt_output_image(x, y, x_shift, y_shift)
+        if image is None:
             return False
-
-        # Save image to file
-        # target_folder = os.path.join(output_dir, img_name)
-        # os.makedirs(target_folder, exist_ok=True)
-        target_path = os.path.join(output_dir, f"{img_name}_ChatDe.png")
-
-        try:
-            image.save(target_path, "PNG")
-            print(f"Image saved: {target_path}")
-            return True
-        except Exception as exc:
-            print(f"Failed to save image: {exc}")
-            return False
\ No newline at end of file
+        return self.save_image(image, target)
@@ -0,0 +1,659 @@
+"""
+Job service module: Local HTTP service that queues jobs from several submitters for the single GUI worker
+"""
+
+import base64
+import json
+import os
+import socketserver
+import sqlite3
+import threading
+import time
+import uuid
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils.file_manager import FileManager
+from utils.pacer import RateLimitError
+from utils.tracer import tracer
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue or the submitter's share of it is full"""
+
+    def __init__(self, message, retry_after=60):
+        """
+        Initialize the error
+
+        Args:
+            message (str): Reason
+            retry_after (int, optional): Suggested seconds before submitting again. Defaults to 60.
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """
+    Durable job queue in SQLite with fair ordering between submitters
+
+    Jobs are handed out round robin: the next job belongs to the submitter that was served
+    longest ago, and is that submitter's oldest queued job. A submitter with many jobs
+    therefore cannot delay another submitter's first job by more than one job per submitter.
+    Jobs that were running when the service stopped are queued again on start.
+    """
+
+    TERMINAL = ("done", "failed", "cancelled")
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            submitter TEXT NOT NULL,
+            prompt TEXT NOT NULL,
+            image_path TEXT,
+            options TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            result TEXT,
+            error TEXT
+        )
+    '''
+
+    def __init__(self, db_path, max_depth=100, max_per_submitter=20):
+        """
+        Open the queue
+
+        Args:
+            db_path (str): SQLite database file path
+            max_depth (int, optional): Queued and running jobs allowed in total. Defaults to 100.
+            max_per_submitter (int, optional): Queued jobs allowed per submitter. Defaults to 20.
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_depth = max_depth
+        self.max_per_submitter = max_per_submitter
+        self.lock = threading.Lock()
+        # Signalled when a job is submitted so the worker does not have to poll
+        self.submitted = threading.Condition(self.lock)
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(self.SCHEMA)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS submitters (name TEXT PRIMARY KEY, last_served REAL)")
+        requeued = self.connection.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'").rowcount
+        self.connection.commit()
+        if requeued:
+            print(f"Queued {requeued} jobs again that were running when the service stopped")
+
+    def submit(self, submitter, prompt, image_path=None, options=None):
+        """
+        Add a job
+
+        Args:
+            submitter (str): Submitter name
+            prompt (str): Prompt
+            image_path (str, optional): Input image
+            options (dict, optional): Per-job configuration overrides
+
+        Returns:
+            str: Job ID
+
+        Raises:
+            QueueFullError: If the queue or the submitter's share of it is full
+        """
+        with self.lock:
+            depth = self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')").fetchone()[0]
+            if depth >= self.max_depth:
+                raise QueueFullError(f"Queue is full ({depth} jobs)", self.retry_after(depth))
+            own = self.connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = 'queued' AND submitter = ?", (submitter,)).fetchone()[0]
+            if own >= self.max_per_submitter:
+                raise QueueFullError(f"{submitter} already has {own} queued jobs", self.retry_after(own))
+            job_id = uuid.uuid4().hex[:12]
+            self.connection.execute(
+                "INSERT INTO jobs (id, submitter, prompt, image_path, options, state, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, submitter, prompt, image_path, json.dumps(options or {}), time.time())
+            )
+            self.connection.commit()
+            self.submitted.notify()
+            return job_id
+
+    def retry_after(self, jobs_ahead):
+        """
+        Estimate the seconds until the queue has room again
+
+        Args:
+            jobs_ahead (int): Jobs that have to finish first
+
+        Returns:
+            int: Seconds
+        """
+        row = self.connection.execute(
+            "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+            "WHERE state = 'done' ORDER BY finished_at DESC LIMIT 20)").fetchone()
+        mean = row[0] or 60.0
+        return int(max(1, min(jobs_ahead, 5) * mean))
+
+    def claim(self, timeout=None):
+        """
+        Take the next job in fair order and mark it running
+
+        Args:
+            timeout (float, optional): Seconds to wait for a job. Defaults to None (do not wait).
+
+        Returns:
+            dict or None: Job, or None if no job is queued
+        """
+        with self.lock:
+            row = self._next_queued()
+            if row is None and timeout:
+                self.submitted.wait(timeout)
+                row = self._next_queued()
+            if row is None:
+                return None
+            now = time.time()
+            self.connection.execute(
+                "UPDATE jobs SET state = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (now, row["id"]))
+            self.connection.execute(
+                "INSERT INTO submitters (name, last_served) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET last_served = excluded.last_served",
+                (row["submitter"], now))
+            self.connection.commit()
+        return self.get(row["id"])
+
+    def _next_queued(self):
+        """Find the oldest queued job of the submitter served longest ago"""
+        return self.connection.execute(
+            "SELECT jobs.id, jobs.submitter FROM jobs LEFT JOIN submitters ON submitters.name = jobs.submitter "
+            "WHERE jobs.state = 'queued' ORDER BY COALESCE(submitters.last_served, 0), jobs.created_at LIMIT 1"
+        ).fetchone()
+
+    def finish(self, job_id, state, result=None, error=None):
+        """
+        Record the outcome of a job
+
+        Args:
+            job_id (str): Job ID
+            state (str): "done", "failed" or "queued" (to run it again later)
+            result (dict, optional): Result paths and response text
+            error (str, optional): Failure reason
+        """
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+                (state, time.time() if state in self.TERMINAL else None,
+                 json.dumps(result) if result is not None else None, error, job_id))
+            self.connection.commit()
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued job
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            bool: True if the job was queued and is now cancelled
+        """
+        with self.lock:
+            cancelled = self.connection.execute(
+                "UPDATE jobs SET state = 'cancelled', finished_at = ? WHERE id = ? AND state = 'queued'",
+                (time.time(), job_id)).rowcount
+            self.connection.commit()
+        return bool(cancelled)
+
+    def get(self, job_id):
+        """
+        Get a job with its queue position
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            dict or None: Job, or None if unknown
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["options"] = json.loads(job["options"])
+            job["result"] = json.loads(job["result"]) if job["result"] else None
+            if job["state"] == "queued":
+                job["queued_ahead"] = self._queued_ahead(job["id"])
+        return job
+
+    def _queued_ahead(self, job_id):
+        """Count the queued jobs claim hands out before a job, replaying its round robin between submitters"""
+        rows = self.connection.execute(
+            "SELECT jobs.id, jobs.submitter, jobs.created_at, COALESCE(submitters.last_served, 0) AS last_served "
+            "FROM jobs LEFT JOIN submitters ON submitters.name = jobs.submitter "
+            "WHERE jobs.state = 'queued' ORDER BY jobs.created_at"
+        ).fetchall()
+        pending = {}
+        last_served = {}
+        for row in rows:
+            pending.setdefault(row["submitter"], []).append(row)
+            last_served[row["submitter"]] = row["last_served"]
+        served = max(last_served.values(), default=0)
+        ahead = 0
+        while pending:
+            # Same order as _next_queued: submitter served longest ago, then oldest job
+            submitter = min(pending, key=lambda name: (last_served[name], pending[name][0]["created_at"]))
+            row = pending[submitter].pop(0)
+            if row["id"] == job_id:
+                break
+            ahead += 1
+            served += 1
+            last_served[submitter] = served
+            if not pending[submitter]:
+                del pending[submitter]
+        return ahead
+
+    def list(self, submitter=None, limit=100):
+        """
+        List recent jobs
+
+        Args:
+            submitter (str, optional): Only jobs of this submitter
+            limit (int, optional): Maximum number of jobs. Defaults to 100.
+
+        Returns:
+            list: Jobs without prompts, newest first
+        """
+        query = "SELECT id, submitter, state, created_at, finished_at FROM jobs"
+        args = ()
+        if submitter:
+            query += " WHERE submitter = ?"
+            args = (submitter,)
+        with self.lock:
+            rows = self.connection.execute(query + " ORDER BY created_at DESC LIMIT ?", args + (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self):
+        """
+        Count jobs per state
+
+        Returns:
+            dict: Number of jobs per state
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            self.connection.close()
+
+
+class JobService:
+    """
+    Runs queued jobs one at a time through the Processor on a single worker thread
+
+    Only the worker drives the GUI; request handlers only read and write the queue.
+    """
+
+    # Configuration keys a job may override, dot notation for nested keys
+    JOB_OPTIONS = ("mode.capture_images", "response_timeout", "save_image_delay", "use_prefix", "text_prefix")
+
+    def __init__(self, queue, processor, config, jobs_dir, watchdog=None):
+        """
+        Initialize the service
+
+        Args:
+            queue (JobQueue): Job queue
+            processor (Processor): Processor driving the chat backend
+            config (dict): Configuration dictionary
+            jobs_dir (str): Folder for uploaded inputs and job results
+            watchdog (Watchdog, optional): Hang watchdog, armed only while a job runs
+        """
+        self.queue = queue
+        self.processor = processor
+        self.watchdog = watchdog
+        self.config = config
+        self.jobs_dir = jobs_dir
+        self.stopped = threading.Event()
+        self.worker = None
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def start(self):
+        """Start the worker thread"""
+        self.worker = threading.Thread(target=self.work, name="job-worker", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """Stop the worker after the current job"""
+        self.stopped.set()
+        if self.worker is not None:
+            self.worker.join()
+
+    def work(self):
+        """Worker loop"""
+        while not self.stopped.is_set():
+            job = self.queue.claim(timeout=1.0)
+            if job is None:
+                continue
+            # Waiting for jobs makes no progress, so only a running job is watched for hangs
+            if self.watchdog is not None:
+                self.watchdog.arm()
+            try:
+                self.run_job(job)
+            finally:
+                if self.watchdog is not None:
+                    self.watchdog.disarm()
+
+    def job_config(self, job):
+        """
+        Build the configuration of one job
+
+        Args:
+            job (dict): Job
+
+        Returns:
+            dict: Configuration with the job's allowed overrides and the jobs folder as output folder
+        """
+        config = deepcopy(self.config)
+        for key, value in job["options"].items():
+            if key not in self.JOB_OPTIONS:
+                continue
+            target = config
+            parts = key.split(".")
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+        config["output_dir"] = self.jobs_dir
+        return config
+
+    def run_job(self, job):
+        """
+        Run one job, retrying in a fresh chat and waiting out rate limits like a batch run
+
+        Args:
+            job (dict): Job
+        """
+        config = self.job_config(job)
+        prompt = job["prompt"]
+        if config.get("use_prefix", False):
+            prompt = config.get("text_prefix", "") + prompt
+        max_attempts = config.get("retry", {}).get("max_attempts", 3)
+        max_deferrals = config.get("pacing", {}).get("max_deferrals", 5)
+        pacer = self.processor.pacer
+        print(f"\nRunning job {job['id']} from {job['submitter']}")
+
+        success = False
+        tries = 0
+        deferrals = 0
+        error = None
+        while tries < max_attempts and not self.stopped.is_set():
+            if pacer is not None:
+                pacer.acquire()
+            tries += 1
+            try:
+                success = self.processor.process_task(job["id"], prompt, config, img_path=job["image_path"],
+                                                      new_chat=True, fresh_chat=tries > 1)
+            except RateLimitError as exc:
+                # The pacer holds the next send until the limit resets
+                deferrals += 1
+                tries -= 1
+                error = f"Rate limited: {exc}"
+                if deferrals > max_deferrals:
+                    break
+                continue
+            if success:
+                break
+            error = "No output captured"
+            if tries < max_attempts:
+                tracer.sleep(config.get("retry", {}).get("cooldown", 60.0), "retry_cooldown")
+        tracer.set_task(None)
+        self.processor.backend.forget(job["id"])
+
+        if self.stopped.is_set() and not success:
+            # Run it again when the service restarts
+            self.queue.finish(job["id"], "queued")
+            return
+        result = self.result_paths(job["id"], config) if success else None
+        self.queue.finish(job["id"], "done" if success else "failed", result=result,
+                          error=None if success else error)
+        print(f"Job {job['id']} {'done' if success else 'failed'}")
+
+    def result_paths(self, job_id, config):
+        """
+        Collect the stored results of a finished job
+
+        Args:
+            job_id (str): Job ID
+            config (dict): Job configuration
+
+        Returns:
+            dict: Image path (None if images are not captured) and response text
+        """
+        image_path = FileManager.image_path(self.jobs_dir, job_id)
+        response_path = os.path.join(self.jobs_dir, job_id, "output.txt")
+        response = None
+        if os.path.exists(response_path):
+            with open(response_path, 'r', encoding='utf-8') as file:
+                response = file.read()
+        return {
+            "image_path": image_path if config["mode"]["capture_images"] and os.path.exists(image_path) else None,
+            "response": response
+        }
+
+    def save_upload(self, data):
+        """
+        Store an uploaded input image
+
+        Args:
+            data (bytes): Image file contents
+
+        Returns:
+            str: Stored image path
+        """
+        uploads = os.path.join(self.jobs_dir, "uploads")
+        os.makedirs(uploads, exist_ok=True)
+        path = os.path.join(uploads, f"{uuid.uuid4().hex}.png")
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the job service
+
+    POST   /jobs              {"prompt", "submitter"?, "image_path"? | "image_base64"?, "options"?} -> 202 {"id", ...}
+    GET    /jobs?submitter=x  recent jobs
+    GET    /jobs/<id>         status, and the response text once done
+    GET    /jobs/<id>/events  status changes as server-sent events until the job finishes
+    GET    /jobs/<id>/image   generated image
+    DELETE /jobs/<id>         cancel a queued job
+    GET    /health            jobs per state
+    """
+
+    server_version = "ChatGPTJobService/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        """
+        Send a JSON response
+
+        Args:
+            status (int): HTTP status code
+            body: JSON-serializable body
+            headers (dict, optional): Extra headers
+        """
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self):
+        """
+        Split the request path
+
+        Returns:
+            tuple: (path parts, query parameters)
+        """
+        url = urlparse(self.path)
+        return ([part for part in url.path.split("/") if part], parse_qs(url.query))
+
+    def submitter(self, body):
+        """
+        Get the submitter name from the body, the X-Submitter header or the client address
+
+        The name is taken on trust, so round robin and the per-submitter limit only keep
+        cooperating clients apart; anyone who can reach the service can claim any name.
+        """
+        name = body.get("submitter") or self.headers.get("X-Submitter")
+        if not name:
+            name = self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+        return str(name)[:64]
+
+    def do_POST(self):
+        parts, _ = self.route()
+        if parts != ["jobs"]:
+            return self.send_json(404, {"error": "not found"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            return self.send_json(400, {"error": "body must be JSON"})
+        prompt = body.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            return self.send_json(400, {"error": "prompt is required"})
+        image_path = body.get("image_path")
+        if image_path and not os.path.isfile(image_path):
+            return self.send_json(400, {"error": f"image not found: {image_path}"})
+        upload = None
+        try:
+            if body.get("image_base64"):
+                upload = image_path = self.service.save_upload(base64.b64decode(body["image_base64"]))
+            job_id = self.service.queue.submit(self.submitter(body), prompt, image_path, body.get("options"))
+        except (QueueFullError, ValueError) as exc:
+            # A rejected job would leave its upload behind
+            if upload is not None:
+                os.remove(upload)
+            if isinstance(exc, QueueFullError):
+                return self.send_json(429, {"error": str(exc)}, {"Retry-After": str(exc.retry_after)})
+            return self.send_json(400, {"error": "image_base64 is not valid base64"})
+        job = self.service.queue.get(job_id)
+        self.send_json(202, {"id": job_id, "state": job["state"], "queued_ahead": job.get("queued_ahead", 0)},
+                       {"Location": f"/jobs/{job_id}"})
+
+    def do_GET(self):
+        parts, query = self.route()
+        if parts == ["health"]:
+            return self.send_json(200, {"jobs": self.service.queue.stats()})
+        if parts == ["jobs"]:
+            return self.send_json(200, self.service.queue.list(query.get("submitter", [None])[0]))
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self.send_json(404, {"error": "not found"})
+        job = self.service.queue.get(parts[1])
+        if job is None:
+            return self.send_json(404, {"error": "unknown job"})
+        if len(parts) == 2:
+            return self.send_json(200, job)
+        if parts[2:] == ["events"]:
+            return self.stream_events(job)
+        if parts[2:] == ["image"]:
+            image_path = (job["result"] or {}).get("image_path")
+            if not image_path or not os.path.exists(image_path):
+                return self.send_json(404, {"error": "no image for this job"})
+            with open(image_path, 'rb') as file:
+                data = file.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_json(404, {"error": "not found"})
+
+    def do_DELETE(self):
+        parts, _ = self.route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self.send_json(404, {"error": "not found"})
+        if self.service.queue.cancel(parts[1]):
+            return self.send_json(200, {"id": parts[1], "state": "cancelled"})
+        self.send_json(409, {"error": "only queued jobs can be cancelled"})
+
+    def stream_events(self, job):
+        """
+        Send the job status as server-sent events whenever it changes, until the job finishes
+
+        Args:
+            job (dict): Job
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        last = None
+        try:
+            while job is not None:
+                status = (job["state"], job.get("queued_ahead"))
+                if status != last:
+                    self.wfile.write(f"data: {json.dumps(job)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    last = status
+                if job["state"] in JobQueue.TERMINAL:
+                    break
+                time.sleep(1)
+                job = self.service.queue.get(job["id"])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket, so access can be limited with file permissions"""
+
+    daemon_threads = True
+
+
+def serve(service, host="127.0.0.1", port=8765, socket_path=None):
+    """
+    Serve the job API until interrupted
+
+    Args:
+        service (JobService): Job service
+        host (str, optional): Listen address. Defaults to "127.0.0.1".
+        port (int, optional): Listen port. Defaults to 8765.
+        socket_path (str, optional): Unix socket path, used instead of host and port
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, JobRequestHandler)
+        print(f"Job service listening on {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), JobRequestHandler)
+        print(f"Job service listening on http://{host}:{port}")
+    server.service = service
+    service.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping job service after the current job...")
+    finally:
+        server.server_close()
+        service.stop()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
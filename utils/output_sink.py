@@ -0,0 +1,255 @@
+"""
+Output sink module: Appends captured images and their metadata to size-bounded tar shards with a random-access index
+"""
+
+import io
+import json
+import os
+import tarfile
+import time
+
+
+class ShardedTarSink:
+    """
+    WebDataset-style tar shards
+
+    Every item becomes a group of tar members sharing one key (`<key>.png` and `<key>.json`).
+    A shard is closed and the next one started before it would grow past `max_bytes`.
+    After each item a line with the shard, the byte offset and size of every member and the
+    end offset of the item is appended to the index, so members can be read with one seek.
+    The index is also the commit record: when a run is resumed, the last shard is cut back
+    to the end of its last indexed item, dropping an item that was only partly written.
+    """
+
+    INDEX_NAME = "shards.index.jsonl"
+    BLOCK = tarfile.BLOCKSIZE
+
+    def __init__(self, output_dir, prefix="shard", max_bytes=1024 ** 3):
+        """
+        Initialize the sink and reopen the newest shard
+
+        Args:
+            output_dir (str): Folder holding the shards and the index
+            prefix (str, optional): Shard file name prefix. Defaults to "shard".
+            max_bytes (int, optional): Shard size limit in bytes. Defaults to 1 GiB.
+        """
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(output_dir, self.INDEX_NAME)
+        self.locations = {}
+        self.tar = None
+        self.file = None
+        self.items = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Continue after the last indexed item of the newest shard
+        self.shard = 0
+        self.end = 0
+        for entry in load_index(output_dir).values():
+            if (entry["shard_number"], entry["end"]) > (self.shard, self.end):
+                self.shard, self.end = entry["shard_number"], entry["end"]
+        self.open_shard()
+
+    def shard_name(self, number):
+        """
+        Get the file name of a shard
+
+        Args:
+            number (int): Shard number
+
+        Returns:
+            str: File name, e.g. shard-000003.tar
+        """
+        return f"{self.prefix}-{number:06d}.tar"
+
+    def open_shard(self):
+        """Open the current shard for appending at the end of its last indexed item"""
+        path = os.path.join(self.output_dir, self.shard_name(self.shard))
+        self.file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        # Drops a partly written item and the end-of-archive blocks written when it was closed
+        self.file.seek(self.end)
+        self.file.truncate()
+        self.tar = tarfile.open(fileobj=self.file, mode='w', format=tarfile.PAX_FORMAT)
+
+    def close_shard(self):
+        """Finish the current shard with the end-of-archive blocks"""
+        if self.tar is not None:
+            self.tar.close()
+            self.file.close()
+            self.tar = None
+            self.file = None
+
+    @staticmethod
+    def make_key(item_name):
+        """
+        Get the sample key of an item
+
+        Dots are replaced because WebDataset readers split the extension at the first dot.
+
+        Args:
+            item_name (str): Item name
+
+        Returns:
+            str: Key, e.g. "sub/photo_v2_ChatDe" for "sub/photo.v2.jpg"
+        """
+        base_name = os.path.splitext(item_name)[0] if '.' in item_name else item_name
+        return f"{base_name.replace(os.sep, '/').replace('.', '_')}_ChatDe"
+
+    def write(self, item_name, members):
+        """
+        Append one item to the current shard, starting a new shard if it would grow too large
+
+        Args:
+            item_name (str): Item name
+            members (dict): Member data keyed by extension, e.g. {"png": bytes, "json": bytes}
+
+        Returns:
+            str: Location of the item, "<shard file>#<key>"
+        """
+        key = self.make_key(item_name)
+        # Header block and padding per member
+        size = sum(len(data) + 2 * self.BLOCK for data in members.values())
+        if self.end and self.end + size > self.max_bytes:
+            self.close_shard()
+            self.shard += 1
+            self.end = 0
+            self.open_shard()
+            print(f"Started output shard {self.shard_name(self.shard)}")
+
+        offsets = {}
+        for extension, data in members.items():
+            info = tarfile.TarInfo(f"{key}.{extension}")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.tar.addfile(info, io.BytesIO(data))
+            # The data ends at the current offset, followed by padding to a whole block
+            padded = -(-len(data) // self.BLOCK) * self.BLOCK
+            offsets[extension] = [self.tar.offset - padded, len(data)]
+        self.file.flush()
+        self.end = self.tar.offset
+        self.items += 1
+
+        entry = {"key": key, "item": item_name, "shard": self.shard_name(self.shard),
+                 "shard_number": self.shard, "members": offsets, "end": self.end}
+        with open(self.index_path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry) + "\n")
+        location = f"{entry['shard']}#{key}"
+        self.locations[item_name] = location
+        return location
+
+    def close(self):
+        """Close the current shard"""
+        self.close_shard()
+
+
+def load_index(output_dir):
+    """
+    Load a shard index; the newest entry of a key wins
+
+    Args:
+        output_dir (str): Folder holding the shards and the index
+
+    Returns:
+        dict: Index entries keyed by sample key
+    """
+    index_path = os.path.join(output_dir, ShardedTarSink.INDEX_NAME)
+    entries = {}
+    if not os.path.exists(index_path):
+        return entries
+    with open(index_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Line cut short by an interrupted run
+            entries[entry["key"]] = entry
+    return entries
+
+
+def read_member(output_dir, key, extension, index=None):
+    """
+    Read one member of an item with a single seek
+
+    Args:
+        output_dir (str): Folder holding the shards and the index
+        key (str): Sample key
+        extension (str): Member extension, e.g. "png" or "json"
+        index (dict, optional): Index returned by load_index, loaded if not given
+
+    Returns:
+        bytes or None: Member data, or None if the key or member is not indexed
+    """
+    entry = (index if index is not None else load_index(output_dir)).get(key)
+    if entry is None or extension not in entry["members"]:
+        return None
+    offset, size = entry["members"][extension]
+    with open(os.path.join(output_dir, entry["shard"]), 'rb') as file:
+        file.seek(offset)
+        return file.read(size)
+
+
+def rebuild_index(output_dir, prefix="shard"):
+    """
+    Recreate the index by reading every shard
+
+    Args:
+        output_dir (str): Folder holding the shards
+        prefix (str, optional): Shard file name prefix. Defaults to "shard".
+
+    Returns:
+        int: Number of indexed items
+    """
+    names = sorted(name for name in os.listdir(output_dir)
+                   if name.startswith(f"{prefix}-") and name.endswith(".tar"))
+    entries = []
+    for name in names:
+        number = int(name[len(prefix) + 1:-len(".tar")])
+        items = {}
+        with tarfile.open(os.path.join(output_dir, name), 'r') as tar:
+            for member in tar:
+                key, _, extension = member.name.partition(".")
+                entry = items.setdefault(key, {"key": key, "item": None, "shard": name, "shard_number": number,
+                                               "members": {}, "end": 0})
+                entry["members"][extension] = [member.offset_data, member.size]
+                entry["end"] = max(entry["end"], member.offset_data
+                                   + -(-member.size // ShardedTarSink.BLOCK) * ShardedTarSink.BLOCK)
+        for entry in items.values():
+            metadata = read_member(output_dir, entry["key"], "json", {entry["key"]: entry})
+            if metadata is not None:
+                entry["item"] = json.loads(metadata).get("item")
+            entries.append(entry)
+    index_path = os.path.join(output_dir, ShardedTarSink.INDEX_NAME)
+    with open(index_path, 'w', encoding='utf-8') as file:
+        for entry in entries:
+            file.write(json.dumps(entry) + "\n")
+    print(f"Indexed {len(entries)} items from {len(names)} shards into {index_path}")
+    return len(entries)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Output shard tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    extract_parser = subparsers.add_parser("extract", help="Write the members of one item to files")
+    extract_parser.add_argument("output_dir", help="Folder holding the shards and the index")
+    extract_parser.add_argument("key", help="Sample key, e.g. prompt_1_ChatDe")
+    extract_parser.add_argument("--dest", default=".", help="Destination folder")
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recreate the index from the shards")
+    rebuild_parser.add_argument("output_dir", help="Folder holding the shards")
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        entry = load_index(args.output_dir).get(args.key)
+        if entry is None:
+            raise SystemExit(f"Key not found in index: {args.key}")
+        for extension in entry["members"]:
+            target = os.path.join(args.dest, f"{args.key}.{extension}")
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            with open(target, 'wb') as file:
+                file.write(read_member(args.output_dir, args.key, extension, {args.key: entry}))
+            print(f"Wrote {target}")
+    elif args.command == "rebuild":
+        rebuild_index(args.output_dir)
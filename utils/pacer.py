@@ -0,0 +1,346 @@
+"""
+Pacer module: Paces sends with hourly/daily budgets and backs off when ChatGPT reports a rate limit
+"""
+
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from utils.tracer import tracer
+
+
+class RateLimitError(Exception):
+    """Raised when a response says the service is throttling us; the task should be deferred"""
+
+    def __init__(self, message, retry_after=None):
+        """
+        Initialize the error
+
+        Args:
+            message (str): Rate-limit text found in the response
+            retry_after (float, optional): Seconds until the limit resets, if the message says so
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket holding `capacity` sends that refills evenly over `period` seconds
+    """
+
+    def __init__(self, capacity, period):
+        """
+        Initialize the bucket full
+
+        Args:
+            capacity (int): Maximum number of sends per period
+            period (float): Refill period in seconds
+        """
+        self.capacity = float(capacity)
+        self.rate = capacity / float(period)
+        self.tokens = float(capacity)
+        self.updated = time.time()
+
+    def refill(self, now):
+        """Add the tokens accumulated since the last update"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """
+        Get the seconds until one token is available
+
+        Args:
+            now (float): Current time
+
+        Returns:
+            float: Seconds to wait, 0 if a token is available
+        """
+        self.refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """Consume one token"""
+        self.refill(now)
+        self.tokens -= 1
+
+
+class Pacer:
+    """
+    Adaptive pacing between sends
+
+    Sends are limited by a minimum interval and by optional hourly and daily token buckets.
+    Responses are classified by their last characters (the newest message in the transcript):
+    a rate-limit message raises RateLimitError so the caller can defer the task, and rate-limit
+    or error messages start an exponential backoff with jitter that grows with each consecutive
+    signal. A normal response resets the backoff.
+    """
+
+    # Anchored to the wording of the app's limit notices and API errors, so ordinary replies
+    # ("once you've reached step 3", "please wait for the dough to rise") do not match
+    RATE_LIMIT_PATTERNS = [
+        r"(?:^|[.!?]\s+)you(?:'ve|’ve| have) (?:reached|hit) (?:the|your|our) [^.\n]{0,60}?(?:usage cap|limit)\b",
+        r"\blimit resets in\b",
+        r"\btoo many requests in (?:the (?:last|past) )?(?:\d+ |an? |one )?(?:minutes?|hours?|days?)\b",
+        r"\byou(?:'re|’re| are) (?:generating|creating|sending) [^.\n]{0,30}too (?:quickly|fast)\b",
+        r"\bplease wait (?:for )?\d+ ?(?:seconds?|minutes?|hours?) before (?:generating|creating|sending|trying)\b",
+        r"\brate limit (?:reached|exceeded)\b",
+        r"\bexceeded (?:your|the) [^.\n]{0,40}(?:rate limit|quota)\b",
+    ]
+
+    # Whole-sentence forms of the app's error notices and of this tool's own failure messages,
+    # so replies that mention errors ("if an error occurred during install") do not match
+    ERROR_PATTERNS = [
+        r"(?:^|[.!?]\s+)something went wrong(?: while [^.\n]{0,60})?[.!]",
+        r"(?:^|[.!?]\s+)(?:a )?network error(?: occurred)?[.!]",
+        r"(?:^|[.!?]\s+)an error occurred(?: while [^.,\n]{0,60})?[.!]",
+        r"(?:^|[.!?]\s+)error in (?:the )?(?:message|body) stream\b",
+        r"^response timeout after waiting \d+ seconds\.",
+        r"^HTTP 5\d\d: ",
+    ]
+
+    UNITS = {"s": 1, "m": 60, "h": 3600}
+
+    def __init__(self, hourly_budget=0, daily_budget=0, min_interval=1.0, backoff_base=30.0, backoff_max=3600.0,
+                 extra_patterns=None, tail_chars=600):
+        """
+        Initialize the pacer
+
+        Args:
+            hourly_budget (int, optional): Sends allowed per hour, 0 for no limit. Defaults to 0.
+            daily_budget (int, optional): Sends allowed per day, 0 for no limit. Defaults to 0.
+            min_interval (float, optional): Minimum seconds between sends. Defaults to 1.0.
+            backoff_base (float, optional): First backoff delay in seconds. Defaults to 30.0.
+            backoff_max (float, optional): Maximum backoff delay in seconds. Defaults to 3600.0.
+            extra_patterns (list, optional): Additional regular expressions for rate-limit messages
+            tail_chars (int, optional): Characters at the end of the response that are classified. Defaults to 600.
+        """
+        self.buckets = {}
+        if hourly_budget:
+            self.buckets["hourly"] = TokenBucket(hourly_budget, 3600)
+        if daily_budget:
+            self.buckets["daily"] = TokenBucket(daily_budget, 86400)
+        self.min_interval = min_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.tail_chars = tail_chars
+        self.rate_limit_re = re.compile("|".join(self.RATE_LIMIT_PATTERNS + list(extra_patterns or [])),
+                                        re.IGNORECASE | re.MULTILINE)
+        self.error_re = re.compile("|".join(self.ERROR_PATTERNS), re.IGNORECASE | re.MULTILINE)
+
+        self.consecutive = 0
+        self.resume_at = 0.0
+        self.last_send = 0.0
+        self.started = time.time()
+        self.sent = 0
+        self.throttles = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a pacer from the "pacing" configuration section
+
+        Args:
+            config (dict): Configuration dictionary
+
+        Returns:
+            Pacer: Configured pacer
+        """
+        pacing = config.get("pacing", {})
+        return cls(
+            hourly_budget=pacing.get("hourly_budget", 0),
+            daily_budget=pacing.get("daily_budget", 0),
+            min_interval=pacing.get("min_interval", 1.0),
+            backoff_base=pacing.get("backoff_base", 30.0),
+            backoff_max=pacing.get("backoff_max", 3600.0),
+            extra_patterns=pacing.get("rate_limit_patterns")
+        )
+
+    def classify(self, text):
+        """
+        Classify a response
+
+        Args:
+            text (str or None): Response text
+
+        Returns:
+            str: "rate_limit", "error" or "ok"
+        """
+        if not text:
+            return "ok"
+        tail = text[-self.tail_chars:]
+        if self.rate_limit_re.search(tail):
+            return "rate_limit"
+        if self.error_re.search(tail):
+            return "error"
+        return "ok"
+
+    def parse_retry_after(self, text):
+        """
+        Read the reset time from a rate-limit message, e.g. "try again in 12 minutes" or "after 5:40 PM"
+
+        Args:
+            text (str): Rate-limit message
+
+        Returns:
+            float or None: Seconds until the reset, or None if the message gives no time
+        """
+        tail = text[-self.tail_chars:]
+        match = re.search(r"(\d+)\s*(s|m|h)(?:ec(?:ond)?s?|in(?:ute)?s?|(?:ou)?rs?)?\b", tail, re.IGNORECASE)
+        if match:
+            return int(match.group(1)) * self.UNITS[match.group(2).lower()]
+        match = re.search(r"\b(\d{1,2}):(\d{2})\s*([AP]M)?", tail, re.IGNORECASE)
+        if match:
+            hour, minute = int(match.group(1)), int(match.group(2))
+            if match.group(3):
+                hour = hour % 12 + (12 if match.group(3).upper() == "PM" else 0)
+            if hour > 23 or minute > 59:
+                return None
+            now = datetime.now()
+            reset = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if reset <= now:
+                reset += timedelta(days=1)
+            return (reset - now).total_seconds()
+        return None
+
+    def throttle(self, retry_after=None):
+        """
+        Start or extend a backoff after a throttle signal
+
+        Args:
+            retry_after (float, optional): Reset time reported by the service
+
+        Returns:
+            float: Seconds until sending resumes
+        """
+        self.consecutive += 1
+        self.throttles += 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.consecutive - 1))
+        # Equal jitter: keep half the delay and randomize the rest so retries do not line up
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self.resume_at = max(self.resume_at, time.time() + delay)
+        return self.resume_at - time.time()
+
+    def check(self, text):
+        """
+        Classify a response and update the backoff state
+
+        Args:
+            text (str or None): Response text
+
+        Raises:
+            RateLimitError: If the response is a rate-limit message
+        """
+        status = self.classify(text)
+        if status == "rate_limit":
+            message = text[-self.tail_chars:].strip()
+            delay = self.throttle(self.parse_retry_after(text))
+            print(f"Rate limit detected, pausing sends for {self.format_duration(delay)}")
+            raise RateLimitError(message, delay)
+        if status == "error":
+            delay = self.throttle()
+            print(f"Error response detected, backing off for {self.format_duration(delay)}")
+        else:
+            self.consecutive = 0
+
+    def delay(self):
+        """
+        Get the seconds until the next send is allowed
+
+        Returns:
+            float: Seconds to wait, 0 if a send is allowed now
+        """
+        now = time.time()
+        waits = [self.resume_at - now, self.last_send + self.min_interval - now]
+        waits += [bucket.wait_time(now) for bucket in self.buckets.values()]
+        return max(0.0, max(waits))
+
+    def acquire(self):
+        """Wait until a send is allowed and consume one send from the budgets"""
+        wait = self.delay()
+        if wait > 1:
+            print(f"Pacing: waiting {self.format_duration(wait)} before the next send")
+        tracer.sleep(wait, "pacing")
+        self.take()
+
+    def take(self):
+        """Consume one send from the budgets without waiting"""
+        now = time.time()
+        for bucket in self.buckets.values():
+            bucket.take(now)
+        self.last_send = now
+        self.sent += 1
+
+    def progress(self, done, remaining):
+        """
+        Describe the current pace and the estimated time to finish
+
+        Args:
+            done (int): Tasks finished in this run
+            remaining (int): Tasks left
+
+        Returns:
+            str: Pace and ETA
+        """
+        elapsed = time.time() - self.started
+        pace = done * 3600 / elapsed if elapsed > 0 and done else 0.0
+        # The budgets cap the long-run pace even if tasks finish faster
+        limits = [bucket.rate * 3600 for bucket in self.buckets.values()]
+        effective = min([pace] + limits) if pace else 0.0
+        eta = self.format_duration(remaining * 3600 / effective) if effective else "unknown"
+        return f"Pace: {pace:.1f} tasks/h, ETA for {remaining} remaining: {eta}"
+
+    def snapshot(self):
+        """
+        Get the state that should survive a restart
+
+        Returns:
+            dict: Bucket levels and backoff state
+        """
+        now = time.time()
+        for bucket in self.buckets.values():
+            bucket.refill(now)
+        return {
+            "buckets": {name: bucket.tokens for name, bucket in self.buckets.items()},
+            "updated": now,
+            "resume_at": self.resume_at,
+            "consecutive": self.consecutive
+        }
+
+    def restore(self, state):
+        """
+        Restore the state saved by snapshot
+
+        Args:
+            state (dict or None): Saved state
+        """
+        if not state:
+            return
+        for name, tokens in state.get("buckets", {}).items():
+            if name in self.buckets:
+                self.buckets[name].tokens = min(self.buckets[name].capacity, tokens)
+                self.buckets[name].updated = state.get("updated", time.time())
+        self.resume_at = state.get("resume_at", 0.0)
+        self.consecutive = state.get("consecutive", 0)
+
+    @staticmethod
+    def format_duration(seconds):
+        """
+        Format seconds as a short duration
+
+        Args:
+            seconds (float): Duration in seconds
+
+        Returns:
+            str: e.g. "45s", "12m 5s", "3h 20m"
+        """
+        seconds = int(max(0, seconds))
+        if seconds < 60:
+            return f"{seconds}s"
+        if seconds < 3600:
+            return f"{seconds // 60}m {seconds % 60}s"
+        return f"{seconds // 3600}h {seconds % 3600 // 60}m"
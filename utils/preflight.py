@@ -0,0 +1,188 @@
+"""
+Preflight module: Validates and converts input images to size-capped PNGs before the GUI run starts
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+
+def convert_image(job):
+    """
+    Decode one image and store a PNG copy capped at max_size in the cache
+
+    Runs in a worker process, so it only takes and returns plain values.
+
+    Args:
+        job (tuple): (src_path, cache_dir, max_size)
+
+    Returns:
+        tuple: (src_path, png_path or None, error message or None, cache_hit)
+    """
+    src_path, cache_dir, max_size = job
+    try:
+        digest = hashlib.sha256()
+        with open(src_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(str(max_size).encode("utf-8"))
+        key = digest.hexdigest()
+        png_path = os.path.join(cache_dir, key[:2], f"{key}.png")
+
+        if os.path.exists(png_path):
+            # Touch the entry so LRU eviction keeps recently used images
+            os.utime(png_path, None)
+            return (src_path, png_path, None, True)
+
+        with Image.open(src_path) as image:
+            image.seek(0)  # First frame of animated GIF/TIFF files
+            image.load()
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+            if max(image.size) > max_size:
+                image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+            os.makedirs(os.path.dirname(png_path), exist_ok=True)
+            tmp_path = f"{png_path}.{os.getpid()}.tmp"
+            image.save(tmp_path, "PNG")
+            os.replace(tmp_path, png_path)
+        return (src_path, png_path, None, False)
+    except Exception as exc:
+        return (src_path, None, str(exc), False)
+
+
+class ImagePreflight:
+    """
+    Image preflight stage with a content-hash keyed on-disk PNG cache
+
+    Every input is decoded once in a process pool. Files that cannot be decoded are reported
+    before any GUI work starts, and valid files are converted to PNG (the format pasted into
+    ChatGPT) with their longest side capped at max_size. The cache is bounded by
+    max_cache_bytes and evicts the least recently used entries.
+    """
+
+    def __init__(self, cache_dir, max_size=2048, max_cache_bytes=2 * 1024 ** 3, workers=None):
+        """
+        Initialize the preflight stage
+
+        Args:
+            cache_dir (str): Cache directory
+            max_size (int, optional): Maximum width and height of converted images. Defaults to 2048.
+            max_cache_bytes (int, optional): Cache size limit in bytes. Defaults to 2 GiB.
+            workers (int, optional): Worker processes. Defaults to the number of CPUs.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_cache_bytes = max_cache_bytes
+        self.workers = workers
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the preflight stage from the configuration
+
+        Args:
+            config (dict): Configuration dictionary
+
+        Returns:
+            ImagePreflight: Preflight stage using the run's image cache
+        """
+        return cls(
+            config.get("image_cache_dir") or os.path.join(config["output_dir"], "image_cache"),
+            max_size=config.get("max_input_image_size", 2048),
+            max_cache_bytes=int(config.get("image_cache_max_mb", 2048) * 1024 * 1024)
+        )
+
+    def convert(self, image_path):
+        """
+        Validate and convert one image in the current process
+
+        Args:
+            image_path (str): Input image path
+
+        Returns:
+            str: Path of the cached PNG
+
+        Raises:
+            ValueError: If the image cannot be decoded
+        """
+        _, png_path, error, _ = convert_image((image_path, self.cache_dir, self.max_size))
+        if error is not None:
+            raise ValueError(error)
+        return png_path
+
+    def run(self, image_paths):
+        """
+        Validate and convert images
+
+        Args:
+            image_paths (list): Input image paths
+
+        Returns:
+            tuple: (converted, failed) - dicts mapping input paths to PNG paths and to error messages
+        """
+        converted = {}
+        failed = {}
+        hits = 0
+        jobs = [(path, self.cache_dir, self.max_size) for path in image_paths]
+        if not jobs:
+            return (converted, failed)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            chunksize = max(1, len(jobs) // ((self.workers or os.cpu_count() or 1) * 4))
+            for src_path, png_path, error, cache_hit in executor.map(convert_image, jobs, chunksize=chunksize):
+                if error is not None:
+                    failed[src_path] = error
+                else:
+                    converted[src_path] = png_path
+                    hits += cache_hit
+
+        print(f"Preflight: {len(converted)} images ready ({hits} from cache), {len(failed)} invalid")
+        for src_path, error in failed.items():
+            print(f"  Invalid image {src_path}: {error}")
+        self.evict(keep=set(converted.values()))
+        return (converted, failed)
+
+    def evict(self, keep=None):
+        """
+        Delete the least recently used cache entries until the cache fits max_cache_bytes
+
+        Args:
+            keep (set, optional): Paths needed by the current run, never deleted
+
+        Returns:
+            int: Number of deleted entries
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        removed = 0
+        keep = keep or set()
+        for _, size, path in sorted(entries):
+            if total <= self.max_cache_bytes:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            print(f"Preflight cache: evicted {removed} least recently used images")
+        return removed
@@ -2,16 +2,20 @@
 Processor module: Responsible for integrating other module functionalities and handling the complete process for each task
 """
 
-import os
 import time
 
+from utils.backends import GUIBackend
+from utils.pacer import RateLimitError
+from utils.tracer import tracer
+
 
 class Processor:
     """
     Processor class that integrates various modules to process individual tasks
     """
     
-    def __init__(self, config_manager, app_controller, image_processor, file_manager):
+    def __init__(self, config_manager, app_controller, image_processor, file_manager, backend=None, locator=None,
+                 pacer=None, rollover=None):
         """
         Initialize the processor
         
@@ -19,6 +23,12 @@ class Processor:
             app_controller: AppController instance for ChatGPT interaction
             image_processor: ImageProcessor instance for image capture processing
             file_manager: FileManager instance for file operations
+            backend (ChatBackend, optional): Chat backend. Defaults to the GUI backend built from
+                app_controller and image_processor.
+            locator (ImageLocator, optional): Locator that updates x and y before each capture. Defaults to None.
+            pacer (Pacer, optional): Pacer that classifies responses for rate limits. Defaults to None.
+            rollover (RolloverPolicy, optional): Starts a new chat in single-window mode when the
+                conversation grows too long. Defaults to None.
             x (int): Image X coordinate
             y (int): Image Y coordinate
             x_shift (int): Right-click menu X offset
@@ -27,13 +37,32 @@ class Processor:
         self.app_controller = app_controller
         self.image_processor = image_processor
         self.file_manager = file_manager
+        self.backend = backend or GUIBackend(app_controller, image_processor)
+        self.locator = locator
+        self.pacer = pacer
+        self.rollover = rollover
         
         self.x = config_manager.config["x"]
         self.y = config_manager.config["y"]
         self.x_shift = 20
         self.y_shift = 0
     
-    def process_task(self, item_name, prompt, config, img_path=None, new_chat=True):
+    def get_output_path(self, item_name, config):
+        """
+        Get where the captured image of an item is stored
+        
+        Args:
+            item_name (str): Item name used for saving results
+            config (dict): Configuration dictionary
+            
+        Returns:
+            str or None: Output image path ("<shard file>#<key>" with tar shards), or None if image capture is disabled
+        """
+        if not config["mode"]["capture_images"]:
+            return None
+        return self.file_manager.output_location(config["output_dir"], item_name)
+    
+    def process_task(self, item_name, prompt, config, img_path=None, new_chat=True, fresh_chat=False):
         """
         Process a single task interaction with ChatGPT, either text-only or text+image
         
@@ -42,58 +71,203 @@ class Processor:
             prompt (str): Prompt to use
             config (dict): Configuration dictionary
             img_path (str, optional): Image file path, if not provided only text will be sent
-            new_chat (bool, optional): Whether to create a new chat. Defaults to True.
+            new_chat (bool, optional): Whether to create a new chat in multi-window mode. Defaults to True.
+            fresh_chat (bool, optional): Start a new chat in any window mode, used for retries. Defaults to False.
             
         Returns:
-            bool: Whether processing was successful
+            bool: Whether the output image was captured (or the response saved, if image capture is disabled)
+            
+        Raises:
+            RateLimitError: If the response is a rate-limit message; the task should be deferred
         """
-        output_dir = config["output_dir"]
-        capture_images = config["mode"]["capture_images"]
-        save_image_delay = config.get("save_image_delay", 15)
+        tracer.set_task(item_name)
+        with tracer.span("task"):
+            return self._process_task(item_name, prompt, config, img_path, new_chat, fresh_chat)
+    
+    def _process_task(self, item_name, prompt, config, img_path=None, new_chat=True, fresh_chat=False):
+        """Run the phases of process_task"""
+        outcome = self.interact(item_name, prompt, config, img_path, new_chat, fresh_chat)
+        if outcome is None:
+            return False
+        return self.finish(item_name, prompt, outcome, config, img_path)
+    
+    def interact(self, item_name, prompt, config, img_path=None, new_chat=True, fresh_chat=False):
+        """
+        Run the phases of a task that use the backend: new chat, ask, image wait and capture
         
-        # Create a new chat if in multi-window mode and new chat is required
-        if new_chat and config["mode"]["window_type"] == "multi":
-            created = self.app_controller.create_new_chat()
-            if not created:
+        Args:
+            item_name (str): Item name used for saving results
+            prompt (str): Prompt to use
+            config (dict): Configuration dictionary
+            img_path (str, optional): Image file path, if not provided only text will be sent
+            new_chat (bool, optional): Whether to create a new chat in multi-window mode. Defaults to True.
+            fresh_chat (bool, optional): Start a new chat in any window mode, used for retries. Defaults to False.
+            
+        Returns:
+            dict or None: "response", "timings", "write_image" (stores the captured image, None
+                if image capture is disabled) and "image" (where it is stored) to pass to finish,
+                or None if the task failed
+            
+        Raises:
+            RateLimitError: If the response is a rate-limit message; the task should be deferred
+        """
+        # In single-window mode, leave the conversation once it has grown too long
+        rollover = None
+        if self.rollover is not None and config["mode"]["window_type"] == "single" and not fresh_chat:
+            rollover = self.rollover.due()
+        
+        # Create a new chat if in multi-window mode and new chat is required, for a retry or a rollover
+        handle = None
+        if fresh_chat or rollover or (new_chat and config["mode"]["window_type"] == "multi"):
+            with tracer.span("new_chat"):
+                handle = self.backend.new_chat(config)
+            if handle is None:
                 print("Failed to create new chat, sending in current chat window...")
+            elif self.rollover is not None:
+                self.rollover.reset(rollover)
+        if handle is None:
+            handle = self.backend.current_chat()
 
         # Send prompt (and optional image) to ChatGPT
         try:
             # Calculate when to save image
             start_time = time.time()
+            timings = {}
             
             # Send prompt (and optional image) and get response
-            response = self.app_controller.ask_chatgpt(prompt, img_path, config)
+            turn = self.rollover.turns + 1 if self.rollover is not None else None
+            with tracer.span("ask", turn=turn):
+                response = self.backend.ask(handle, prompt, img_path, config, task_id=item_name)
+            timings["ask"] = time.time() - start_time
+            if self.rollover is not None:
+                self.rollover.record(prompt, response, timings["ask"])
+            attempts = self.backend.send_attempts.get(item_name, 1)
+            if attempts > 1:
+                print(f"{item_name} was sent {attempts} times.")
             
-            # Save text response and prompt
-            base_name = os.path.splitext(item_name)[0] if '.' in item_name else item_name
-            self.file_manager.save_results(output_dir, item_name, response, prompt)
+            # Stop before waiting for an image that a throttled conversation will not produce
+            if self.pacer is not None:
+                self.pacer.check(response)
             
-            # Calculate elapsed time
-            elapsed_time = time.time() - start_time
+            if not config["mode"]["capture_images"]:
+                return {"response": response, "timings": timings, "write_image": None, "image": None}
             
-            # If processing in multi-window mode, capture before opening a new window
-            if config["mode"]["window_type"] == "multi":
-                # Calculate time to wait
-                wait_time = max(0, (config["response_timeout"] - save_image_delay) - elapsed_time)
-                if wait_time > 0:
-                    print(f"Waiting {wait_time:.1f} seconds before capturing image...")
-                    time.sleep(wait_time)
-            else:
-                # In single-window mode, wait briefly after response
-                time.sleep(2)  # Brief wait after response
+            # Wait until the generated image is expected to be final
+            phase_start = time.time()
+            with tracer.span("await_image"):
+                self.backend.await_image(
+                    handle,
+                    config,
+                    time.time() - start_time,
+                    location=(self.x, self.y, self.x_shift, self.y_shift)
+                )
+            timings["await_image"] = time.time() - phase_start
             
             # Try to capture GPT output image
-            self.image_processor.copy_and_save_gpt_output_image(
-                x=self.x,
-                y=self.y,
-                x_shift=self.x_shift,
-                y_shift=self.y_shift,
-                img_name=base_name,
-                output_dir=output_dir
-            )
-            
-            return True
+            phase_start = time.time()
+            with tracer.span("capture"):
+                captured = self.capture_output(item_name, config, handle)
+            timings["capture"] = time.time() - phase_start
+            if captured is None:
+                print(f"No output image captured for {item_name}.")
+                return None
+            write_image, image = captured
+            return {"response": response, "timings": timings, "write_image": write_image, "image": image}
+        except RateLimitError:
+            raise
         except Exception as exc:
             print(f"Exception occurred while processing {item_name}: {str(exc)}")
-            return False
\ No newline at end of file
+            return None
+    
+    def finish(self, item_name, prompt, outcome, config, img_path=None):
+        """
+        Write the captured image of a task and save its results in the configured output layout
+        
+        Does not use the backend, so it can run on another thread while the next task is sent.
+        
+        Args:
+            item_name (str): Item name used for saving results
+            prompt (str): Prompt that was sent
+            outcome (dict): Result of interact
+            config (dict): Configuration dictionary
+            img_path (str, optional): Input image that was sent
+            
+        Returns:
+            bool: Whether the image and results were stored
+        """
+        timings = outcome["timings"]
+        try:
+            if outcome["write_image"] is not None:
+                phase_start = time.time()
+                if not outcome["write_image"]():
+                    return False
+                timings["write_image"] = time.time() - phase_start
+            return self.save_output(item_name, prompt, outcome["response"], config, img_path, timings,
+                                    image=outcome["image"])
+        except Exception as exc:
+            print(f"Exception occurred while saving {item_name}: {str(exc)}")
+            return False
+    
+    def save_output(self, item_name, prompt, response, config, img_path=None, timings=None, image=None):
+        """
+        Store the results of a finished task
+        
+        Args:
+            item_name (str): Item name used for saving results
+            prompt (str): Prompt that was sent
+            response (str): Response text
+            config (dict): Configuration dictionary
+            img_path (str, optional): Input image that was sent
+            timings (dict, optional): Seconds spent per phase
+            image (str or io.BytesIO, optional): Captured image returned by capture_output
+            
+        Returns:
+            bool: Whether the results were stored
+        """
+        metadata = {
+            "source_image": img_path,
+            "timings": {phase: round(seconds, 3) for phase, seconds in (timings or {}).items()},
+            "finished_at": time.time()
+        }
+        with tracer.span("save_results"):
+            return self.file_manager.save_results(config["output_dir"], item_name, response, prompt,
+                                                  metadata=metadata, image=image)
+    
+    def capture_output(self, item_name, config, handle):
+        """
+        Capture the generated image of a conversation
+        
+        Args:
+            item_name (str): Item name used for saving results
+            config (dict): Configuration dictionary
+            handle: Conversation handle returned by the backend
+            
+        Returns:
+            tuple or None: (write_image, image) - writes the captured image and returns whether it
+                was stored, and the image path or buffer to pass to save_output - or None if nothing was captured
+        """
+        if self.locator is not None:
+            with tracer.span("locate_image"):
+                self.update_image_position()
+        image = self.file_manager.image_target(config["output_dir"], item_name)
+        write_image = self.backend.capture_image(
+            handle,
+            item_name,
+            image,
+            location=(self.x, self.y, self.x_shift, self.y_shift)
+        )
+        if write_image is None:
+            return None
+        return (write_image, image)
+    
+    def update_image_position(self):
+        """
+        Update the capture coordinates from the image locator, keeping the current ones if nothing is found
+        """
+        bounds = self.app_controller.get_window_bounds()
+        if bounds is None:
+            return
+        self.image_processor.scroll_to_bottom()
+        position = self.locator.locate(bounds)
+        if position is not None:
+            self.x, self.y = position
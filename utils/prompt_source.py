@@ -0,0 +1,253 @@
+"""
+Prompt source module: Streams prompts from large txt, JSONL or CSV files without loading them into memory
+"""
+
+import csv
+import json
+import os
+
+
+class PromptSource:
+    """
+    Lazy prompt reader with a sparse byte-offset index
+
+    One prompt per record: a line, or for CSV a row whose quoted fields may span several
+    lines. Records without a prompt (blank lines, JSONL records missing the field, empty
+    CSV cells, unparsable lines) are skipped and reported when the index is built, so they
+    are never sent. The index stores the total prompt count and the byte offset of every
+    `index_stride`-th prompt, so counting is free after the first pass and
+    reading can start at any prompt by seeking close to it. The index is cached next to the
+    prompt file and rebuilt when the file's size or modification time changes.
+    """
+
+    FORMATS = {".txt": "txt", ".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+    # Bumped when the record rules change, so older cached indexes are rebuilt
+    INDEX_VERSION = 2
+
+    def __init__(self, path, prefix="", field="prompt", index_stride=1000):
+        """
+        Initialize the prompt source
+
+        Args:
+            path (str): Prompt file path
+            prefix (str, optional): Text prepended to every prompt. Defaults to "".
+            field (str, optional): JSON key or CSV column holding the prompt. Defaults to "prompt".
+            index_stride (int, optional): Prompts between indexed byte offsets. Defaults to 1000.
+        """
+        self.path = path
+        self.prefix = prefix
+        self.field = field
+        self.index_stride = index_stride
+        self.format = self.FORMATS.get(os.path.splitext(path)[1].lower(), "txt")
+        self.index_path = f"{path}.idx.json"
+        self.index = None
+        self.csv_column = 0
+
+    def file_signature(self):
+        """
+        Get the size and modification time of the prompt file
+
+        Returns:
+            list: [size, mtime]
+        """
+        stat = os.stat(self.path)
+        return [stat.st_size, stat.st_mtime]
+
+    def load_index(self):
+        """
+        Load the cached index, building it if it is missing or stale
+
+        Returns:
+            dict: Index with count and offsets
+        """
+        if self.index is not None:
+            return self.index
+        signature = self.file_signature()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as file:
+                    index = json.load(file)
+                if (index.get("signature") == signature and index.get("stride") == self.index_stride
+                        and index.get("version") == self.INDEX_VERSION):
+                    self.index = index
+                    self.csv_column = index.get("csv_column", 0)
+                    return index
+            except Exception as exc:
+                print(f"Ignoring unreadable prompt index: {exc}")
+        self.index = self.build_index(signature)
+        return self.index
+
+    def records(self, file, offset=0):
+        """
+        Read the non-blank records of the prompt file
+
+        A CSV record continues over line breaks while a quoted field is open (an odd number
+        of quote characters so far, since quotes inside fields are doubled).
+
+        Args:
+            file: Prompt file opened in binary mode and positioned at `offset`
+            offset (int, optional): Byte offset of the file position. Defaults to 0.
+
+        Yields:
+            tuple: (byte offset, decoded record without the trailing newline)
+        """
+        record = b""
+        record_offset = offset
+        for raw_line in file:
+            if not record:
+                record_offset = offset
+            offset += len(raw_line)
+            record += raw_line
+            if self.format == "csv" and record.count(b'"') % 2:
+                continue
+            text = record.decode('utf-8-sig' if record_offset == 0 else 'utf-8').rstrip('\r\n')
+            record = b""
+            if text.strip():
+                yield (record_offset, text)
+        if record.strip():
+            # Quoted field left open at the end of the file
+            yield (record_offset, record.decode('utf-8-sig' if record_offset == 0 else 'utf-8').rstrip('\r\n'))
+
+    def build_index(self, signature):
+        """
+        Scan the prompt file once and record the prompt count and sparse byte offsets
+
+        Args:
+            signature (list): File signature stored with the index
+
+        Returns:
+            dict: Index with count and offsets
+        """
+        count = 0
+        offsets = []
+        skipped = []
+        header_seen = False
+        with open(self.path, 'rb') as file:
+            for number, (record_offset, text) in enumerate(self.records(file), 1):
+                if self.format == "csv" and not header_seen:
+                    # The first CSV row is a header; remember which column holds the prompt
+                    header = next(csv.reader(text.splitlines(True)))
+                    self.csv_column = header.index(self.field) if self.field in header else 0
+                    header_seen = True
+                    continue
+                if not self.prompt_of(text):
+                    skipped.append(number)
+                    continue
+                if count % self.index_stride == 0:
+                    offsets.append(record_offset)
+                count += 1
+        if skipped:
+            print(f"Skipping {len(skipped)} records without a {self.field!r} prompt in {self.path} "
+                  f"(records {', '.join(str(number) for number in skipped[:5])}{', ...' if len(skipped) > 5 else ''})")
+
+        index = {
+            "version": self.INDEX_VERSION,
+            "signature": signature,
+            "stride": self.index_stride,
+            "count": count,
+            "skipped": len(skipped),
+            "offsets": offsets,
+            "csv_column": self.csv_column
+        }
+        try:
+            with open(self.index_path, 'w', encoding='utf-8') as file:
+                json.dump(index, file)
+        except OSError as exc:
+            print(f"Unable to cache prompt index, keeping it in memory: {exc}")
+        return index
+
+    def count(self):
+        """
+        Get the number of prompts
+
+        Returns:
+            int: Number of records with a prompt
+        """
+        return self.load_index()["count"]
+
+    def parse(self, text):
+        """
+        Extract the prompt text from one record
+
+        Args:
+            text (str): Decoded record without the trailing newline
+
+        Returns:
+            str: Prompt text, empty if the record has none
+
+        Raises:
+            ValueError: If a JSONL record is not valid JSON
+        """
+        if self.format == "jsonl":
+            record = json.loads(text)
+            if not isinstance(record, dict):
+                return str(record)
+            value = record.get(self.field)
+            return "" if value is None else str(value)
+        if self.format == "csv":
+            row = next(csv.reader(text.splitlines(True)), [])
+            return row[self.csv_column] if self.csv_column < len(row) else ""
+        return text
+
+    def prompt_of(self, text):
+        """
+        Get the prompt of a record, or None if it has none and is skipped
+
+        Args:
+            text (str): Decoded record
+
+        Returns:
+            str or None: Prompt text
+        """
+        try:
+            prompt = self.parse(text)
+        except ValueError:
+            return None
+        return prompt if prompt.strip() else None
+
+    def iter_from(self, start=0):
+        """
+        Yield prompts starting at a prompt index
+
+        Args:
+            start (int, optional): Index of the first prompt. Defaults to 0.
+
+        Yields:
+            str: Prompt with the prefix applied
+        """
+        index = self.load_index()
+        if start >= index["count"]:
+            return
+        block = start // self.index_stride
+        position = block * self.index_stride
+        with open(self.path, 'rb') as file:
+            file.seek(index["offsets"][block])
+            for _, text in self.records(file, index["offsets"][block]):
+                prompt = self.prompt_of(text)
+                if prompt is None:
+                    continue
+                if position >= start:
+                    yield f"{self.prefix}{prompt}"
+                position += 1
+
+    def cycle(self, total, start=0):
+        """
+        Yield `total - start` prompts, wrapping around to the first prompt when the file ends
+
+        Args:
+            total (int): Number of items the prompts are used for
+            start (int, optional): Item index to start at. Defaults to 0.
+
+        Yields:
+            str: Prompt with the prefix applied
+        """
+        count = self.count()
+        if count == 0:
+            return
+        position = start
+        while position < total:
+            for prompt in self.iter_from(position % count):
+                if position >= total:
+                    return
+                yield prompt
+                position += 1
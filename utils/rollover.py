@@ -0,0 +1,106 @@
+"""
+Rollover module: Decides when single-window mode should leave a long conversation for a new chat
+"""
+
+from collections import deque
+
+from utils.tracer import tracer
+
+
+class RolloverPolicy:
+    """
+    Tracks the current conversation and asks for a new chat when it grows too long
+
+    A conversation is rolled over after `max_turns` turns, once the prompts and responses
+    sent in it exceed `max_chars` characters, or when the mean latency of its last
+    `latency_window` turns rises above `latency_threshold` seconds. A limit of 0 disables it.
+    Each rollover is written to the run trace as an event, and every "ask" span carries its
+    turn number, so turn latencies can be compared between runs with and without rollover.
+    """
+
+    def __init__(self, max_turns=0, max_chars=0, latency_threshold=0.0, latency_window=3):
+        """
+        Initialize the policy
+
+        Args:
+            max_turns (int, optional): Turns per conversation, 0 for no limit. Defaults to 0.
+            max_chars (int, optional): Prompt and response characters per conversation, 0 for no limit. Defaults to 0.
+            latency_threshold (float, optional): Mean turn latency in seconds that triggers a rollover,
+                0 to disable. Defaults to 0.0.
+            latency_window (int, optional): Recent turns averaged for the latency check. Defaults to 3.
+        """
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.latency_threshold = latency_threshold
+        self.latencies = deque(maxlen=max(1, latency_window))
+        self.turns = 0
+        self.chars = 0
+        self.counts = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a policy from the "rollover" configuration section
+
+        Args:
+            config (dict): Configuration dictionary
+
+        Returns:
+            RolloverPolicy: Configured policy
+        """
+        rollover = config.get("rollover", {})
+        return cls(
+            max_turns=rollover.get("max_turns", 0),
+            max_chars=rollover.get("max_chars", 0),
+            latency_threshold=rollover.get("latency_threshold", 0.0),
+            latency_window=rollover.get("latency_window", 3)
+        )
+
+    def record(self, prompt, response, latency):
+        """
+        Record one turn of the current conversation
+
+        Args:
+            prompt (str): Prompt sent
+            response (str or None): Response text
+            latency (float): Seconds from sending until the response was complete
+        """
+        self.turns += 1
+        self.chars += len(prompt or "") + len(response or "")
+        self.latencies.append(latency)
+
+    def due(self):
+        """
+        Check whether the next prompt should go into a new chat
+
+        Returns:
+            str or None: Rollover reason ("turns", "chars" or "latency"), or None to stay in the conversation
+        """
+        if self.max_turns and self.turns >= self.max_turns:
+            return "turns"
+        if self.max_chars and self.chars >= self.max_chars:
+            return "chars"
+        if (self.latency_threshold and len(self.latencies) == self.latencies.maxlen
+                and sum(self.latencies) / len(self.latencies) > self.latency_threshold):
+            return "latency"
+        return None
+
+    def reset(self, reason=None):
+        """
+        Start tracking a new conversation, logging the rollover that caused it
+
+        Args:
+            reason (str, optional): Rollover reason returned by due(). Conversations started
+                for other reasons (e.g. a retry in a fresh chat) are not counted as rollovers.
+        """
+        if reason is not None:
+            self.counts[reason] = self.counts.get(reason, 0) + 1
+            latency = sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+            print(f"Rolling over to a new chat after {self.turns} turns, {self.chars} characters, "
+                  f"{latency:.1f}s mean turn latency ({reason})")
+            tracer.record("rollover", 0.0, "event", tracer.depth(),
+                          {"reason": reason, "turns": self.turns, "chars": self.chars,
+                           "latency": round(latency, 3)})
+        self.turns = 0
+        self.chars = 0
+        self.latencies.clear()
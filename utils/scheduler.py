@@ -0,0 +1,171 @@
+"""
+Scheduler module: Pipelines multi-window tasks so several conversations generate at the same time
+"""
+
+import time
+
+from utils.pacer import RateLimitError
+from utils.tracer import tracer
+
+
+class PipelineScheduler:
+    """
+    Pipeline scheduler that submits up to `depth` prompts into separate conversations
+    before harvesting them in completion order
+
+    Each in-flight entry keeps the conversation handle returned by the backend, so
+    every result is saved under the item that was sent into that conversation.
+    When the processor has a pacer, new sends wait for it. Rate-limited and failed tasks
+    are handed back to the task queue, which sends them again.
+    """
+
+    def __init__(self, processor, file_manager, depth=3):
+        """
+        Initialize the pipeline scheduler
+
+        Args:
+            processor: Processor instance whose backend is used and which captures output images
+            file_manager: FileManager instance for saving results
+            depth (int, optional): Maximum number of conversations in flight. Defaults to 3.
+        """
+        self.processor = processor
+        self.backend = processor.backend
+        self.file_manager = file_manager
+        self.depth = max(1, depth)
+        self.pacer = processor.pacer
+
+    def submit(self, task, config):
+        """
+        Open a separate conversation and send a task into it
+
+        Args:
+            task (dict): Task with item_name, prompt and img_path
+            config (dict): Configuration dictionary
+
+        Returns:
+            dict or None: In-flight entry, or None if the task could not be sent
+        """
+        handle = self.backend.new_chat(config, separate=True)
+        if handle is None:
+            return None
+        print(f"--- Conversation opened for {task['item_name']} ---")
+
+        if not self.backend.send(handle, task["prompt"], task["img_path"], config, task_id=task["item_name"]):
+            print(f"Failed to send {task['item_name']}, closing its conversation.")
+            self.backend.close(handle)
+            return None
+
+        return {"handle": handle, "task": task, "sent_at": time.time(), "ready_at": None}
+
+    def harvest(self, entry, config):
+        """
+        Save the results of a finished conversation and close it
+
+        Args:
+            entry (dict): In-flight entry
+            config (dict): Configuration dictionary
+
+        Returns:
+            bool: Whether the output image was captured
+            
+        Raises:
+            RateLimitError: If the response is a rate-limit message
+        """
+        task = entry["task"]
+        handle = entry["handle"]
+        print(f"Harvesting {task['item_name']} after {time.time() - entry['sent_at']:.1f} seconds")
+
+        response = (self.backend.response_text(handle)
+                    or f"Response timeout after waiting {config['response_timeout']} seconds.")
+        if self.pacer is not None:
+            try:
+                self.pacer.check(response)
+            except RateLimitError:
+                self.backend.close(handle)
+                raise
+        timings = {"harvest_after": time.time() - entry["sent_at"]}
+        if not config["mode"]["capture_images"]:
+            self.backend.close(handle)
+            return self.processor.save_output(task["item_name"], task["prompt"], response, config,
+                                              task["img_path"], timings)
+        try:
+            captured = self.processor.capture_output(task["item_name"], config, handle)
+            stored = captured is not None and captured[0]()
+        except Exception as exc:
+            print(f"Exception occurred while capturing {task['item_name']}: {exc}")
+            stored = False
+        self.backend.close(handle)
+        if not stored:
+            return False
+        return self.processor.save_output(task["item_name"], task["prompt"], response, config,
+                                          task["img_path"], timings, image=captured[1])
+
+    def run(self, queue, config, on_sent=None, on_done=None, on_requeued=None):
+        """
+        Run tasks through the pipeline
+
+        Args:
+            queue (TaskQueue): Queue handing out new, deferred and retried tasks
+            config (dict): Configuration dictionary
+            on_sent (callable, optional): Called with the task before it is sent
+            on_done (callable, optional): Called with the task and its success flag when it finishes for good
+            on_requeued (callable, optional): Called with the task when it is deferred or queued for a retry
+        """
+        in_flight = []
+        poll_interval = self.backend.poll_interval(config)
+
+        def finish(task, success):
+            # Failed tasks go back into the queue while they have tries left
+            if not success and queue.retry(task):
+                if on_requeued:
+                    on_requeued(task)
+            elif on_done:
+                on_done(task, success)
+
+        while True:
+            # Fill the pipeline, waiting for retry cooldowns only when nothing is in flight
+            while len(in_flight) < self.depth:
+                if self.pacer is not None and in_flight and self.pacer.delay() > 0:
+                    # Keep harvesting while the pacer holds new sends back
+                    break
+                task = queue.next(block=not in_flight)
+                if task is None:
+                    break
+                if self.pacer is not None:
+                    self.pacer.acquire()
+                if on_sent:
+                    on_sent(task)
+                tracer.set_task(task["item_name"])
+                with tracer.span("submit"):
+                    entry = self.submit(task, config)
+                if entry is None:
+                    finish(task, False)
+                    continue
+                in_flight.append(entry)
+
+            if not in_flight:
+                break
+
+            # Harvest the conversation that finished first, then refill
+            now = time.time()
+            for entry in in_flight:
+                if entry["ready_at"] is None and self.backend.poll(entry["handle"], config):
+                    entry["ready_at"] = now
+            ready = [entry for entry in in_flight if entry["ready_at"] is not None]
+            if not ready:
+                tracer.sleep(poll_interval, "pipeline_poll")
+                continue
+            entry = min(ready, key=lambda item: item["ready_at"])
+            in_flight.remove(entry)
+            task = entry["task"]
+            tracer.set_task(task["item_name"])
+            try:
+                with tracer.span("harvest"):
+                    captured = self.harvest(entry, config)
+            except RateLimitError:
+                if queue.defer(task):
+                    if on_requeued:
+                        on_requeued(task)
+                    continue
+                captured = False
+            finish(task, captured)
@@ -0,0 +1,327 @@
+"""
+Script host module: Keeps one long-lived script interpreter alive and runs AppleScript through it
+"""
+
+import atexit
+import itertools
+import json
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+
+# JXA program run by osascript. It reads one JSON request per line from stdin,
+# executes the AppleScript source with NSAppleScript and writes one JSON reply per line.
+JXA_HOST_SOURCE = r'''
+ObjC.import('Foundation');
+
+function descriptorToString(desc) {
+    var text = desc.stringValue;
+    if (!text.isNil()) {
+        return text.js;
+    }
+    var type = desc.descriptorType;
+    if (type === 0x74727565) { return 'true'; }   // 'true'
+    if (type === 0x66616c73) { return 'false'; }  // 'fals'
+    if (type === 0x626f6f6c) { return desc.booleanValue ? 'true' : 'false'; }  // 'bool'
+    return '';
+}
+
+function writeReply(reply) {
+    var line = $.NSString.alloc.initWithUTF8String(JSON.stringify(reply) + '\n');
+    $.NSFileHandle.fileHandleWithStandardOutput.writeData(line.dataUsingEncoding($.NSUTF8StringEncoding));
+}
+
+function handle(line) {
+    var request = JSON.parse(line);
+    var error = Ref();
+    var script = $.NSAppleScript.alloc.initWithSource(request.script);
+    var result = script.executeAndReturnError(error);
+    if (result.isNil()) {
+        var message = error[0].objectForKey('NSAppleScriptErrorMessage');
+        writeReply({id: request.id, stdout: '', returncode: 1, stderr: message.isNil() ? 'unknown error' : message.js});
+    } else {
+        writeReply({id: request.id, stdout: descriptorToString(result), returncode: 0, stderr: ''});
+    }
+}
+
+function run() {
+    var stdin = $.NSFileHandle.fileHandleWithStandardInput;
+    var pending = $.NSMutableData.alloc.init;
+    while (true) {
+        var chunk = stdin.availableData;
+        if (chunk.length == 0) {
+            break;
+        }
+        pending.appendData(chunk);
+        // Wait for more data if a multi-byte character was split between reads
+        var text = $.NSString.alloc.initWithDataEncoding(pending, $.NSUTF8StringEncoding);
+        if (text.isNil()) {
+            continue;
+        }
+        text = text.js;
+        var end = text.lastIndexOf('\n');
+        if (end < 0) {
+            continue;
+        }
+        var lines = text.slice(0, end).split('\n');
+        pending = $.NSMutableData.dataWithData($(text.slice(end + 1)).dataUsingEncoding($.NSUTF8StringEncoding));
+        for (var i = 0; i < lines.length; i++) {
+            if (lines[i].length > 0) {
+                handle(lines[i]);
+            }
+        }
+    }
+}
+'''
+
+
+class ScriptHost:
+    """
+    Long-lived script interpreter that executes AppleScript requests over stdin/stdout
+
+    Each request is a JSON line {"id", "script"} and each reply a JSON line
+    {"id", "stdout", "returncode", "stderr"}. Any process speaking this protocol can
+    be used as the host, which allows a stand-in host on machines without osascript.
+    """
+
+    DEFAULT_COMMAND = ["osascript", "-l", "JavaScript", "-e", JXA_HOST_SOURCE]
+
+    def __init__(self, command=None):
+        """
+        Initialize the script host
+
+        Args:
+            command (list, optional): Command that starts the host process. Defaults to the osascript JXA host.
+        """
+        self.command = command or self.DEFAULT_COMMAND
+        self.process = None
+        self.replies = None
+        self.request_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.starts = 0
+        self.restarts = 0
+        self.timeouts = 0
+        atexit.register(self.stop)
+
+    def start(self):
+        """
+        Start the host process if it is not already running
+
+        Returns:
+            bool: Whether the host process is running
+        """
+        if self.is_alive():
+            return True
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding="utf-8",
+                bufsize=1
+            )
+        except Exception as exc:
+            print(f"Unable to start script host: {exc}")
+            self.process = None
+            return False
+        # Replies are read on a separate thread so waiting for one can time out
+        self.replies = queue.Queue()
+        threading.Thread(target=self._pump, args=(self.process, self.replies), daemon=True).start()
+        if self.starts > 0:
+            self.restarts += 1
+            print(f"Script host restarted (restart #{self.restarts}).")
+        self.starts += 1
+        return True
+
+    @staticmethod
+    def _pump(process, replies):
+        """
+        Forward reply lines of a host process to a queue until it exits
+
+        Args:
+            process (subprocess.Popen): Host process
+            replies (queue.Queue): Reply lines, followed by None at end of output
+        """
+        try:
+            for line in process.stdout:
+                replies.put(line)
+        except (OSError, ValueError):
+            pass
+        replies.put(None)
+
+    def is_alive(self):
+        """
+        Check whether the host process is running
+
+        Returns:
+            bool: True if the host process is alive
+        """
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """Stop the host process"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=2)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+    def kill(self):
+        """
+        Kill the host process, ending any script it is running
+
+        May be called from another thread (e.g. by the watchdog) while run() holds the lock, so
+        only the process is ended; the next run() sees it is dead and starts a fresh host.
+        """
+        process = self.process
+        if process is None:
+            return
+        try:
+            process.kill()
+            process.wait(timeout=2)
+        except Exception:
+            pass
+
+    def run(self, script, timeout=None):
+        """
+        Run a script in the host process, restarting the host if it has crashed
+
+        A request is only retried when it could not be delivered, so a script that may
+        already have run is never executed twice.
+
+        Args:
+            script (str): AppleScript script string
+            timeout (float, optional): Seconds to wait for the reply. On timeout the host is killed
+                (and restarted by the next call). Defaults to None, waiting indefinitely.
+
+        Returns:
+            tuple: (stdout, returncode, stderr). Returns (None, -1, message) if an error occurs
+        """
+        with self.lock:
+            for _ in range(2):
+                if not self.start():
+                    return (None, -1, "script host unavailable")
+                # Work on this host even if another thread kills it meanwhile
+                process, replies = self.process, self.replies
+                request_id = next(self.request_ids)
+                try:
+                    process.stdin.write(json.dumps({"id": request_id, "script": script}) + "\n")
+                    process.stdin.flush()
+                except (BrokenPipeError, OSError, ValueError):
+                    # The host died before receiving the request, safe to retry on a fresh host
+                    self.stop()
+                    continue
+                return self._read_reply(replies, request_id, timeout)
+            return (None, -1, "script host could not accept the request")
+
+    def _read_reply(self, replies, request_id, timeout=None):
+        """
+        Read replies until the one matching the request ID arrives
+
+        Args:
+            replies (queue.Queue): Reply lines of the host the request was written to
+            request_id (int): Request identifier
+            timeout (float, optional): Seconds to wait for the reply. Defaults to None.
+
+        Returns:
+            tuple: (stdout, returncode, stderr)
+        """
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            try:
+                line = replies.get(timeout=max(0.0, deadline - time.time()) if deadline else None)
+            except queue.Empty:
+                # A script stuck on a dialog or in System Events blocks the host, so end it
+                self.timeouts += 1
+                self.kill()
+                return (None, -1, f"script timed out after {timeout:.0f} seconds")
+            if not line:
+                self.stop()
+                return (None, -1, "script host exited while running the script")
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                continue
+            # Skip stale replies left over from earlier requests
+            if reply.get("id") != request_id:
+                continue
+            return (reply.get("stdout", "").strip(), reply.get("returncode", -1), reply.get("stderr", ""))
+
+
+def serve_stand_in():
+    """
+    Stand-in host speaking the ScriptHost protocol, used on machines without osascript
+
+    Every script succeeds and returns an empty string.
+    """
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        sys.stdout.write(json.dumps({"id": request["id"], "stdout": "", "returncode": 0, "stderr": ""}) + "\n")
+        sys.stdout.flush()
+
+
+def benchmark(calls=50, one_shot_command=None, host_command=None):
+    """
+    Measure per-call overhead of one subprocess per call versus the persistent host
+
+    Args:
+        calls (int, optional): Number of calls for each variant. Defaults to 50.
+        one_shot_command (list, optional): Command spawned per call. Defaults to osascript.
+        host_command (list, optional): Host command. Defaults to the osascript JXA host.
+
+    Returns:
+        dict: Mean seconds per call for each variant
+    """
+    script = 'return "ok"'
+    one_shot_command = one_shot_command or ["osascript", "-e", script]
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        subprocess.run(one_shot_command, capture_output=True, text=True, check=False)
+    per_spawn = (time.perf_counter() - start) / calls
+
+    host = ScriptHost(host_command)
+    host.start()
+    host.run(script)  # Exclude interpreter start-up from the measurement
+    start = time.perf_counter()
+    for _ in range(calls):
+        host.run(script)
+    per_host_call = (time.perf_counter() - start) / calls
+    host.stop()
+
+    print(f"One subprocess per call: {per_spawn * 1000:.1f} ms/call")
+    print(f"Persistent script host:  {per_host_call * 1000:.1f} ms/call")
+    return {"subprocess": per_spawn, "host": per_host_call}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Persistent AppleScript host")
+    parser.add_argument("--serve-stand-in", action="store_true", help="Run the stand-in host on stdin/stdout")
+    parser.add_argument("--benchmark", action="store_true", help="Measure per-call overhead")
+    parser.add_argument("--stand-in", action="store_true", help="Benchmark with the stand-in host instead of osascript")
+    parser.add_argument("--calls", type=int, default=50, help="Number of calls per benchmark variant")
+    args = parser.parse_args()
+
+    if args.serve_stand_in:
+        serve_stand_in()
+    elif args.benchmark:
+        if args.stand_in:
+            benchmark(
+                args.calls,
+                one_shot_command=[sys.executable, "-c", "print('ok')"],
+                host_command=[sys.executable, "-m", "utils.script_host", "--serve-stand-in"]
+            )
+        else:
+            benchmark(args.calls)
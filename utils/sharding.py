@@ -0,0 +1,341 @@
+"""
+Sharding module: Splits a batch across machines by stable hash and merges the shard outputs into one dataset
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+
+from utils.file_manager import FileManager
+from utils.output_sink import ShardedTarSink, load_index, read_member
+
+
+def parse_shard(spec):
+    """
+    Parse a shard specification
+
+    Args:
+        spec (str): "i/n" with 0 <= i < n, e.g. "0/3"
+
+    Returns:
+        tuple or None: (index, count), or None for an empty specification
+
+    Raises:
+        ValueError: If the specification is malformed
+    """
+    if not spec:
+        return None
+    try:
+        index, count = (int(part) for part in str(spec).split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/n such as 0/3")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', index must be between 0 and {count - 1}")
+    return (index, count)
+
+
+def shard_of(key, count):
+    """
+    Get the shard an item belongs to
+
+    The hash does not depend on the machine, Python version or item order, so every machine
+    computes the same partition.
+
+    Args:
+        key: Prompt index or image path relative to the image folder
+        count (int): Number of shards
+
+    Returns:
+        int: Shard index
+    """
+    text = str(key).replace(os.sep, "/")
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16) % count
+
+
+def read_item(shard_dir, item, index=None):
+    """
+    Read the stored results of one item from a shard output folder
+
+    Args:
+        shard_dir (str): Shard output folder
+        item (str): Item name
+        index (dict, optional): Tar shard index of the folder (load_index); the flat layout is read if not given
+
+    Returns:
+        dict or None: "png" (image bytes, None if no image was stored) and "record" (dict with the
+            prompt, response and any metadata, None if no text was stored), or None if nothing was found
+    """
+    if index:
+        key = ShardedTarSink.make_key(item)
+        png = read_member(shard_dir, key, "png", index)
+        data = read_member(shard_dir, key, "json", index)
+        record = json.loads(data) if data is not None else None
+    else:
+        image_path = FileManager.image_path(shard_dir, item)
+        png = None
+        if os.path.exists(image_path):
+            with open(image_path, 'rb') as file:
+                png = file.read()
+        # Text results of the flat layout: <item>/output.txt and prompt.txt
+        text_dir = os.path.join(shard_dir, os.path.splitext(item)[0])
+        record = None
+        for field, name in (("response", "output.txt"), ("prompt", "prompt.txt")):
+            path = os.path.join(text_dir, name)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as file:
+                    record = record or {"item": item}
+                    record[field] = file.read()
+    if png is None and record is None:
+        return None
+    return {"png": png, "record": record}
+
+
+def write_item(output_dir, item, stored, sink=None):
+    """
+    Write the results of one item into the merged output
+
+    Args:
+        output_dir (str): Merged output folder
+        item (str): Item name
+        stored (dict): Results returned by read_item
+        sink (ShardedTarSink, optional): Tar shards of the merged output; the flat layout is written if not given
+
+    Returns:
+        str: Output location of the item
+    """
+    if sink is not None:
+        members = {}
+        if stored["png"] is not None:
+            members["png"] = stored["png"]
+        members["json"] = json.dumps(stored["record"] or {"item": item}, ensure_ascii=False).encode("utf-8")
+        return sink.write(item, members)
+
+    location = None
+    if stored["png"] is not None:
+        location = FileManager.image_path("", item)
+        target = os.path.join(output_dir, location)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as file:
+            file.write(stored["png"])
+    if stored["record"] is not None:
+        text_dir = os.path.join(output_dir, os.path.splitext(item)[0])
+        os.makedirs(text_dir, exist_ok=True)
+        for field, name in (("response", "output.txt"), ("prompt", "prompt.txt")):
+            if stored["record"].get(field) is not None:
+                with open(os.path.join(text_dir, name), 'w', encoding='utf-8') as file:
+                    file.write(stored["record"][field])
+        location = location or os.path.relpath(text_dir, output_dir)
+    return location
+
+
+def read_ledger(shard_dir):
+    """
+    Read the task records of one shard output folder
+
+    Args:
+        shard_dir (str): Shard output folder containing task_ledger.sqlite
+
+    Returns:
+        tuple: (shard, records) - the "i/n" shard the folder was produced with (None if unknown)
+            and records with item, content_hash, state, attempts and finished_at
+    """
+    ledger_path = os.path.join(shard_dir, "task_ledger.sqlite")
+    if not os.path.exists(ledger_path):
+        print(f"No task ledger in {shard_dir}, only output files are merged")
+        return (None, [])
+    connection = sqlite3.connect(ledger_path)
+    try:
+        rows = connection.execute(
+            "SELECT item, content_hash, state, attempts, finished_at FROM tasks ORDER BY item"
+        ).fetchall()
+        shard = connection.execute("SELECT value FROM meta WHERE key = 'shard'").fetchone()
+    finally:
+        connection.close()
+    records = [
+        {"item": item, "content_hash": content_hash, "state": state, "attempts": attempts, "finished_at": finished_at}
+        for item, content_hash, state, attempts, finished_at in rows
+    ]
+    return (json.loads(shard[0]) if shard else None, records)
+
+
+def merge_shards(shard_dirs, output_dir, expected=None, count=None, output_format=None):
+    """
+    Merge shard output folders into one dataset
+
+    Every captured item is copied once, together with its text results. Shard folders may
+    use the flat layout or tar shards (read through their index). When several shards
+    captured the same item, the copy from the shard that owns the item is kept, then the
+    most recent one. Items that are expected but were captured by no shard are reported as
+    gaps together with the shard that should rerun them (rerunning that shard only sends
+    the missing items).
+
+    Args:
+        shard_dirs (list): Shard output folders
+        output_dir (str): Merged output folder
+        expected (list, optional): All item names of the dataset, used to find gaps
+        count (int, optional): Number of shards. Defaults to the count recorded in the ledgers,
+            or the number of folders.
+        output_format (str, optional): "flat" or "tar". Defaults to "tar" if every shard folder
+            uses tar shards, else "flat".
+
+    Returns:
+        dict: Merge report with merged, duplicates and gaps
+    """
+    candidates = {}
+    shards = {}
+    indexes = {shard_dir: load_index(shard_dir) for shard_dir in shard_dirs}
+    for shard_dir in sorted(shard_dirs):
+        index = indexes[shard_dir]
+        shards[shard_dir], records = read_ledger(shard_dir)
+        if not records:
+            # Without a ledger, every stored output of the folder counts as captured
+            if index:
+                items = [entry["item"] for entry in index.values() if entry.get("item")]
+            else:
+                items = []
+                for root, _, files in os.walk(shard_dir):
+                    for name in files:
+                        if name.endswith(FileManager.IMAGE_SUFFIX):
+                            path = os.path.relpath(os.path.join(root, name), shard_dir)
+                            items.append(path[:-len(FileManager.IMAGE_SUFFIX)])
+            records = [{"item": item, "state": "captured", "content_hash": None, "attempts": None,
+                        "finished_at": None} for item in items]
+        for record in records:
+            if record["state"] != "captured":
+                continue
+            if index:
+                present = ShardedTarSink.make_key(record["item"]) in index
+            else:
+                present = (os.path.exists(FileManager.image_path(shard_dir, record["item"]))
+                           or os.path.exists(os.path.join(shard_dir, os.path.splitext(record["item"])[0], "output.txt")))
+            if not present:
+                print(f"Captured output missing in {shard_dir}: {record['item']}")
+                continue
+            record["shard_dir"] = shard_dir
+            candidates.setdefault(record["item"], []).append(record)
+
+    recorded = [parse_shard(spec) for spec in shards.values() if spec]
+    count = count or (recorded[0][1] if recorded else len(shard_dirs))
+    shard_index = {shard_dir: parse_shard(spec)[0] for shard_dir, spec in shards.items() if spec}
+
+    if output_format is None:
+        output_format = "tar" if shard_dirs and all(indexes.values()) else "flat"
+    os.makedirs(output_dir, exist_ok=True)
+    sink = ShardedTarSink(output_dir) if output_format == "tar" else None
+    merged = []
+    duplicates = {}
+    try:
+        for item in sorted(candidates):
+            records = candidates[item]
+            if len(records) > 1:
+                duplicates[item] = [record["shard_dir"] for record in records]
+            owner = shard_of(item_key(item), count)
+            # Prefer the owning shard's copy, then the newest capture
+            chosen = max(records, key=lambda record: (
+                shard_index.get(record["shard_dir"]) == owner,
+                record["finished_at"] or 0
+            ))
+            stored = read_item(chosen["shard_dir"], item, indexes[chosen["shard_dir"]])
+            merged.append({
+                "item": item,
+                "shard_dir": chosen["shard_dir"],
+                "content_hash": chosen["content_hash"],
+                "attempts": chosen["attempts"],
+                "finished_at": chosen["finished_at"],
+                "output": write_item(output_dir, item, stored, sink)
+            })
+    finally:
+        if sink is not None:
+            sink.close()
+
+    gaps = []
+    if expected is not None:
+        gaps = [item for item in expected if item not in candidates]
+
+    with open(os.path.join(output_dir, "records.jsonl"), 'w', encoding='utf-8') as file:
+        for record in merged:
+            file.write(json.dumps(record) + "\n")
+    report = {
+        "merged": len(merged),
+        "duplicates": duplicates,
+        "gaps": [{"item": item, "shard": f"{shard_of(item_key(item), count)}/{count}"} for item in gaps]
+    }
+    with open(os.path.join(output_dir, "merge_report.json"), 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+
+    print(f"Merged {len(merged)} items from {len(shard_dirs)} shards into {output_dir}")
+    if duplicates:
+        print(f"Resolved {len(duplicates)} items captured by more than one shard")
+    if expected is not None:
+        print(f"Gaps: {len(gaps)} of {len(expected)} expected items were not captured")
+        for gap in report["gaps"][:20]:
+            print(f"  {gap['item']} (rerun shard {gap['shard']})")
+        if len(gaps) > 20:
+            print(f"  ... {len(gaps) - 20} more in merge_report.json")
+    return report
+
+
+def item_key(item_name):
+    """
+    Get the shard key of an item name
+
+    Text-only items are named prompt_<index + 1> and are sharded by prompt index; image items
+    are sharded by their path relative to the image folder.
+
+    Args:
+        item_name (str): Item name
+
+    Returns:
+        str or int: Shard key
+    """
+    if item_name.startswith("prompt_") and item_name[len("prompt_"):].isdigit():
+        return int(item_name[len("prompt_"):]) - 1
+    return item_name
+
+
+def expected_items(config_path):
+    """
+    List every item name of the dataset described by a configuration
+
+    Args:
+        config_path (str): Configuration file used by the shards
+
+    Returns:
+        list: Item names
+    """
+    from utils.config_manager import ConfigManager
+    from utils.file_manager import FileManager
+    from utils.prompt_source import PromptSource
+
+    config = ConfigManager(config_file=config_path).config
+    if config["mode"]["input_type"] == "text_image":
+        return FileManager().collect_image_files(
+            config["image_folder"],
+            config.get("num_images_to_process", 100),
+            seed=config.get("image_sample_seed", 0),
+            recursive=config.get("recursive_images", True),
+            manifest_path=config.get("image_manifest") or None,
+            exclude=[config["output_dir"]]
+        )
+    total = config.get("num_prompts_to_process") or PromptSource(config["default_prompts_file"]).count()
+    return [f"prompt_{index + 1}" for index in range(total)]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shard tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge_parser = subparsers.add_parser("merge", help="Merge shard output folders into one dataset")
+    merge_parser.add_argument("shard_dirs", nargs="+", help="Shard output folders")
+    merge_parser.add_argument("--output", required=True, help="Merged output folder")
+    merge_parser.add_argument("--config", help="Configuration used by the shards, enables the gap check")
+    merge_parser.add_argument("--shards", type=int, help="Number of shards, defaults to the number of folders")
+    merge_parser.add_argument("--format", choices=["flat", "tar"],
+                              help="Merged output layout, defaults to tar if every shard folder uses tar shards")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        expected = expected_items(args.config) if args.config else None
+        merge_shards(args.shard_dirs, args.output, expected=expected, count=args.shards, output_format=args.format)
@@ -0,0 +1,241 @@
+"""
+Simulated backend module: Deterministic stand-in for ChatGPT used for offline runs and measurements
+"""
+
+import hashlib
+import math
+import os
+import random
+import struct
+import time
+import zlib
+
+from utils.tracer import tracer
+
+from utils.backends import ChatBackend
+
+
+def write_png(path, width, height, pixel):
+    """
+    Write an RGB PNG file without third-party imaging libraries
+
+    Args:
+        path (str or file): Output file path, or a binary file object
+        width (int): Image width
+        height (int): Image height
+        pixel (callable): Function (x, y) -> (r, g, b)
+    """
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xffffffff)
+
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)  # Filter type: none
+        for x in range(width):
+            rows.extend(pixel(x, y))
+
+    data = (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(bytes(rows), 6))
+            + chunk(b"IEND", b""))
+    if not isinstance(path, str):
+        path.write(data)
+        return
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+class SimulatedBackend(ChatBackend):
+    """
+    Simulated ChatGPT backend with configurable latency distributions and failure rates
+
+    Every random draw is seeded from the configured seed, the task and its attempt number,
+    so a run produces the same outcomes regardless of scheduling order. Latencies are in
+    simulated seconds and multiplied by time_scale to get wall-clock seconds.
+    """
+
+    name = "simulated"
+
+    DEFAULT_SETTINGS = {
+        "seed": 0,
+        "time_scale": 0.01,  # Wall-clock seconds per simulated second
+        "response_latency": {"distribution": "lognormal", "mean": 15, "stddev": 5},
+        "image_latency": {"distribution": "lognormal", "mean": 60, "stddev": 20},
+        "send_failure_rate": 0.02,  # Probability that sending fails
+        "empty_image_rate": 0.05,   # Probability that no image is produced
+        "rate_limit_rate": 0.0,     # Probability that a send starts a rate-limit window
+        "rate_limit_duration": 600,  # Simulated seconds the rate-limit window lasts
+        "turn_latency_growth": 0.0,  # Simulated seconds added to the response latency per earlier turn in the conversation
+        "image_size": 256
+    }
+
+    def __init__(self, settings=None):
+        """
+        Initialize the simulated backend
+
+        Args:
+            settings (dict, optional): Overrides for DEFAULT_SETTINGS
+        """
+        super().__init__()
+        self.settings = dict(self.DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+        self.next_handle = 1
+        self.conversations = {}
+        self.turns = {}
+        self.current = None
+        self.limited_until = 0.0
+
+    def rng(self, *parts):
+        """
+        Create a random generator seeded by the configured seed and the given parts
+
+        Returns:
+            random.Random: Seeded random generator
+        """
+        key = "|".join(str(part) for part in (self.settings["seed"],) + parts)
+        return random.Random(int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:16], 16))
+
+    @staticmethod
+    def draw(rng, spec):
+        """
+        Draw a latency in simulated seconds
+
+        Args:
+            rng (random.Random): Random generator
+            spec (dict or float): Distribution settings with distribution, mean and stddev, or a fixed value
+
+        Returns:
+            float: Non-negative latency
+        """
+        if not isinstance(spec, dict):
+            return float(spec)
+        distribution = spec.get("distribution", "normal")
+        mean = spec.get("mean", 0)
+        stddev = spec.get("stddev", 0)
+        if distribution == "fixed" or stddev <= 0:
+            value = mean
+        elif distribution == "uniform":
+            value = rng.uniform(mean - stddev, mean + stddev)
+        elif distribution == "lognormal" and mean > 0:
+            # Parameterize by the mean and standard deviation of the latency itself
+            sigma2 = math.log(1 + (stddev / mean) ** 2)
+            mu = math.log(mean) - sigma2 / 2
+            value = rng.lognormvariate(mu, math.sqrt(sigma2))
+        else:
+            value = rng.gauss(mean, stddev)
+        return max(0.0, value)
+
+    def check_running(self):
+        return True
+
+    def new_chat(self, config, separate=False):
+        handle = self.next_handle
+        self.next_handle += 1
+        self.conversations[handle] = None
+        self.turns[handle] = 0
+        if not separate:
+            self.current = handle
+        return handle
+
+    def current_chat(self):
+        if self.current is None:
+            self.new_chat(None)
+        return self.current
+
+    def send(self, handle, prompt, img_path, config, task_id):
+        attempt = self.send_attempts.get(task_id, 0) + 1
+        self.send_attempts[task_id] = attempt
+
+        rng = self.rng(task_id, attempt)
+        if rng.random() < self.settings["send_failure_rate"]:
+            print(f"[simulated] Send failed for {task_id} (attempt {attempt})")
+            return False
+
+        scale = self.settings["time_scale"]
+        now = time.time()
+        # Long conversations answer more slowly
+        turns = self.turns.get(handle, 0)
+        self.turns[handle] = turns + 1
+        response_delay = self.draw(rng, self.settings["response_latency"]) + turns * self.settings["turn_latency_growth"]
+        image_delay = response_delay + self.draw(rng, self.settings["image_latency"])
+        self.conversations[handle] = {
+            "task_id": task_id,
+            "prompt": prompt,
+            "img_path": img_path,
+            "sent_at": now,
+            "response_at": now + response_delay * scale,
+            "image_at": now + image_delay * scale,
+            "has_image": rng.random() >= self.settings["empty_image_rate"],
+            "limited": now < self.limited_until
+        }
+        if not self.conversations[handle]["limited"] and rng.random() < self.settings["rate_limit_rate"]:
+            # Start a rate-limit window; this and every send inside it get the usage cap message
+            self.limited_until = now + self.settings["rate_limit_duration"] * scale
+            self.conversations[handle]["limited"] = True
+        return True
+
+    def ask(self, handle, prompt, img_path, config, task_id):
+        max_resends = config.get("max_resend_attempts", 0)
+        for _ in range(max_resends + 1):
+            if self.send(handle, prompt, img_path, config, task_id):
+                state = self.conversations[handle]
+                with tracer.span("simulated_response"):
+                    time.sleep(max(0, state["response_at"] - time.time()))
+                return self.response_text(handle)
+        return f"Response timeout after waiting {config.get('response_timeout', 130)} seconds."
+
+    def poll(self, handle, config):
+        state = self.conversations.get(handle)
+        return state is not None and time.time() >= state["image_at"]
+
+    def response_text(self, handle):
+        state = self.conversations.get(handle)
+        if state is None or time.time() < state["response_at"]:
+            return None
+        if state["limited"]:
+            return "You've reached the current usage cap for image generation. Please try again later."
+        return f"[simulated] Here is the image for: {state['prompt'][:80]}"
+
+    def await_image(self, handle, config, elapsed, location=None):
+        state = self.conversations.get(handle)
+        if state is not None:
+            with tracer.span("simulated_image"):
+                time.sleep(max(0, state["image_at"] - time.time()))
+
+    def poll_interval(self, config):
+        return config.get("response_poll_interval", 2) * self.settings["time_scale"]
+
+    def fetch_image(self, handle, img_name, target, location=None):
+        write_image = self.capture_image(handle, img_name, target, location)
+        return write_image is not None and write_image()
+
+    def capture_image(self, handle, img_name, target, location=None):
+        state = self.conversations.get(handle)
+        if state is None or not state["has_image"] or state["limited"] or time.time() < state["image_at"]:
+            print(f"[simulated] No image generated for {img_name}")
+            return None
+
+        # Synthetic gradient whose colors are derived from the prompt
+        digest = hashlib.sha1(state["prompt"].encode("utf-8")).digest()
+        r, g, b = digest[0], digest[1], digest[2]
+        size = self.settings["image_size"]
+
+        def write_image():
+            if isinstance(target, str):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+            with tracer.span("png_save"):
+                write_png(
+                    target, size, size,
+                    lambda x, y: ((r + x) & 0xff, (g + y) & 0xff, (b + x + y) & 0xff)
+                )
+            if isinstance(target, str):
+                print(f"Image saved: {target}")
+            return True
+
+        return write_image
+
+    def close(self, handle):
+        self.conversations.pop(handle, None)
+        if handle == self.current:
+            self.current = None
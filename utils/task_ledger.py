@@ -0,0 +1,214 @@
+"""
+Task ledger module: Records the state of every task in SQLite so interrupted runs can resume
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class TaskLedger:
+    """
+    SQLite-backed task ledger with batched writes
+
+    Each task is keyed by its item name plus a hash of its content (prompt and input image),
+    so a changed prompt or image is treated as a new task.
+    """
+
+    STATES = ("pending", "sent", "captured", "failed")
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_key TEXT PRIMARY KEY,
+            item TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            sent_at REAL,
+            finished_at REAL,
+            duration REAL,
+            output_path TEXT,
+            updated_at REAL NOT NULL
+        )
+    '''
+
+    UPSERT = '''
+        INSERT INTO tasks (task_key, item, content_hash, state, attempts, sent_at, finished_at, duration,
+                           output_path, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(task_key) DO UPDATE SET
+            state = excluded.state,
+            attempts = MAX(tasks.attempts, excluded.attempts),
+            sent_at = COALESCE(excluded.sent_at, tasks.sent_at),
+            finished_at = COALESCE(excluded.finished_at, tasks.finished_at),
+            duration = COALESCE(excluded.duration, tasks.duration),
+            output_path = COALESCE(excluded.output_path, tasks.output_path),
+            updated_at = excluded.updated_at
+    '''
+
+    def __init__(self, db_path, batch_size=50, flush_interval=10.0):
+        """
+        Initialize the task ledger
+
+        Args:
+            db_path (str): SQLite database file path
+            batch_size (int, optional): Number of buffered updates that triggers a write. Defaults to 50.
+            flush_interval (float, optional): Seconds after which buffered updates are written. Defaults to 10.0.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending_rows = {}
+        self.last_flush = time.time()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(self.SCHEMA)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.connection.commit()
+        self.pending_meta = {}
+
+        # Captured keys are loaded once so skip checks never touch the database
+        self.captured = {
+            row[0] for row in self.connection.execute("SELECT task_key FROM tasks WHERE state = 'captured'")
+        }
+        atexit.register(self.close)
+
+    @staticmethod
+    def make_key(item_name, prompt, img_path=None):
+        """
+        Build the ledger key for a task
+
+        Args:
+            item_name (str): Image filename or prompt item name
+            prompt (str): Prompt text
+            img_path (str, optional): Input image path
+
+        Returns:
+            tuple: (task_key, content_hash)
+        """
+        digest = hashlib.sha1(prompt.encode("utf-8"))
+        if img_path:
+            try:
+                with open(img_path, "rb") as file:
+                    for chunk in iter(lambda: file.read(1 << 20), b""):
+                        digest.update(chunk)
+            except OSError:
+                digest.update(img_path.encode("utf-8"))
+        content_hash = digest.hexdigest()
+        return (f"{item_name}:{content_hash[:16]}", content_hash)
+
+    def is_captured(self, task_key):
+        """
+        Check whether a task has already been captured
+
+        Args:
+            task_key (str): Ledger key
+
+        Returns:
+            bool: True if the task was captured in this or an earlier run
+        """
+        return task_key in self.captured
+
+    def mark(self, task_key, item, content_hash, state, attempts=0, sent_at=None, finished_at=None,
+             duration=None, output_path=None):
+        """
+        Record a task state change. The update is buffered and written in batches.
+
+        Args:
+            task_key (str): Ledger key
+            item (str): Item name
+            content_hash (str): Content hash of the task
+            state (str): One of STATES
+            attempts (int, optional): Number of send attempts. Defaults to 0.
+            sent_at (float, optional): Time the prompt was sent
+            finished_at (float, optional): Time the task finished
+            duration (float, optional): Task duration in seconds
+            output_path (str, optional): Path of the saved output
+        """
+        if state not in self.STATES:
+            raise ValueError(f"Unknown task state: {state}")
+
+        previous = self.pending_rows.get(task_key)
+        if previous is not None:
+            # Merge with the buffered row so fields from earlier updates are kept
+            sent_at = sent_at if sent_at is not None else previous[5]
+            attempts = max(attempts, previous[4])
+        self.pending_rows[task_key] = (
+            task_key, item, content_hash, state, attempts, sent_at, finished_at, duration, output_path, time.time()
+        )
+
+        if state == "captured":
+            self.captured.add(task_key)
+        else:
+            self.captured.discard(task_key)
+
+        if len(self.pending_rows) >= self.batch_size or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def get_meta(self, key, default=None):
+        """
+        Get a run-level value such as a resume cursor
+
+        Args:
+            key (str): Value name
+            default: Value returned if the key is not stored
+
+        Returns:
+            Stored value (JSON-decoded) or default
+        """
+        if key in self.pending_meta:
+            return self.pending_meta[key]
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        """
+        Store a run-level value. The write is buffered with the task updates.
+
+        Args:
+            key (str): Value name
+            value: JSON-serializable value
+        """
+        self.pending_meta[key] = value
+
+    def flush(self):
+        """Write buffered updates to the database in one transaction"""
+        self.last_flush = time.time()
+        if (not self.pending_rows and not self.pending_meta) or self.connection is None:
+            return
+        rows = list(self.pending_rows.values())
+        meta = [(key, json.dumps(value)) for key, value in self.pending_meta.items()]
+        self.pending_rows = {}
+        self.pending_meta = {}
+        with self.connection:
+            self.connection.executemany(self.UPSERT, rows)
+            self.connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta)
+
+    def summary(self):
+        """
+        Count tasks per state
+
+        Returns:
+            dict: Number of tasks for each state
+        """
+        self.flush()
+        counts = {state: 0 for state in self.STATES}
+        for state, count in self.connection.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state"):
+            counts[state] = count
+        return counts
+
+    def close(self):
+        """Flush buffered updates and close the database"""
+        if self.connection is None:
+            return
+        self.flush()
+        self.connection.close()
+        self.connection = None
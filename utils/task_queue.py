@@ -0,0 +1,135 @@
+"""
+Task queue module: Orders new, rate-limited and failed tasks for the serial loop and the pipeline scheduler
+"""
+
+import time
+from collections import deque
+
+from utils.tracer import tracer
+
+
+class TaskQueue:
+    """
+    Queue in front of the lazily built task stream
+
+    Tasks deferred by a rate limit are sent again first (the pacer already holds them until
+    the window reopens). Failed tasks are queued for a retry after `cooldown` seconds, either
+    interleaved with new tasks once their cooldown has passed or only after the stream is
+    exhausted, until they have been tried `max_attempts` times.
+    """
+
+    def __init__(self, tasks, max_attempts=3, cooldown=60.0, interleave=False, max_deferrals=5):
+        """
+        Initialize the queue
+
+        Args:
+            tasks (iterable): New tasks
+            max_attempts (int, optional): Tries per task including the first. Defaults to 3.
+            cooldown (float, optional): Seconds before a failed task is tried again. Defaults to 60.0.
+            interleave (bool, optional): Retry as soon as the cooldown passes instead of at the end. Defaults to False.
+            max_deferrals (int, optional): Rate-limit deferrals per task. Defaults to 5.
+        """
+        self.tasks = iter(tasks)
+        self.max_attempts = max(1, max_attempts)
+        self.cooldown = cooldown
+        self.interleave = interleave
+        self.max_deferrals = max_deferrals
+        self.deferred = deque()
+        self.retries = deque()
+        self.exhausted = False
+
+    @classmethod
+    def from_config(cls, tasks, config):
+        """
+        Build a queue from the "retry" and "pacing" configuration sections
+
+        Args:
+            tasks (iterable): New tasks
+            config (dict): Configuration dictionary
+
+        Returns:
+            TaskQueue: Configured queue
+        """
+        retry = config.get("retry", {})
+        return cls(
+            tasks,
+            max_attempts=retry.get("max_attempts", 3),
+            cooldown=retry.get("cooldown", 60.0),
+            interleave=retry.get("interleave", False),
+            max_deferrals=config.get("pacing", {}).get("max_deferrals", 5)
+        )
+
+    def defer(self, task):
+        """
+        Queue a rate-limited task to be sent again
+
+        Args:
+            task (dict): Task dictionary
+
+        Returns:
+            bool: True if queued, False if the task was deferred too often
+        """
+        task["deferrals"] = task.get("deferrals", 0) + 1
+        if task["deferrals"] > self.max_deferrals:
+            print(f"{task['item_name']} was rate limited {task['deferrals']} times, giving up.")
+            return False
+        print(f"Deferring {task['item_name']} until the rate limit window reopens")
+        self.deferred.append(task)
+        return True
+
+    def retry(self, task):
+        """
+        Queue a failed task for another try after the cooldown
+
+        Args:
+            task (dict): Task dictionary
+
+        Returns:
+            bool: True if queued, False if the task has no tries left
+        """
+        task["tries"] = task.get("tries", 1) + 1
+        if task["tries"] > self.max_attempts:
+            return False
+        task["retry_at"] = time.time() + self.cooldown
+        print(f"Queued {task['item_name']} for retry {task['tries'] - 1}/{self.max_attempts - 1} "
+              f"in {self.cooldown:.0f} seconds")
+        self.retries.append(task)
+        return True
+
+    def retry_ready(self):
+        """
+        Check whether the oldest queued retry has finished its cooldown
+
+        Returns:
+            bool: True if a retry can be sent now
+        """
+        return bool(self.retries) and self.retries[0]["retry_at"] <= time.time()
+
+    def next(self, block=True):
+        """
+        Get the next task to send
+
+        Args:
+            block (bool, optional): Wait for a retry cooldown when nothing else is left. Defaults to True.
+
+        Returns:
+            dict or None: Task, or None if nothing can be sent (now, or at all when blocking)
+        """
+        if self.deferred:
+            return self.deferred.popleft()
+        if self.interleave and self.retry_ready():
+            return self.retries.popleft()
+        if not self.exhausted:
+            task = next(self.tasks, None)
+            if task is not None:
+                return task
+            self.exhausted = True
+        if not self.retries:
+            return None
+        wait = self.retries[0]["retry_at"] - time.time()
+        if wait > 0:
+            if not block:
+                return None
+            print(f"Waiting {wait:.0f} seconds before retrying {self.retries[0]['item_name']}...")
+            tracer.sleep(wait, "retry_cooldown")
+        return self.retries.popleft()
@@ -0,0 +1,282 @@
+"""
+Tracer module: Lightweight per-phase timing spans written to a JSONL run trace, and a trace summary tool
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Tracer:
+    """
+    Span/timer layer shared by all modules through the module-level `tracer` instance
+
+    Each finished span becomes one JSON line with its phase name, duration, nesting depth
+    and the current task. Fixed sleeps are recorded as spans of kind "sleep", so the summary
+    can separate waiting from useful work. Nothing is written until start() is called.
+    """
+
+    def __init__(self):
+        """Initialize the tracer"""
+        self.file = None
+        self.path = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.task = None
+        self.listeners = []
+
+    def start(self, path):
+        """
+        Start writing spans to a JSONL file
+
+        Args:
+            path (str): Trace file path
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.stop()
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+        print(f"Writing run trace to {path}")
+
+    def stop(self):
+        """Flush and close the trace file"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def set_task(self, task):
+        """
+        Set the task that following spans belong to
+
+        Args:
+            task (str or None): Task item name
+        """
+        self.task = task
+
+    def current_task(self):
+        """
+        Get the task the spans of the current thread belong to
+
+        Returns:
+            str or None: Task set by task_scope on this thread, else the one set by set_task
+        """
+        return getattr(self.local, "task", None) or self.task
+
+    @contextmanager
+    def task_scope(self, task, depth=None):
+        """
+        Attribute the spans of the current thread to a task, for work done off the main task thread
+
+        Args:
+            task (str or None): Task item name, None for the task set by set_task
+            depth (int, optional): Nesting depth to continue from, i.e. that of the span the work belongs to
+        """
+        previous = (getattr(self.local, "task", None), self.depth())
+        self.local.task = task
+        if depth is not None:
+            self.local.depth = depth
+        try:
+            yield
+        finally:
+            self.local.task, self.local.depth = previous
+
+    def bind(self, function):
+        """
+        Wrap a function handed to another thread so its spans nest under the caller's open span
+
+        Spans on worker threads would otherwise start at depth 0 and be counted as top-level
+        time a second time, next to the span that waits for them.
+
+        Args:
+            function (callable): Function to run on another thread
+
+        Returns:
+            callable: Function running under the caller's current task and nesting depth
+        """
+        task, depth = self.current_task(), self.depth()
+
+        def bound(*args, **kwargs):
+            with self.task_scope(task, depth=depth):
+                return function(*args, **kwargs)
+        return bound
+
+    def depth(self):
+        """
+        Get the span nesting depth of the current thread
+
+        Returns:
+            int: Number of open spans
+        """
+        return getattr(self.local, "depth", 0)
+
+    @contextmanager
+    def span(self, phase, **fields):
+        """
+        Time a block of code
+
+        Args:
+            phase (str): Phase name
+            **fields: Extra values stored with the span (e.g. fixed_sleep seconds inside the block)
+
+        Yields:
+            dict: The extra values, so the block can add values that are only known at its end
+        """
+        depth = self.depth()
+        self.local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.local.depth = depth
+            self.record(phase, time.perf_counter() - start, "work", depth, fields)
+
+    def sleep(self, seconds, phase="sleep"):
+        """
+        Sleep and record the time as a fixed sleep
+
+        Listeners are told about the sleep before it starts (kind "sleep_start"), so a planned
+        wait is not mistaken for a hang; that notice is not written to the trace.
+
+        Args:
+            seconds (float): Seconds to sleep
+            phase (str, optional): Phase name of the sleep. Defaults to "sleep".
+        """
+        if seconds <= 0:
+            return
+        notice = {"ts": time.time(), "task": self.current_task(), "phase": phase, "kind": "sleep_start",
+                  "duration": seconds, "depth": self.depth()}
+        for listener in self.listeners:
+            listener(notice)
+        time.sleep(seconds)
+        self.record(phase, seconds, "sleep", self.depth(), {})
+
+    def record(self, phase, duration, kind, depth, fields):
+        """
+        Write one span and notify listeners
+
+        Args:
+            phase (str): Phase name
+            duration (float): Duration in seconds
+            kind (str): "work", "sleep" or "event" (a point in time such as a conversation rollover)
+            depth (int): Nesting depth
+            fields (dict): Extra values
+        """
+        event = {"ts": time.time(), "task": self.current_task(), "phase": phase, "kind": kind,
+                 "duration": round(duration, 6), "depth": depth}
+        event.update(fields)
+        for listener in self.listeners:
+            listener(event)
+        if self.file is None:
+            return
+        with self.lock:
+            if self.file is not None:
+                self.file.write(json.dumps(event) + "\n")
+
+
+# Shared tracer used by all modules
+tracer = Tracer()
+
+
+def applescript_delay(script):
+    """
+    Sum the fixed `delay N` statements of an AppleScript
+
+    Args:
+        script (str): AppleScript script string
+
+    Returns:
+        float: Seconds of fixed delay in the script (loops counted once)
+    """
+    return sum(float(value) for value in re.findall(r'^\s*delay\s+([0-9.]+)', script, re.MULTILINE))
+
+
+def percentile(values, q):
+    """
+    Get a percentile by linear interpolation
+
+    Args:
+        values (list): Sorted values
+        q (float): Percentile between 0 and 100
+
+    Returns:
+        float: Percentile value
+    """
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(path):
+    """
+    Print p50/p90/p99 per phase, event counts and total fixed-sleep time versus useful time of a trace
+
+    Args:
+        path (str): Trace file path
+
+    Returns:
+        dict: Per-phase statistics and totals
+    """
+    durations = {}
+    events = {}
+    wall = 0.0
+    sleep = 0.0
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["kind"] == "event":
+                events[event["phase"]] = events.get(event["phase"], 0) + 1
+                continue
+            key = f"{event['phase']} (sleep)" if event["kind"] == "sleep" else event["phase"]
+            durations.setdefault(key, []).append(event["duration"])
+            if event["depth"] == 0:
+                wall += event["duration"]
+            if event["kind"] == "sleep":
+                sleep += event["duration"]
+            # Delays inside AppleScript run in osascript and are only known from the script text
+            sleep += event.get("fixed_sleep", 0.0)
+
+    stats = {}
+    print(f"{'phase':<28}{'count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'total':>10}")
+    for phase, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        stats[phase] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "total": sum(values)
+        }
+        row = stats[phase]
+        print(f"{phase:<28}{row['count']:>7}{row['p50']:>9.2f}{row['p90']:>9.2f}{row['p99']:>9.2f}{row['total']:>10.1f}")
+
+    if events:
+        print("Events: " + ", ".join(f"{phase} x{count}" for phase, count in sorted(events.items())))
+    sleep = min(sleep, wall) if wall else sleep
+    useful = max(0.0, wall - sleep)
+    print(f"\nTraced time: {wall:.1f}s, fixed sleeps: {sleep:.1f}s "
+          f"({sleep / wall:.0%}), useful: {useful:.1f}s" if wall else "\nNo top-level spans in trace.")
+    return {"phases": stats, "events": events, "wall": wall, "sleep": sleep, "useful": useful}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run trace tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="Report per-phase percentiles of a trace")
+    summary_parser.add_argument("trace", help="Trace JSONL file")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        summarize(args.trace)
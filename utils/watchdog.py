@@ -0,0 +1,160 @@
+"""
+Watchdog module: Detects tasks whose phases stop progressing and runs escalating GUI recovery actions
+"""
+
+import threading
+import time
+
+from utils.tracer import tracer
+
+
+class Watchdog:
+    """
+    Background thread watching the run trace for progress
+
+    Every span, sleep or event recorded by the tracer counts as progress, and announced sleeps
+    extend the deadline by their length, so long planned waits (pacing, retry cooldowns,
+    fixed image delays) are not mistaken for hangs. When nothing has progressed for
+    `hang_timeout` seconds, the current task is flagged as hung and the next recovery action
+    is run: the first hang dismisses dialogs, a continued hang reactivates the app, then
+    restarts it. Once every action has been tried, the hang is only reported. Progress resets
+    the escalation. While disarmed, e.g. while a job service waits for jobs, nothing is flagged.
+    """
+
+    ACTIONS = ("dismiss_dialog", "reactivate_app", "restart_app")
+
+    def __init__(self, app_controller, hang_timeout=300.0, actions=None, check_interval=None):
+        """
+        Initialize the watchdog
+
+        Args:
+            app_controller: AppController running the recovery actions
+            hang_timeout (float, optional): Seconds without progress before a task counts as hung. Defaults to 300.0.
+            actions (list, optional): Recovery actions in escalation order. Defaults to ACTIONS.
+            check_interval (float, optional): Seconds between checks. Defaults to a tenth of hang_timeout.
+        """
+        self.app_controller = app_controller
+        self.hang_timeout = hang_timeout
+        self.actions = [action for action in (actions or self.ACTIONS) if action in self.ACTIONS]
+        self.check_interval = check_interval or min(10.0, max(0.5, hang_timeout / 10))
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.armed = True
+        self.deadline = 0.0
+        self.phase = None
+        self.level = 0
+        self.hangs = []
+        self.counts = {action: 0 for action in self.ACTIONS}
+
+    @classmethod
+    def from_config(cls, app_controller, config):
+        """
+        Build a watchdog from the "watchdog" configuration section
+
+        Args:
+            app_controller: AppController running the recovery actions
+            config (dict): Configuration dictionary
+
+        Returns:
+            Watchdog or None: Configured watchdog, or None if disabled
+        """
+        watchdog = config.get("watchdog", {})
+        if not watchdog.get("enabled", True):
+            return None
+        return cls(
+            app_controller,
+            hang_timeout=watchdog.get("hang_timeout", 300.0),
+            actions=watchdog.get("actions")
+        )
+
+    def start(self, armed=True):
+        """
+        Start watching
+
+        Args:
+            armed (bool, optional): Flag hangs right away; otherwise only after arm(). Defaults to True.
+        """
+        self.armed = False
+        if armed:
+            self.arm()
+        self.stopped.clear()
+        tracer.listeners.append(self.on_event)
+        self.thread = threading.Thread(target=self.watch, name="watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop watching"""
+        self.stopped.set()
+        if self.on_event in tracer.listeners:
+            tracer.listeners.remove(self.on_event)
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def arm(self):
+        """Start flagging hangs, counting from now"""
+        with self.lock:
+            self.deadline = time.time() + self.hang_timeout
+            self.level = 0
+            self.armed = True
+
+    def disarm(self):
+        """Stop flagging hangs until arm() is called again"""
+        with self.lock:
+            self.armed = False
+
+    def on_event(self, event):
+        """
+        Tracer listener: record progress
+
+        Args:
+            event (dict): Trace event
+        """
+        # Spans recorded by the recovery actions themselves are not progress of the task
+        if self.thread is not None and threading.get_ident() == self.thread.ident:
+            return
+        with self.lock:
+            planned = event["duration"] if event["kind"] == "sleep_start" else 0.0
+            self.deadline = time.time() + planned + self.hang_timeout
+            self.phase = event["phase"]
+            self.level = 0
+
+    def watch(self):
+        """Thread loop: flag hangs and run recovery actions"""
+        while not self.stopped.wait(self.check_interval):
+            with self.lock:
+                if not self.armed or time.time() < self.deadline:
+                    continue
+                level = self.level
+                self.level += 1
+                # Give the recovery action time to take effect before escalating
+                self.deadline = time.time() + self.hang_timeout
+            if level >= len(self.actions):
+                if level == len(self.actions):
+                    print(f"\nWatchdog: {tracer.task or 'run'} still made no progress after every recovery action")
+                continue
+            action = self.actions[level]
+            task = tracer.task
+            print(f"\nWatchdog: {task or 'run'} made no progress for {self.hang_timeout:.0f} seconds "
+                  f"(last phase: {self.phase}), running {action}")
+            self.hangs.append({"task": task, "phase": self.phase, "action": action, "ts": time.time()})
+            self.counts[action] += 1
+            tracer.record("hang", 0.0, "event", 0, {"action": action, "last_phase": self.phase})
+            try:
+                getattr(self.app_controller, action)()
+            except Exception as exc:
+                print(f"Watchdog recovery {action} failed: {exc}")
+
+    def report(self):
+        """
+        Get the hang and recovery counts
+
+        Returns:
+            dict: hangs, recovery action counts and hung tasks
+        """
+        return {
+            "hangs": len(self.hangs),
+            "actions": dict(self.counts),
+            "hung_tasks": sorted({hang["task"] for hang in self.hangs if hang["task"]})
+        }